@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Vector hashing benchmark: distinct hashes and dict throughput for
+FineVector/CoarseVector keys, comparing the current tuple based
+``__hash__`` with the old scheme which shifted the coordinates into 10 bit
+fields.
+
+Points are sampled in a world spanning ``[-size, size)`` on every axis (as
+mirrored layouts do), in three ways:
+
+- ``lattice``: a regular, coarse lattice over the whole world. Its stride
+  happens to keep the shifted fields apart, so it only measures the cost
+  of hashing.
+- ``steps``: a slab of unit steps, across the whole world along z and a
+  few rows around the origin along y. Negative coordinates borrow
+  from the next field, and beyond 1024 they overflow into it, so in worlds
+  of 1024 and up the shifted hash gives ``(x, y, z)`` and
+  ``(x, y + 1, z - 1024)`` the same hash.
+- ``random``: random points anywhere in the world, too sparse for many
+  collisions.
+"""
+import argparse
+import random
+import time
+from math import floor
+
+from redeclipse.vector import FineVector, CoarseVector
+
+
+class ShiftedFineVector(FineVector):
+    __slots__ = ()
+
+    def __hash__(self):
+        return (1 << 31) + (floor(self.x) << 20) + (floor(self.y) << 10) + floor(self.z)
+
+
+class ShiftedCoarseVector(CoarseVector):
+    __slots__ = ()
+
+    def __hash__(self):
+        return (2 << 31) + (floor(self.x) << 20) + (floor(self.y) << 10) + floor(self.z)
+
+
+SCHEMES = [
+    ('shifted', 'FineVector', ShiftedFineVector),
+    ('tuple', 'FineVector', FineVector),
+    ('shifted', 'CoarseVector', ShiftedCoarseVector),
+    ('tuple', 'CoarseVector', CoarseVector),
+]
+
+
+def lattice(size, count):
+    side = max(2, round(count ** (1 / 3)))
+    axis = range(-size, size, max(1, 2 * size // side))
+    return [(x, y, z) for x in axis for y in axis for z in axis]
+
+
+def steps(size, count):
+    # A slab of unit steps, across the world along z
+    rows = max(2, count // (2 * size))
+    return [(0, y, z) for y in range(-(rows // 2), rows - rows // 2) for z in range(-size, size)]
+
+
+def uniform(size, count):
+    return sorted(set(
+        (random.randrange(-size, size), random.randrange(-size, size), random.randrange(-size, size))
+        for _ in range(count)
+    ))
+
+
+SAMPLES = {'lattice': lattice, 'steps': steps, 'random': uniform}
+
+
+def throughput(keys, lookups):
+    start = time.perf_counter()
+    table = dict.fromkeys(keys)
+    inserted = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in lookups:
+        key in table
+    looked_up = time.perf_counter() - start
+    return (len(keys) / inserted, len(lookups) / looked_up)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vector hashing')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2**i for i in range(8, 13)], help='World sizes')
+    parser.add_argument('--points', type=int, default=50000, help='Approximate number of points per world')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--samples', nargs='+', default=list(SAMPLES), choices=list(SAMPLES), help='How to sample points')
+    args = parser.parse_args()
+
+    print('%-6s %-8s %-8s %-12s %8s %10s %12s %12s' % (
+        'size', 'sample', 'scheme', 'class', 'points', 'distinct', 'insert/s', 'lookup/s'))
+    for size in args.sizes:
+        for sample in args.samples:
+            random.seed(args.seed)
+            points = SAMPLES[sample](size, args.points)
+            random.shuffle(points)
+            for (scheme, name, vector_class) in SCHEMES:
+                keys = [vector_class(*p) for p in points]
+                # Separate, equal instances, like most lookups in the generators
+                lookups = [vector_class(*p) for p in points]
+                (insert, lookup) = throughput(keys, lookups)
+                print('%-6d %-8s %-8s %-12s %8d %10d %12.0f %12.0f' % (
+                    size, sample, scheme, name, len(keys), len(set(hash(k) for k in keys)), insert, lookup))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Octree construction benchmark for ``VoxelWorld.to_octree``.
+
+Worlds are filled at the densities our generators produce (sparse room
+layouts, a two voxel thick terrain surface, and a half-full world) and
+converted with both the bottom-up builder and the recursive reference
+implementation.
+"""
+import argparse
+import random
+import time
+
+from redeclipse.objects import cube
+from redeclipse.voxel import VoxelWorld, DenseVoxelWorld
+
+
+def fill_random(v, density):
+    count = int(density * v.size ** 3)
+    for i in range(count):
+        v.set_point(
+            random.randrange(v.size), random.randrange(v.size), random.randrange(v.size),
+            cube.newtexcube(tex=random.randrange(8))
+        )
+
+
+def fill_terrain(v, density=None):
+    for x in range(v.size):
+        for y in range(v.size):
+            height = v.size // 4 + (x * y) % 7
+            for z in range(height - 2, height):
+                v.set_point(x, y, z, cube.newtexcube(tex=11))
+
+
+FILLS = [
+    ('rooms-0.1%', fill_random, 0.001),
+    ('rooms-2%', fill_random, 0.02),
+    ('terrain', fill_terrain, None),
+    ('half-full', fill_random, 0.5),
+]
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark VoxelWorld.to_octree')
+    parser.add_argument('--size', type=int, default=2**6, help='World size')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--no-recursive', action='store_true', help='Skip the (slow) recursive reference')
+    args = parser.parse_args()
+
+    print('%-12s %-16s %10s %12s %12s %12s' % ('fill', 'backend', 'voxels', 'bottom-up', 'collapse', 'recursive'))
+    for (name, fill, density) in FILLS:
+        for world_class in (VoxelWorld, DenseVoxelWorld):
+            random.seed(args.seed)
+            v = world_class(size=args.size)
+            fill(v, density)
+
+            bottom_up = timed(v.to_octree)
+            collapsed = timed(lambda: v.to_octree(collapse=True))
+            recursive = float('nan') if args.no_recursive else timed(v.to_octree_recursive)
+            print('%-12s %-16s %10d %12.4f %12.4f %12.4f' % (
+                name, world_class.__name__, len(v.world), bottom_up, collapsed, recursive))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Parse throughput benchmark for ``redeclipse.MapParser``.
+
+Reads every .mpz in the given directories several times and reports the
+best wall time and the throughput in (decompressed) MB/s. Maps the parser
+does not support yet (e.g. lightmapped maps with vertex data) are listed
+as skipped.
+"""
+import argparse
+import glob
+import gzip
+import os
+import time
+
+from redeclipse import MapParser
+
+
+def bench_file(path, repeat=3):
+    size = len(gzip.open(path).read())
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        MapParser().read(path)
+        taken = time.perf_counter() - start
+        if best is None or taken < best:
+            best = taken
+    return size, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark MapParser.read')
+    parser.add_argument('paths', nargs='*', default=['maps', 'tests/files'], help='Directories or .mpz files')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per map, best is reported')
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.mpz'))))
+        else:
+            files.append(path)
+
+    print('%-40s %10s %10s %10s' % ('map', 'bytes', 'seconds', 'MB/s'))
+    for path in files:
+        try:
+            size, best = bench_file(path, repeat=args.repeat)
+        except Exception as e:
+            print('%-40s skipped (%s: %s)' % (os.path.basename(path), e.__class__.__name__, e))
+            continue
+        print('%-40s %10d %10.4f %10.2f' % (os.path.basename(path), size, best, size / best / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Shared (hash-consed) octree benchmark: memory used by the octree of a
+generated map, and the time taken to build and write it, with and without
+``to_octree(share=True)``.
+
+Maps are generated as by ``redeclipse_magica_rooms`` on top of
+maps/empty-day.mpz, with 1, 2 and 4-way mirrored layouts. Memory is
+measured with ``tracemalloc``, in a separate build from the timed one.
+Written maps are checked to be identical.
+"""
+import argparse
+import gc
+import gzip
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from redeclipse import MapParser
+from redeclipse.cli.magica_rooms import generate
+from redeclipse.sharing import count_nodes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - start, result)
+
+
+def traced(func):
+    """
+    Memory (in bytes) still allocated by ``func`` once it returns
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (memory, result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark shared octrees')
+    parser.add_argument('--rooms', type=int, default=200, help='Number of rooms')
+    parser.add_argument('--size', type=int, default=2**8, help='World size')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--mirror', type=int, nargs='*', default=[1, 2, 4], help='Mirror factors')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    out = tempfile.mkdtemp()
+
+    print('%-6s %-6s %9s %9s %10s %8s %8s %8s' % (
+        'mirror', 'shared', 'nodes', 'distinct', 'memory', 'build', 'write', 'rewrite'))
+    for mirror in args.mirror:
+        mymap = MapParser().read(os.path.join(ROOT, 'maps', 'empty-day.mpz'))
+        (v, mymap, upm) = generate(mymap, size=args.size, seed=args.seed, rooms=args.rooms, mirror=mirror)
+
+        written = []
+        for share in (False, True):
+            (memory, world) = traced(lambda: v.to_octree(share=share))
+            (nodes, distinct) = count_nodes(world)
+            del world
+            (build, world) = timed(lambda: v.to_octree(share=share))
+            world[0].octsav = 0
+            mymap.world = world
+
+            path = os.path.join(out, 'mirror%d-%s.mpz' % (mirror, share))
+            # The second write serializes shared subtrees from their cache
+            (write, _) = timed(lambda: mymap.write(path, compresslevel=1, progress=False))
+            (rewrite, _) = timed(lambda: mymap.write(path, compresslevel=1, progress=False))
+            written.append(gzip.open(path).read())
+            mymap.world = None
+            del world
+
+            print('%-6d %-6s %9d %9d %8.1fMB %8.2f %8.2f %8.2f' % (
+                mirror, share, nodes, distinct, memory / 2**20, build, write, rewrite))
+        if written[0] != written[1]:
+            raise Exception("Shared octree wrote a different map")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+MagicaVoxel reader benchmark, comparing ``VoxFile`` with the Kaitai based
+``Magicavoxel`` parser on the prefab .vox files.
+
+For every file the best of several runs is reported, files the Kaitai
+parser cannot read are marked as such.
+"""
+import argparse
+import glob
+import os
+import time
+
+from redeclipse.magicavoxel.reader import Magicavoxel, VoxFile
+
+
+def best_of(func, path, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(path)
+        taken = time.perf_counter() - start
+        if best is None or taken < best:
+            best = taken
+    return best
+
+
+def kaitai(path):
+    model = Magicavoxel.from_file(path)
+    model._io.close()
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark .vox readers')
+    parser.add_argument('paths', nargs='*', default=['redeclipse/prefabs', 'redeclipse/magicavoxel/rooms'],
+                        help='Directories or .vox files')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per file, best is reported')
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '**', '*.vox'), recursive=True)))
+        else:
+            files.append(path)
+
+    totals = [0, 0]
+    print('%-40s %8s %10s %10s %8s' % ('file', 'voxels', 'kaitai', 'native', 'speedup'))
+    for path in files:
+        voxels = len(VoxFile.from_file(path).voxels)
+        native = best_of(VoxFile.from_file, path, args.repeat)
+        try:
+            old = best_of(kaitai, path, args.repeat)
+        except Exception:
+            print('%-40s %8d %10s %10.5f %8s' % (os.path.basename(path), voxels, 'fails', native, '-'))
+            continue
+        totals[0] += old
+        totals[1] += native
+        print('%-40s %8d %10.5f %10.5f %7.0fx' % (os.path.basename(path), voxels, old, native, old / native))
+    if totals[1]:
+        print('%-40s %8s %10.5f %10.5f %7.0fx' % ('total', '', totals[0], totals[1], totals[0] / totals[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the map toolchain, to catch performance regressions.
+
+Record a baseline, make changes, then compare against it::
+
+    python benchmarks/suite.py run -o baseline.json
+    python benchmarks/suite.py run -o current.json
+    python benchmarks/suite.py compare baseline.json current.json --threshold 0.15
+
+``compare`` exits with status 1 if any benchmark got slower by more than the
+threshold (a fraction of the baseline time). ``run -k`` selects benchmarks by
+(glob) name, ``list`` shows them all.
+
+Every benchmark prepares its input (untimed) before each run, and seeds
+``random`` with a fixed seed before both, so every run does the same work.
+The best time of all runs is used for comparisons, it is the least affected
+by whatever else the machine is doing.
+"""
+import argparse
+import fnmatch
+import functools
+import glob
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from bench_octree import FILLS, fill_terrain
+
+from redeclipse import MapParser, aftereffects
+from redeclipse.magicavoxel.reader import VoxFile
+from redeclipse.magicavoxel.writer import to_magicavoxel
+from redeclipse.prefabs import castle, original, spacestation, STARTING_POSITION, TEXMAN
+from redeclipse.prefabs.construction_kit import ConstructionKitMixin
+from redeclipse.upm import UnusedPositionManager
+from redeclipse.vector import FineVector
+from redeclipse.vector.orientations import EAST, NORTH, SOUTH, WEST
+from redeclipse.voxel import DenseVoxelWorld, VoxelWorld
+
+SEED = 42
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> setup function, which returns the function to time
+BENCHMARKS = {}
+
+# Directory for the files written by benchmarks, for the length of a run
+_TMPDIR = {}
+
+
+class Skip(Exception):
+    """
+    Raised by a setup function if its benchmark cannot run here
+    """
+
+
+def benchmark(name, *args):
+    """
+    Register a setup function (called with ``args``) as benchmark ``name``
+    """
+    def register(setup):
+        BENCHMARKS[name] = functools.partial(setup, *args)
+        return setup
+    return register
+
+
+def _world(fill, density, size=2**6):
+    v = VoxelWorld(size=size)
+    fill(v, density)
+    return v
+
+
+def _upm(rooms, mirror):
+    upm = UnusedPositionManager(2**8, mirror=mirror)
+    upm.register_room(spacestation.station_tubeX(pos=STARTING_POSITION, orientation=EAST))
+    # Progress bars would add terminal output to the timings
+    upm.place_rooms(False, [original.spawn_room, castle.castle_gate, castle.castle_gate_simple, castle.castle_large], rooms=rooms, progress=False)
+    return upm
+
+
+@functools.lru_cache()
+def _generated_map():
+    """
+    A map with a terrain world, written to a temporary file, as the maps
+    shipped in maps/ are either empty or not supported by the parser
+    """
+    mymap = MapParser().read(os.path.join(ROOT, 'maps', 'empty-day.mpz'))
+    mymap.world = _world(fill_terrain, None, size=2**7).to_octree()
+    mymap.world[0].octsav = 0
+    path = os.path.join(_TMPDIR['path'], 'generated.mpz')
+    mymap.write(path, progress=False)
+    return path
+
+
+def _map_path(name):
+    if name == 'generated':
+        return _generated_map()
+    return os.path.join(ROOT, 'maps', name + '.mpz')
+
+
+def _read_map(name, **kwargs):
+    try:
+        return MapParser().read(_map_path(name), **kwargs)
+    except Exception as e:
+        raise Skip('%s: %s' % (e.__class__.__name__, e))
+
+
+MAPS = ['generated'] + [
+    os.path.basename(path)[:-len('.mpz')] for path in sorted(glob.glob(os.path.join(ROOT, 'maps', '*.mpz')))
+]
+
+for name in MAPS:
+    @benchmark('map_read/' + name, name)
+    def map_read(name):
+        # Unsupported maps are skipped, rather than timing their failure
+        _read_map(name)
+        return lambda: MapParser().read(_map_path(name))
+
+    @benchmark('map_read_lazy/' + name, name)
+    def map_read_lazy(name):
+        # Only reads up to the octree, which most shipped maps support
+        _read_map(name, lazy=True)
+        return lambda: MapParser().read(_map_path(name), lazy=True)
+
+    @benchmark('map_write/' + name, name)
+    def map_write(name):
+        mymap = _read_map(name)
+        path = os.path.join(_TMPDIR['path'], 'out.mpz')
+        return lambda: mymap.write(path, progress=False)
+
+
+for name in MAPS:
+    for world_class in (VoxelWorld, DenseVoxelWorld):
+        @benchmark('from_octree/%s/%s' % (world_class.__name__, name), name, world_class)
+        def from_octree(name, world_class):
+            mymap = _read_map(name)
+            return lambda: world_class.from_octree(mymap.world, mymap.meta['worldsize'], size=2**8)
+
+
+for (name, fill, density) in FILLS:
+    @benchmark('to_octree/' + name, fill, density)
+    def to_octree(fill, density):
+        v = _world(fill, density)
+        return v.to_octree
+
+
+for rooms in (50, 200, 800):
+    for mirror in (1, 2, 4):
+        @benchmark('place_rooms/%d/mirror%d' % (rooms, mirror), rooms, mirror)
+        def place_rooms(rooms, mirror):
+            return lambda: _upm(rooms, mirror)
+
+
+CONSTRUCTIONS = [
+    ('cube', (FineVector(1, 2, 3), )),
+    ('column', (FineVector(1, 2, 0), FineVector(0, 0, 1), 8)),
+    ('wall', (FineVector(0, 0, 0), NORTH)),
+    ('ring', (FineVector(0, 0, 0), 8)),
+    ('floor', (FineVector(0, 0, 0), )),
+    ('rectangular_prism', (FineVector(0, 0, 0), FineVector(8, 8, 8))),
+]
+
+for (construction, args) in CONSTRUCTIONS:
+    @benchmark('construction_kit/' + construction, construction, args)
+    def construction_kit(construction, args):
+        # A room in every orientation, on every tile of a 16x16 grid
+        kits = []
+        for i in range(16 * 16):
+            kit = ConstructionKitMixin()
+            kit.pos = FineVector(8 * (i % 16), 8 * (i // 16), 8)
+            kit.orientation = (EAST, NORTH, WEST, SOUTH)[i % 4]
+            kits.append(kit)
+        v = VoxelWorld(size=2**8)
+
+        def run():
+            for kit in kits:
+                kit.x(construction, v, *args, tex=2)
+        return run
+
+
+@benchmark('magicavoxel/read')
+def magicavoxel_read():
+    paths = sorted(glob.glob(os.path.join(ROOT, 'redeclipse', 'prefabs', '**', '*.vox'), recursive=True))
+    return lambda: [VoxFile.from_file(path) for path in paths]
+
+
+@benchmark('magicavoxel/write')
+def magicavoxel_write():
+    v = _world(fill_terrain, None, size=2**7)
+    return lambda: to_magicavoxel(v, io.BytesIO(), TEXMAN)
+
+
+AFTEREFFECTS = [
+    ('decay', lambda v: aftereffects.decay(v, aftereffects.vertical_gradient2inv, seed=SEED)),
+    ('growth', lambda v: aftereffects.growth(v, aftereffects.vertical_gradient2, seed=SEED)),
+    ('grid', lambda v: aftereffects.grid(v, size=16)),
+    ('box_outline', lambda v: aftereffects.box_outline(v)),
+]
+
+for (name, effect) in AFTEREFFECTS:
+    @benchmark('aftereffects/' + name, effect)
+    def aftereffect(effect):
+        v = _world(fill_terrain, None, size=2**7)
+        return lambda: effect(v)
+
+
+@benchmark('aftereffects/endcap')
+def aftereffect_endcap():
+    v = VoxelWorld(size=2**8)
+    upm = _upm(200, 2)
+    return lambda: aftereffects.endcap(v, upm, progress=False)
+
+
+def run_benchmark(setup, repeat):
+    """
+    Time the function returned by ``setup``, ``repeat`` times with fresh
+    inputs
+
+    :returns: the times taken, in seconds
+    :rtype: list(float)
+    """
+    times = []
+    for i in range(repeat):
+        random.seed(SEED)
+        func = setup()
+        random.seed(SEED)
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def select(patterns):
+    if not patterns:
+        return list(BENCHMARKS)
+    return [name for name in BENCHMARKS if any(fnmatch.fnmatch(name, p) or p in name for p in patterns)]
+
+
+def cmd_run(args):
+    results = {}
+    skipped = {}
+    print('%-40s %10s %10s' % ('benchmark', 'best', 'median'))
+    with tempfile.TemporaryDirectory() as path:
+        _TMPDIR['path'] = path
+        try:
+            for name in select(args.k):
+                try:
+                    times = run_benchmark(BENCHMARKS[name], args.repeat)
+                except Skip as e:
+                    skipped[name] = str(e)
+                    print('%-40s skipped (%s)' % (name, e))
+                    continue
+                results[name] = {'best': min(times), 'median': statistics.median(times), 'times': times}
+                print('%-40s %10.4f %10.4f' % (name, min(times), statistics.median(times)))
+        finally:
+            # The generated map is in the directory
+            _generated_map.cache_clear()
+            del _TMPDIR['path']
+
+    if args.output:
+        report = {
+            'meta': {
+                'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': args.repeat,
+                'seed': SEED,
+            },
+            'results': results,
+            'skipped': skipped,
+        }
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+
+
+def compare(baseline, current, threshold, stat='best'):
+    """
+    Compare two reports written by ``run``
+
+    :returns: a (name, baseline time, current time, ratio) row per
+              benchmark in both reports, and the names of those which got
+              slower by more than ``threshold``
+    :rtype: tuple(list(tuple), list(str))
+    """
+    rows = []
+    slower = []
+    for name in sorted(set(baseline['results']) & set(current['results'])):
+        (old, new) = (baseline['results'][name][stat], current['results'][name][stat])
+        ratio = new / old if old else float('inf')
+        rows.append((name, old, new, ratio))
+        if ratio > 1 + threshold:
+            slower.append(name)
+    return rows, slower
+
+
+def cmd_compare(args):
+    baseline = json.load(open(args.baseline))
+    current = json.load(open(args.current))
+    (rows, slower) = compare(baseline, current, args.threshold, stat=args.stat)
+
+    print('%-40s %10s %10s %8s' % ('benchmark', 'baseline', 'current', 'change'))
+    for (name, old, new, ratio) in rows:
+        flag = ''
+        if name in slower:
+            flag = 'SLOWER'
+        elif ratio < 1 - args.threshold:
+            flag = 'faster'
+        print('%-40s %10.4f %10.4f %+7.1f%% %s' % (name, old, new, 100 * (ratio - 1), flag))
+
+    for name in sorted(set(baseline['results']) - set(current['results'])):
+        print('%-40s missing from %s' % (name, args.current))
+    for name in sorted(set(current['results']) - set(baseline['results'])):
+        print('%-40s new, not in %s' % (name, args.baseline))
+
+    if slower:
+        print('%d of %d benchmarks slower by more than %.0f%%' % (len(slower), len(rows), 100 * args.threshold))
+        sys.exit(1)
+
+
+def cmd_list(args):
+    for name in select(args.k):
+        print(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Map toolchain benchmark suite')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run = subparsers.add_parser('run', help='Run the benchmarks')
+    run.add_argument('-k', nargs='*', help='Only run benchmarks matching these names or glob patterns')
+    run.add_argument('--repeat', type=int, default=5, help='Number of runs per benchmark')
+    run.add_argument('-o', '--output', help='Write the results to this .json file')
+    run.set_defaults(func=cmd_run)
+
+    comp = subparsers.add_parser('compare', help='Compare two sets of results')
+    comp.add_argument('baseline', help='Results of the reference run')
+    comp.add_argument('current', help='Results to check against the reference')
+    comp.add_argument('--threshold', type=float, default=0.1, help='Allowed slowdown, as a fraction of the baseline time')
+    comp.add_argument('--stat', default='best', choices=['best', 'median'], help='Statistic to compare')
+    comp.set_defaults(func=cmd_compare)
+
+    listing = subparsers.add_parser('list', help='List the benchmarks')
+    listing.add_argument('-k', nargs='*', help='Only list benchmarks matching these names or glob patterns')
+    listing.set_defaults(func=cmd_list)
+
+    args = parser.parse_args()
+    # Keep progress messages out of the timings
+    logging.disable(logging.INFO)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
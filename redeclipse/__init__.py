@@ -1,9 +1,14 @@
-import sys
+import functools
 import gzip
+import os
 import struct
+import sys
 from collections import OrderedDict
 from redeclipse.enums import EntType, Faces, VTYPE, OCT, TextNum
-from redeclipse.objects import VSlot, SlotShaderParam, cube, SurfaceInfo
+from redeclipse.objects import VSlot, SlotShaderParam, cube, SolidCube, SurfaceInfo
+from redeclipse.mapindex import LazyCube, MapIndex, map_stat
+from redeclipse.octree import Octree
+from redeclipse.sharing import SharedCube, share_world
 from redeclipse.vector import FineVector
 from redeclipse.entities import Entity
 from tqdm import tqdm
@@ -12,6 +17,30 @@ import logging
 log = logging.getLogger(__name__)
 __version__ = "0.6"
 MAXSTRLEN = 512
+#: Amount of serialized data (in bytes) buffered before it is handed to gzip
+FLUSH_SIZE = 2 ** 20
+#: Amount of data (in bytes) first decompressed by lazy reads, in the hope
+#: that it holds everything up to the octree
+HEADER_READ_SIZE = 2 ** 16
+
+#: Precompiled structs for the fixed-width fields found in a map file. These
+#: are shared by every reader and writer so the format strings are only
+#: compiled once.
+_INT = struct.Struct('i')
+_CHAR = struct.Struct('B')
+_FLOAT = struct.Struct('f')
+_USHORT = struct.Struct('H')
+_EDGES = struct.Struct('12B')
+_TEXTURES = struct.Struct('6H')
+_SURFACE = struct.Struct('4B')
+_FLOAT4 = struct.Struct('4f')
+_ENTBASE = struct.Struct('fffcccci')
+#: Plain int copies of the octree node types, avoids an Enum lookup per node.
+_OCTSAV_CHILDREN = OCT.OCTSAV_CHILDREN.value
+_OCTSAV_EMPTY = OCT.OCTSAV_EMPTY.value
+_OCTSAV_SOLID = OCT.OCTSAV_SOLID.value
+_OCTSAV_NORMAL = OCT.OCTSAV_NORMAL.value
+_OCTSAV_LODCUBE = OCT.OCTSAV_LODCUBE.value
 
 
 def tb(str_or_bytes):
@@ -79,30 +108,59 @@ class Map:
         self.ents = ents
         self.vslots = vslots
         self.chg = chg
+        self._load_world = None
         self.world = worldroot
         self.cfg_extra = []
 
-    def write(self, path):
+    @property
+    def world(self):
+        """
+        The eight top level cubes of the octree. Maps read with
+        ``MapParser.read(lazy=True)`` only read these when first used.
+        """
+        if self._load_world is not None:
+            self._world = self._load_world()
+            self._load_world = None
+        return self._world
+
+    @world.setter
+    def world(self, value):
+        self._world = value
+        self._load_world = None
+
+    def write(self, path, compresslevel=9, progress=True, flush_size=FLUSH_SIZE):
         """
         Write map to disk
 
+        The map is serialized into an in-memory buffer which is handed to
+        the gzip stream whenever it grows past ``flush_size`` bytes, rather
+        than issuing one tiny write per field.
+
         :param path: Path to write to
         :type path: str
+
+        :param int compresslevel: gzip compression level (0-9)
+        :param bool progress: Show a progress bar while writing the octree
+        :param int flush_size: Buffer size (in bytes) at which the
+                               serialized data is flushed to the gzip stream.
         """
         log.info('WRITING')
-        handle = gzip.open(path, 'wb')
-        self._write_str(handle, tb(self.magic), null=False)
+        # Lazily read maps read their octree from the original file, which
+        # may be the one being overwritten.
+        world = self.world
+        buf = bytearray()
+        self._write_str(buf, tb(self.magic), null=False)
         # Write the version
-        self._write_int(handle, self.version)
+        self._write_int(buf, self.version)
         # Write the header size (Surely some way to calc from self.meta?)
-        self._write_int(handle, self.headersize)
+        self._write_int(buf, self.headersize)
         # Write the header block
         self.meta['numents'] = len(self.ents)
         for key in self.meta:
             if key in ('gameident', 'skybox', 'z'):
-                self._write_str(handle, tb(self.meta[key]))
+                self._write_str(buf, tb(self.meta[key]))
             else:
-                self._write_int(handle, self.meta[key])
+                self._write_int(buf, self.meta[key])
 
         # Write the map vars
         for key in self.map_vars:
@@ -110,92 +168,92 @@ class Map:
             value = self.map_vars[key]
             var_type = type(self.map_vars[key]).__name__
 
-            self._write_int(handle, len(var_name))
-            self._write_str(handle, var_name)
+            self._write_int(buf, len(var_name))
+            self._write_str(buf, var_name)
 
             if var_type == 'int':
-                self._write_int(handle, 0)
-                self._write_int(handle, value)
+                self._write_int(buf, 0)
+                self._write_int(buf, value)
             elif var_type == 'float':
-                self._write_int(handle, 1)
-                self._write_float(handle, value)
+                self._write_int(buf, 1)
+                self._write_float(buf, value)
             elif var_type in ('bytes', 'str'):
-                self._write_int(handle, 2)
-                self._write_int(handle, len(value))
-                self._write_str(handle, value)
+                self._write_int(buf, 2)
+                self._write_int(buf, len(value))
+                self._write_str(buf, value)
             else:
                 raise Exception("Can't handle " + var_type)
 
         # Texmru
-        self._write_ushort(handle, len(self.texmru))  # nummru
+        self._write_ushort(buf, len(self.texmru))  # nummru
         for value in self.texmru:
-            self._write_ushort(handle, value)
+            self._write_ushort(buf, value)
 
         # Entities
-        self._write_ents(handle, self.ents)
+        self._write_ents(buf, self.ents)
 
-        # sys.exit()
         # Textures
-        self.__write_vslots(handle, self.vslots, self.chg)
-
-        # World
-        self.pbar_0 = tqdm(total=8)
-        # self.pbar_1 = tqdm(total=8)
-        self._savechildren(handle, self.world)
-        self.pbar_0.close()
-        # self.pbar_1.close()
-
-    def _write_custom(self, handle, fmt, data):
-        handle.write(struct.pack(fmt, *data))
-
-    def _write_char(self, handle, char):
-        handle.write(struct.pack('B', char))
-
-    def _write_int_as_chr(self, handle, data):
-        handle.write(struct.pack('c', str.encode(chr(data))))
-
-    def _write_int(self, handle, value):
+        self.__write_vslots(buf, self.vslots, self.chg)
+
+        with gzip.open(path, 'wb', compresslevel=compresslevel) as handle:
+            self._handle = handle
+            self._buf = buf
+            self._flush_size = flush_size
+            # World
+            self._pbar = tqdm(total=len(world)) if progress else None
+            try:
+                self._savechildren(buf, world)
+                handle.write(buf)
+            finally:
+                if self._pbar:
+                    self._pbar.close()
+                self._handle = None
+                self._buf = None
+                self._pbar = None
+
+    def _write_custom(self, buf, fmt, data):
+        buf += struct.pack(fmt, *data)
+
+    def _write_char(self, buf, char):
+        buf.append(char)
+
+    def _write_int_as_chr(self, buf, data):
+        buf.append(data)
+
+    def _write_int(self, buf, value):
         if isinstance(value, int):
-            handle.write(struct.pack('i', value))
+            buf += _INT.pack(value)
         elif isinstance(value, float):
-            handle.write(struct.pack('i', int(value)))
+            buf += _INT.pack(int(value))
         else:
-            handle.write(struct.pack('i', value.value))
+            buf += _INT.pack(value.value)
 
-    def _write_ushort(self, handle, value):
-        handle.write(struct.pack('H', value))
+    def _write_ushort(self, buf, value):
+        buf += _USHORT.pack(value)
 
-    def _write_float(self, handle, value):
-        handle.write(struct.pack('f', value))
+    def _write_float(self, buf, value):
+        buf += _FLOAT.pack(value)
 
-    def _write_str(self, handle, value, null=True):
-        strlen = len(value)
+    def _write_str(self, buf, value, null=True):
+        buf += value
         if null:
-            strlen += 1
+            buf.append(0)
 
-        fmt = '%ds' % strlen
-        handle.write(struct.pack(fmt, value))
-
-    def _write_ents(self, handle, ents):
+    def _write_ents(self, buf, ents):
         for ent in ents:
-            # (x, y, z, etype, a, b, c) = self._read_custom('fffcccc', sizeof_entbase)
-            self._write_custom(
-                handle,
-                'fffcccc',
-                ent.serialize()
-            )
-
-            self._write_int(handle, len(ent.attrs))
+            # Entity base and attribute count in one go, the inverse of
+            # MapParser._loadents.
+            buf += _ENTBASE.pack(*ent.serialize(), len(ent.attrs))
             for at in ent.attrs:
-                self._write_int(handle, at)
+                self._write_int(buf, at)
 
-            self._write_int(handle, len(ent.links))
+            self._write_int(buf, len(ent.links))
             for ln in ent.links:
-                self._write_int(handle, ln)
+                self._write_int(buf, ln)
 
-    def __write_vslots(self, handle, vslots, chg):
+    def __write_vslots(self, buf, vslots, chg):
         for num in chg:
-            self._write_int(handle, num)
+            self._write_int(buf, num)
             if num < 0:
                 pass
             else:
@@ -204,30 +262,65 @@ class Map:
     def _write_vslot(self, vs, changed):
         pass
 
-    def _savechildren(self, handle, cube_arr, indent=0):
+    def _savechildren(self, buf, cube_arr, indent=0):
         if cube_arr:
-            for i, c in enumerate(cube_arr):
-                # TODO: Progress
-                if indent == 0:
-                    self.pbar_0.update(i)
-                # elif indent == 1:
-                    # self.pbar_1.update(i)
-                self._savec(handle, c, indent=indent)
-
-    def _savec(self, handle, c, indent=0):
+            for c in cube_arr:
+                self._savec(buf, c, indent=indent)
+                if indent == 0 and self._pbar:
+                    self._pbar.update(1)
+
+            # Hand off full chunks to the gzip stream, but not those of
+            # subtrees serialized on their own
+            if buf is self._buf and len(buf) >= self._flush_size:
+                self._handle.write(buf)
+                del buf[:]
+
+    def _savec(self, buf, c, indent=0):
         """Inverse of _loadc"""
-
-        self._write_int_as_chr(handle, c.octsav)
-        if c.octsav & 0x7 == OCT.OCTSAV_CHILDREN.value:
-            self._savechildren(handle, c.children, indent=indent + 1)
+        if type(c) is SolidCube:
+            # Shared cubes always serialize to the same bytes, so only do
+            # that once per instance.
+            if c.packed is None:
+                packed = bytearray()
+                self._savec_fields(packed, c)
+                c.packed = bytes(packed)
+            buf += c.packed
+            return
+        if type(c) is SharedCube:
+            # Serialize leaves and subtrees used more than once only once
+            if c.packed is not None:
+                buf += c.packed
+                return
+            if c.reused or not c.children:
+                packed = bytearray()
+                self._savec_fields(packed, c, indent=indent)
+                c.packed = bytes(packed)
+                buf += c.packed
+                return
+        if type(c) is LazyCube:
+            # Subtrees of lazily read maps which were never decoded are
+            # copied as is, but for their node type.
+            encoded = c.encoded()
+            if encoded is not None and c.octsav & 0x7 == _OCTSAV_CHILDREN:
+                buf.append(c.octsav)
+                buf += encoded[1:]
+                return
+        self._savec_fields(buf, c, indent=indent)
+
+    def _savec_fields(self, buf, c, indent=0):
+        octsav = c.octsav
+        buf.append(octsav)
+        kind = octsav & 0x7
+        if kind == _OCTSAV_CHILDREN:
+            self._savechildren(buf, c.children, indent=indent + 1)
             return
-        elif c.octsav & 0x7 == OCT.OCTSAV_EMPTY.value:
+        elif kind == _OCTSAV_EMPTY:
             pass  # Nothing to write
-        elif c.octsav & 0x7 == OCT.OCTSAV_SOLID.value:
+        elif kind == _OCTSAV_SOLID:
             pass  # Nothing to write, simply that c is solid
-        elif c.octsav & 0x7 == OCT.OCTSAV_NORMAL.value:
-            self._write_custom(handle, 'BBBBBBBBBBBB', c.edges)
-        elif c.octsav & 0x7 == OCT.OCTSAV_LODCUBE.value:
+        elif kind == _OCTSAV_NORMAL:
+            buf += _EDGES.pack(*c.edges)
+        elif kind == _OCTSAV_LODCUBE:
             # Nothing to do, this just set c.children, which we know
             # from other sources.
             pass
@@ -235,30 +328,35 @@ class Map:
             sys.exit(42)
             return
 
-        for i, t in enumerate(c.texture):
-            if isinstance(t, TextNum):
-                self._write_ushort(handle, t.value)
-            else:
-                self._write_ushort(handle, t)
+        try:
+            buf += _TEXTURES.pack(*c.texture)
+        except struct.error:
+            # Some textures are still TextNum values
+            buf += _TEXTURES.pack(*[
+                t.value if isinstance(t, TextNum) else t
+                for t in c.texture
+            ])
 
-        if c.octsav & 0x40:
-            self._write_ushort(handle, c.material)
-        if c.octsav & 0x80:
-            self._write_int_as_chr(handle, c.merged)
-        if c.octsav & 0x20:
-            self._write_int_as_chr(handle, c.surfmask)
-            self._write_int_as_chr(handle, c.totalverts)
+        if octsav & 0x40:
+            buf += _USHORT.pack(c.material)
+        if octsav & 0x80:
+            buf.append(c.merged)
+        if octsav & 0x20:
+            surfmask = c.surfmask
+            buf.append(surfmask)
+            buf.append(c.totalverts)
 
             for i in range(6):
-                if not c.surfmask & (1 << i):
+                if not surfmask & (1 << i):
                     pass
                 else:
                     surfinfo = c.ext.surfaces[i]
-
-                    self._write_char(handle, surfinfo.lmid[0])
-                    self._write_char(handle, surfinfo.lmid[1])
-                    self._write_char(handle, surfinfo.verts)
-                    self._write_char(handle, surfinfo.numverts)
+                    buf += _SURFACE.pack(
+                        surfinfo.lmid[0],
+                        surfinfo.lmid[1],
+                        surfinfo.verts,
+                        surfinfo.numverts
+                    )
 
                     if surfinfo.verts == 0:
                         continue
@@ -277,11 +375,15 @@ class Map:
             'map_vars': [(bytes.decode(key), bytes.decode(value) if isinstance(value, bytes) else value) for (key, value) in self.map_vars.items()],
             'texmru': self.texmru,
             'entities': [ent.to_dict() for ent in self.ents],
-            'world': (x.to_dict() for x in self.world),
+            # Not read from lazily read maps unless used
+            'world': (x.to_dict() for x in self._world_cubes()),
             'vslots': (x.to_dict() for x in self.vslots),
             'chg': self.chg,
         }
 
+    def _world_cubes(self):
+        yield from self.world
+
     def to_json(self):
         """
         Return self.to_dict as json
@@ -323,6 +425,14 @@ class Map:
 
         return m
 
+    def octree(self):
+        """
+        Query layer over the map's geometry, see ``redeclipse.octree``
+
+        :rtype: redeclipse.octree.Octree
+        """
+        return Octree(self.world, self.meta['worldsize'])
+
     def skybox(self, sb):
         """
         Attach a skybox to the map
@@ -332,42 +442,90 @@ class Map:
 
 
 class MapParser(object):
+    """
+    Parse a gzipped map file.
+
+    The decompressed map is held in a ``memoryview`` and every field is
+    decoded in place with ``Struct.unpack_from`` and a cursor
+    (``self.index``), so no intermediate ``bytes`` objects are created
+    while walking the file.
+    """
+
+    #: Cache of ``Struct`` objects for variable length reads, keyed by
+    #: format string.
+    _structs = {}
+    #: Indexes built by lazy reads, keyed by map path, size and
+    #: modification time, and index depth.
+    _map_indexes = {}
+
+    def _struct(self, fmt):
+        s = self._structs.get(fmt, None)
+        if s is None:
+            s = self._structs[fmt] = struct.Struct(fmt)
+        return s
 
-    def __read_custom(self, pattern, width):
-        val = struct.unpack(pattern, self.bytes[self.index:self.index + width])
-        self.index += width
+    def _share(self, value):
+        """
+        Return a single instance for every equal tuple read, most cubes in
+        a map have the same edges and one of a few texture combinations.
+        """
+        return self._shared.setdefault(value, value)
+
+    def __read_custom(self, st):
+        val = st.unpack_from(self.view, self.index)
+        self.index += st.size
         return val
 
     def _read_int(self):
-        val = self._read_custom('i', 4)[0]
+        val = _INT.unpack_from(self.view, self.index)[0]
+        self.index += 4
         return val
 
     def _read_char(self):
-        val = self._read_custom('B', 1)[0]
+        val = self.view[self.index]
+        self.index += 1
         return val
 
-    def _read_custom(self, pattern, width):
-        val = self.__read_custom(pattern, width)
-        return val
+    def _read_custom(self, pattern, width=None):
+        """
+        Read a struct pattern at the cursor.
+
+        :param str pattern: ``struct`` format string
+        :param int width: Deprecated, the width is computed from the pattern.
+        """
+        return self.__read_custom(self._struct(pattern))
 
     def _read_float(self):
-        val = self._read_custom('f', 4)[0]
+        val = _FLOAT.unpack_from(self.view, self.index)[0]
+        self.index += 4
         return val
 
     def _read_ushort(self):
-        val = self._read_custom('H', 2)[0]
+        val = _USHORT.unpack_from(self.view, self.index)[0]
+        self.index += 2
         return val
 
+    def _read_ints(self, count):
+        """Read ``count`` consecutive ints in a single call"""
+        if count <= 0:
+            return []
+        return list(self.__read_custom(self._struct('%di' % count)))
+
+    def _read_ushorts(self, count):
+        """Read ``count`` consecutive unsigned shorts in a single call"""
+        if count <= 0:
+            return []
+        return list(self.__read_custom(self._struct('%dH' % count)))
+
     def _read_str(self, strlen, null=True):
         if null:
             # Strings are null terminated
             strlen += 1
-        fmt = '%ds' % strlen
-        data = struct.unpack(fmt, self.bytes[self.index:self.index + strlen])
+        data = bytes(self.view[self.index:self.index + strlen])
         self.index += strlen
         if null:
-            return data[0][0:-1]
-        return data[0]
+            return data[0:-1]
+        return data
 
     def _loadvslots(self, numvslots):
         prev = [-1] * numvslots
@@ -406,12 +564,7 @@ class MapParser(object):
                 name = self._read_str(nlen, null=False)
                 ssp.name = name
                 ssp.loc = -1
-                ssp.val = [
-                    self._read_float(),
-                    self._read_float(),
-                    self._read_float(),
-                    self._read_float(),
-                ]
+                ssp.val = list(self.__read_custom(_FLOAT4))
                 if flags & 0x8000:
                     ssp.palette = self._read_int()
                     ssp.palindex = self._read_int()
@@ -463,27 +616,27 @@ class MapParser(object):
 
     def _loadc(self, c, size, failed, indent=0):
         """Loads a single cube? Or rather, based on C, processes it into a cube object?"""
-        octsav = self._read_char()
+        octsav = self.view[self.index]
+        self.index += 1
         c.octsav = octsav
         c.haschildren = False
-        if octsav & 0x7 == OCT.OCTSAV_CHILDREN.value:
+        kind = octsav & 0x7
+        if kind == _OCTSAV_CHILDREN:
             c.children = self._loadchildren(size >> 1, failed, indent=indent + 1)
             return False, c
-        elif octsav & 0x7 == OCT.OCTSAV_EMPTY.value:
+        elif kind == _OCTSAV_EMPTY:
             c.setfaces(Faces.F_EMPTY)
-        elif octsav & 0x7 == OCT.OCTSAV_SOLID.value:
+        elif kind == _OCTSAV_SOLID:
             c.setfaces(Faces.F_SOLID)
-        elif octsav & 0x7 == OCT.OCTSAV_NORMAL.value:
-            c.edges = self._read_custom('BBBBBBBBBBBB', 12)
-        elif octsav & 0x7 == OCT.OCTSAV_LODCUBE.value:
+        elif kind == _OCTSAV_NORMAL:
+            c.edges = self._share(self.__read_custom(_EDGES))
+        elif kind == _OCTSAV_LODCUBE:
             c.haschildren = True
         else:
             failed = True
             return failed, c
 
-        c.texture = []
-        for i in range(6):
-            c.texture.append(self._read_ushort())
+        c.texture = self._share(self.__read_custom(_TEXTURES))
 
         if octsav & 0x40:
             c.material = self._read_ushort()
@@ -501,12 +654,7 @@ class MapParser(object):
                     c.ext.surfaces.append(None)
                 else:
                     c.ext.surfaces.append(
-                        SurfaceInfo(
-                            self._read_char(),
-                            self._read_char(),
-                            self._read_char(),
-                            self._read_char()
-                        )
+                        SurfaceInfo(*self.__read_custom(_SURFACE))
                     )
 
                     surf = c.ext.surfaces[i]
@@ -521,10 +669,11 @@ class MapParser(object):
         return failed, c
 
     def _loadents(self, numents):
-        sizeof_entbase = 16
         ents = []
         for i in range(int(numents)):
-            (x, y, z, etype, a, b, c) = self._read_custom('fffcccc', sizeof_entbase)
+            # The entity base is immediately followed by the attr count, so
+            # grab both at once.
+            (x, y, z, etype, a, b, c, numattr) = self.__read_custom(_ENTBASE)
 
             # This says reserved but we've seen values in it so...
             reserved = [
@@ -533,38 +682,24 @@ class MapParser(object):
                 ord(c)
             ]
 
-            numattr = self._read_int()
-            attrs = []
-            for j in range(numattr):
-                attrs.append(self._read_int())
+            attrs = self._read_ints(numattr)
 
             link_count = self._read_int()
-            links = []
-            for j in range(link_count):
-                links.append(self._read_int())
+            links = self._read_ints(link_count)
 
             e = Entity(FineVector(x, y, z) / 4, EntType(ord(etype)), attrs, links, reserved)
             ents.append(e)
         return ents
 
-    def read(self, base_path):
+    def _read_header(self):
         """
-        Parse a map into a ``redeclipse.Map`` object
-
-        :param base_path: path to gzipped map file.
-        :type base_path: str
+        Read everything up to the octree
         """
-        self.base_path = base_path
-        self.index = 0
-
-        with gzip.open(base_path) as handle:
-            self.bytes = handle.read()
-
         magic = self._read_str(4, null=False)
         if magic not in (b'MAPZ', b'BFGZ'):
             raise Exception("Not a mapz file")
 
-        log.debug('Loading map: %s', base_path)
+        log.debug('Loading map: %s', self.base_path)
         log.debug('Header Magic: %s', magic)
         version = self._read_int()
         log.debug('Version: %s', version)
@@ -575,9 +710,7 @@ class MapParser(object):
                      'lightmaps', 'blendmap', 'numvslots',
                      'gamever', 'revision')
         # 'gameident', 'numvars')
-        meta = OrderedDict()
-        for k in meta_keys:
-            meta[k] = self._read_int()
+        meta = OrderedDict(zip(meta_keys, self._read_ints(len(meta_keys))))
 
         # char[4], null=True
         meta['gameident'] = self._read_str(3)
@@ -606,11 +739,9 @@ class MapParser(object):
 
             map_vars[var_name] = var_val
 
-        texmru = []
         nummru = self._read_ushort()
         log.debug('Nummru %s', nummru)
-        for i in range(nummru):
-            texmru.append(self._read_ushort())
+        texmru = self._read_ushorts(nummru)
 
         # Entities
         log.debug('Header.numents %s', meta['numents'])
@@ -621,6 +752,131 @@ class MapParser(object):
         vslots, chg = self._loadvslots(meta['numvslots'])
         log.debug("Loaded %s vslots", len(vslots))
 
+        return (magic, version, headersize, meta, map_vars, texmru, ents, vslots, chg)
+
+    def _loadsubtree(self, subtree, size):
+        """
+        Children of the lazily read cube stored at ``subtree``, see
+        ``redeclipse.mapindex``
+        """
+        if subtree.children is not None:
+            return [self._lazyc(s, size >> 1) for s in subtree.children]
+        self.index = subtree.offset + 1
+        children = self._loadchildren(size >> 1, False)
+        cube.validatec(children, size >> 1)
+        return children
+
+    def _lazyc(self, subtree, size):
+        """
+        The cube stored at ``subtree``, whose children (if any) are only
+        decoded when used
+        """
+        if self.view[subtree.offset] & 0x7 == _OCTSAV_CHILDREN:
+            return LazyCube(self, subtree, size)
+        self.index = subtree.offset
+        (failed, c) = self._loadc(cube.newcube(Faces.F_EMPTY, 0), size, False)
+        return c
+
+    def _read_prefix(self, base_path):
+        """
+        Read everything up to the octree, only decompressing as much of the
+        map as that takes
+        """
+        size = HEADER_READ_SIZE
+        self.bytes = b''
+        with gzip.open(base_path) as handle:
+            while True:
+                more = handle.read(size - len(self.bytes))
+                self.bytes += more
+                self.view = memoryview(self.bytes)
+                self.index = 0
+                try:
+                    header = self._read_header()
+                    # Strings cut short by the end of the data go unnoticed
+                    if self.index <= len(self.bytes):
+                        return header
+                except (struct.error, IndexError):
+                    if not more:
+                        raise
+                if not more:
+                    raise Exception("Map is truncated")
+                size *= 2
+
+    def _lazy_world(self, base_path, prefix, worldsize, depth, index_path):
+        """
+        Read and index the octree of a lazily read map, see
+        ``redeclipse.mapindex``. Indexes are cached in memory, and in
+        ``index_path`` if given.
+        """
+        stat = map_stat(base_path)
+        with gzip.open(base_path) as handle:
+            self.bytes = handle.read()
+        if not self.bytes.startswith(prefix):
+            raise Exception("%s changed since it was read" % base_path)
+        self.view = memoryview(self.bytes)
+        self._shared = {}
+
+        key = (os.path.abspath(base_path), stat, depth)
+        index = self._map_indexes.get(key, None)
+        saved = None
+        if index_path is not None:
+            saved = MapIndex.load(index_path, depth, stat)
+            if index is None:
+                index = saved
+        if index is None:
+            log.debug("Indexing %s", base_path)
+            index = MapIndex.build(self.view, len(prefix), depth, stat=stat)
+        # Even if the index was cached in memory, the file may be missing or
+        # stale
+        if index_path is not None and saved is None:
+            index.save(index_path)
+        self._map_indexes[key] = index
+        return [self._lazyc(subtree, worldsize >> 1) for subtree in index.roots]
+
+    def read(self, base_path, lazy=False, index_depth=3, index_path=None, share=False):
+        """
+        Parse a map into a ``redeclipse.Map`` object
+
+        :param base_path: path to gzipped map file.
+        :type base_path: str
+
+        :param bool lazy: Only read the header, map variables, entities and
+                          vslots now. The octree is read when ``Map.world``
+                          is first used, and its subtrees are decoded when
+                          used (see ``redeclipse.mapindex``).
+        :param int index_depth: Number of levels of the octree indexed by
+                                lazy reads, the subtrees below are decoded
+                                as a whole.
+        :param str index_path: File to cache the index of lazy reads in,
+                               e.g. ``base_path + '.idx'``.
+        :param bool share: Share identical subtrees of the octree, see
+                           ``redeclipse.sharing``. Not supported by lazy
+                           reads.
+        """
+        if lazy and share:
+            raise Exception("Lazily read maps can not be shared")
+        self.base_path = base_path
+        self.index = 0
+        self._shared = {}
+
+        if lazy:
+            header = self._read_prefix(base_path)
+        else:
+            with gzip.open(base_path) as handle:
+                self.bytes = handle.read()
+            self.view = memoryview(self.bytes)
+            header = self._read_header()
+        (magic, version, headersize, meta, map_vars, texmru, ents, vslots, chg) = header
+
+        if lazy:
+            m = Map(magic, version, headersize, meta, map_vars, texmru, ents, vslots, chg, None)
+            # Read with a parser of its own, this one may be reused
+            m._load_world = functools.partial(
+                MapParser()._lazy_world, base_path, self.bytes[:self.index],
+                meta['worldsize'], index_depth, index_path
+            )
+            return m
+
         # arggghhh
         worldroot = []
         failed = False
@@ -631,6 +887,8 @@ class MapParser(object):
         )
 
         cube.validatec(worldroot, meta['worldsize'] >> 1)
+        if share:
+            worldroot = share_world(worldroot)
 
         worldscale = 0
         while 1 << worldscale < meta['worldsize']:
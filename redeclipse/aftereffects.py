@@ -1,11 +1,16 @@
 import random
+
+import numpy
 from tqdm import tqdm
-import math
 from redeclipse.objects import cube
 from redeclipse.prefabs.construction_kit import cube_points
 import logging
 log = logging.getLogger(__name__)
 
+# Position functions are called with numpy arrays of coordinates, shaped to
+# broadcast against each other (see ``numpy.ogrid``), and return an array of
+# values. Plain numbers are accepted too.
+
 
 def vertical_gradient(x, y, z, slope=256):
     """
@@ -13,14 +18,14 @@ def vertical_gradient(x, y, z, slope=256):
     f(z=256) = 0 smoothly.
 
     :param x: x-coordinate to use in gradient generation
-    :type x: int
+    :type x: int or numpy.ndarray
     :param y: y-coordinate to use in gradient generation
-    :type y: int
+    :type y: int or numpy.ndarray
     :param z: x-coordinate to use in gradient generation
-    :type z: int
+    :type z: int or numpy.ndarray
 
-    :returns: a float for that specific point.
-    :rtype: float
+    :returns: a float for that specific point, or an array of them.
+    :rtype: float or numpy.ndarray
     """
     return 1 - (z / slope)
 
@@ -30,16 +35,16 @@ def gradient3(x, y, z):
     An experimental gradient that also varies only based on z-depth
 
     :param x: x-coordinate to use in gradient generation
-    :type x: int
+    :type x: int or numpy.ndarray
     :param y: y-coordinate to use in gradient generation
-    :type y: int
+    :type y: int or numpy.ndarray
     :param z: x-coordinate to use in gradient generation
-    :type z: int
+    :type z: int or numpy.ndarray
 
-    :returns: a float for that specific point.
-    :rtype: float
+    :returns: a float for that specific point, or an array of them.
+    :rtype: float or numpy.ndarray
     """
-    return 2 - (2 / (1 + math.pow(1.001, - z)))
+    return 2 - (2 / (1 + numpy.power(1.001, -numpy.asarray(z, dtype=numpy.float64))))
 
 
 def vertical_gradient2(x, y, z):
@@ -47,21 +52,18 @@ def vertical_gradient2(x, y, z):
     Yet another variant that provides a reasonable level of decay.
 
     :param x: x-coordinate to use in gradient generation
-    :type x: int
+    :type x: int or numpy.ndarray
     :param y: y-coordinate to use in gradient generation
-    :type y: int
+    :type y: int or numpy.ndarray
     :param z: x-coordinate to use in gradient generation
-    :type z: int
+    :type z: int or numpy.ndarray
 
-    :returns: a float for that specific point.
-    :rtype: float
+    :returns: a float for that specific point, or an array of them.
+    :rtype: float or numpy.ndarray
     """
+    z = numpy.asarray(z, dtype=numpy.float64)
     result = 1.004742 - 0.0002448721 * z - 0.00001396083 * z * z
-    if result < 0:
-        result = 0
-    if result > 1:
-        result = 1
-    return result
+    return numpy.clip(result, 0, 1)
 
 
 def vertical_gradient2inv(x, y, z):
@@ -69,18 +71,51 @@ def vertical_gradient2inv(x, y, z):
     Inverse of vertical_gradient2
 
     :param x: x-coordinate to use in gradient generation
-    :type x: int
+    :type x: int or numpy.ndarray
     :param y: y-coordinate to use in gradient generation
-    :type y: int
+    :type y: int or numpy.ndarray
     :param z: x-coordinate to use in gradient generation
-    :type z: int
+    :type z: int or numpy.ndarray
 
-    :returns: a float for that specific point.
-    :rtype: float
+    :returns: a float for that specific point, or an array of them.
+    :rtype: float or numpy.ndarray
     """
     return 1 - vertical_gradient2(x, y, z)
 
 
+def _rng(seed):
+    """
+    Random generator for an effect. Without a seed, one is drawn from
+    ``random``, so effects follow ``random.seed`` like the rest of the
+    generation.
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    return numpy.random.default_rng(seed)
+
+
+def _evaluate(position_function, shape):
+    """
+    Evaluate a position function at every point of a grid of the given
+    shape, starting at the origin.
+    """
+    (x, y, z) = numpy.ogrid[0:shape[0], 0:shape[1], 0:shape[2]]
+    try:
+        values = position_function(x, y, z)
+    except (TypeError, ValueError):
+        # Position functions which only handle a single point
+        values = numpy.vectorize(position_function, otypes=[numpy.float64])(x, y, z)
+    return numpy.broadcast_to(values, shape)
+
+
+def _random_mask(position_function, shape, seed):
+    """
+    Points where a random number in [0, 1) exceeds the position function
+    """
+    values = _rng(seed).random(shape, dtype=numpy.float32)
+    return values > _evaluate(position_function, shape)
+
+
 def grid(world, size=24):
     """
     A grid effect applied to the world.
@@ -96,25 +131,19 @@ def grid(world, size=24):
     log.info('Applying Grid Effect')
 
     def pos_func(x, y, z):
-        return (x % size == 0 and y % size == 0) or \
-            (z % size == 0 and y % size == 0) or \
-            (z % size == 0 and x % size == 0)
+        return ((x % size == 0) & (y % size == 0)) | \
+            ((z % size == 0) & (y % size == 0)) | \
+            ((z % size == 0) & (x % size == 0))
 
-    for z in tqdm(range(world.zmax)):
-        for x in range(world.size):
-            for y in range(world.size):
-                if pos_func(x, y, z):
-                    if not world.get_point(x, y, z):
-                        world.set_point(
-                            x, y, z,
-                            cube.newtexcube(tex=2)
-                        )
+    shape = (world.size, world.size, world.zmax)
+    world.set_mask(_evaluate(pos_func, shape), cube.solid(tex=2), overwrite=False)
 
 
-def decay(world, position_function):
+def decay(world, position_function, seed=None):
     """
     A decay effect applied to the world. Decay at any specific point
-    will occur when ``random.random() > position_function``.
+    will occur when a random number (between 0 and 1) is larger than
+    ``position_function``.
 
     :param world: Input world
     :type world: redeclipse.Map
@@ -122,21 +151,17 @@ def decay(world, position_function):
     :param position_function: Position function, as seen above in this module
     :type position_function: function
 
+    :param seed: seed for the random numbers, drawn from ``random`` if None
+    :type seed: int
+
     :rtype: None
     """
     log.info('Applying Decay Effect')
-    for z in tqdm(range(world.zmax)):
-        for x in range(world.size):
-            for y in range(world.size):
-                if random.random() > position_function(x, y, z):
-                    # sys.stdout.write('.')
-                    world.del_point(x, y, z)
-                # else:
-                    # pass
-                    # sys.stdout.write('|')
+    shape = (world.size, world.size, world.zmax)
+    world.del_mask(_random_mask(position_function, shape, seed))
 
 
-def growth(world, position_function):
+def growth(world, position_function, seed=None):
     """
     Basically the opposite of decay. Apply SPARINGLY. Otherwise this
     will take forever to serialize and be completely non-functional.
@@ -147,18 +172,31 @@ def growth(world, position_function):
     :param position_function: Position function, as seen above in this module
     :type position_function: function
 
+    :param seed: seed for the random numbers, drawn from ``random`` if None
+    :type seed: int
+
     :rtype: None
     """
     log.info('Applying Growth Effect')
-    for z in tqdm(range(world.zmax)):
-        for x in range(world.size):
-            for y in range(world.size):
-                if random.random() > position_function(x, y, z):
-                    if not world.get_point(x, y, z):
-                        world.set_point(
-                            x, y, z,
-                            cube.newtexcube(tex=2)
-                        )
+    shape = (world.size, world.size, world.zmax)
+    world.set_mask(_random_mask(position_function, shape, seed), cube.solid(tex=2), overwrite=False)
+
+
+def _faces(world, height):
+    """
+    For every point of the (size, size, height) grid, on how many of the
+    world's faces it lies.
+    """
+    max_height = world.size
+    if height:
+        max_height = height
+    (x, y, z) = numpy.ogrid[0:world.size, 0:world.size, 0:max_height]
+    last = world.size - 1
+    count = numpy.zeros((world.size, world.size, max_height), dtype=numpy.uint8)
+    for coord in (x, y, z):
+        count += (coord == 0)
+        count += (coord == last)
+    return count
 
 
 def box(world, height=None):
@@ -173,17 +211,7 @@ def box(world, height=None):
 
     :rtype: None
     """
-    max_height = world.size
-    if height:
-        max_height = height
-    for z in tqdm(range(max_height)):
-        for x in range(world.size):
-            for y in range(world.size):
-                if x == 0 or y == 0 or z == 0 or x == world.size - 1 or y == world.size - 1 or z == world.size - 1:
-                    world.set_point(
-                        x, y, z,
-                        cube.newtexcube(tex=2)
-                    )
+    world.set_mask(_faces(world, height) > 0, cube.solid(tex=2))
 
 
 def box_outline(world, height=None):
@@ -198,40 +226,24 @@ def box_outline(world, height=None):
 
     :rtype: None
     """
-    max_height = world.size
-    if height:
-        max_height = height
-    for z in tqdm(range(max_height)):
-        for x in range(world.size):
-            for y in range(world.size):
-                xa = x == 0
-                ya = y == 0
-                za = z == 0
-                xb = x == world.size - 1
-                yb = y == world.size - 1
-                zb = z == world.size - 1
-
-                # Fun property of booleans, they can be interpreted as ints, 0/1
-                if sum([xa, ya, za, xb, yb, zb]) > 1:
-                    world.set_point(
-                        x, y, z,
-                        cube.newtexcube(tex=2)
-                    )
-
-
-def endcap(world, upm):
+    # Points on more than one face lie on an edge of the box
+    world.set_mask(_faces(world, height) > 1, cube.solid(tex=2))
+
+
+def endcap(world, upm, progress=True):
     """
     A box added around the edge of the world.
 
     :param world: Input world
     :type world: redeclipse.Map
+    :param bool progress: Show a progress bar
 
     :rtype: None
     """
-    for (pos, typ, ori) in tqdm(upm.unoccupied):
+    for (pos, typ, ori) in tqdm(upm.unoccupied, disable=not progress):
         # Sure wish we could do larger rooms.
         for offset in cube_points(8, 8, 8):
             world.set_pointv(
                 pos + offset,
-                cube.newtexcube(tex=2)
+                cube.solid(tex=2)
             )
@@ -1,15 +1,17 @@
 import argparse
 import json
 import logging
+import os
 from redeclipse import MapParser
 from redeclipse.magicavoxel.writer import to_magicavoxel
+from redeclipse.profiling import Profiler, octree_nodes
 
 log = logging.getLogger(__name__)
 
 
-def parse(input):
+def parse(input, **kwargs):
     mp = MapParser()
-    return mp.read(input)
+    return mp.read(input, **kwargs)
 
 
 def output_args(parser):
@@ -18,22 +20,33 @@ def output_args(parser):
     parser.add_argument('--graph', type=argparse.FileType('w'), help='Output .json file')
 
 
-def output(v, mymap, upm, prefabs, args):
+def profile_args(parser):
+    parser.add_argument('--report', help='Write per-stage timings and memory use to this .json file')
+    parser.add_argument('--profile', help='Write cProfile stats to this file')
+
+
+def output(v, mymap, upm, prefabs, args, copy_textures=True, profiler=None):
+    profiler = profiler or Profiler()
+    profiler.info['voxels'] = len(v.world)
+    profiler.info['ents'] = len(mymap.ents)
+
     if args.magica:
-        to_magicavoxel(v, args.magica, prefabs.TEXMAN)
+        with profiler.stage('magicavoxel'):
+            to_magicavoxel(v, args.magica, prefabs.TEXMAN)
 
     if args.mpz_out:
-        prefabs.TEXMAN.emit_conf(args.mpz_out)
-        prefabs.TEXMAN.copy_data()
+        with profiler.stage('emit_conf'):
+            prefabs.TEXMAN.emit_conf(args.mpz_out)
+        if copy_textures:
+            with profiler.stage('copy_data'):
+                prefabs.TEXMAN.copy_data()
 
         filename = args.mpz_out.name.replace('.mpz', '.cfg')
         with open(filename, 'a') as handle:
             for line in mymap.cfg_extra:
                 handle.write(line + '\n')
 
-        mymap.world = v.to_octree()
-        mymap.world[0].octsav = 0
-        mymap.write(args.mpz_out.name)
+        write_map(v, mymap, args.mpz_out.name, profiler)
 
     if args.graph:
         data = {
@@ -58,3 +71,19 @@ def output(v, mymap, upm, prefabs, args):
             })
 
         json.dump(data, args.graph)
+
+
+def write_map(v, mymap, path, profiler=None):
+    """
+    Convert the world to an octree and write the map to ``path``
+    """
+    profiler = profiler or Profiler()
+    with profiler.stage('to_octree') as stage:
+        mymap.world = v.to_octree()
+        mymap.world[0].octsav = 0
+    # Counted outside the stage, to not add to its time
+    stage['octree_nodes'] = octree_nodes(mymap.world)
+
+    with profiler.stage('write') as stage:
+        mymap.write(path)
+        stage['bytes'] = os.path.getsize(path)
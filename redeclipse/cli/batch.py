@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+"""
+Generate many maps with magica_rooms in one go, e.g. every seed in a range
+for a few room counts:
+
+    python -m redeclipse.cli.batch tests/files/empty.mpz --seeds 1:100 --rooms 100 200 --outdir maps/
+
+Jobs are spread over a pool of worker processes, which import the prefabs
+and parse the template map once. Every job starts from the same state as a
+fresh ``magica_rooms.py`` run with the same arguments, and so produces the
+same map.
+"""
+import argparse
+import copy
+import itertools
+import logging
+import os
+import sys
+import time
+import multiprocessing
+
+import redeclipse.worldflavors
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('mpz', 'vox', 'graph')
+
+# Per worker process state, see _init_worker
+_WORKER = {}
+
+
+def seed_range(value):
+    """
+    Parse a seed range: either a single seed, or ``start:end`` (end
+    inclusive)
+    """
+    try:
+        if ':' in value:
+            (start, end) = value.split(':')
+            seeds = list(range(int(start), int(end) + 1))
+        else:
+            seeds = [int(value)]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid seed range %r, expected e.g. 10 or 1:100" % value)
+    if not seeds:
+        raise argparse.ArgumentTypeError("Seed range %r is empty" % value)
+    return seeds
+
+
+def job_name(job):
+    name = 'map_s%d_r%d_m%d' % (job['seed'], job['rooms'], job['mirror'])
+    if job['ctf']:
+        name += '_ctf'
+    for flavor in job['flavor'] or []:
+        name += '_' + flavor
+    return name
+
+
+def build_jobs(seeds, rooms, mirror, ctf, flavor, **common):
+    """
+    Every combination of the parameter grid, as a list of job dicts
+    (keyword arguments for ``magica_rooms.generate``). Any other keyword
+    arguments are passed to every job.
+    """
+    jobs = []
+    for (s, r, m, c, f) in itertools.product(seeds, rooms, mirror, ctf, flavor):
+        jobs.append(dict(common, seed=s, rooms=r, mirror=m, ctf=c, flavor=f or None))
+    return jobs
+
+
+def _init_worker(template, size):
+    from redeclipse import prefabs
+    from redeclipse.cli import parse
+    import redeclipse.cli.magica_rooms  # noqa
+
+    logging.getLogger().setLevel(logging.WARNING)
+    texman = prefabs.TEXMAN
+    _WORKER.update(
+        template=parse(template),
+        size=size,
+        texman_state=(dict(texman.atlas), dict(texman.atlas_backref), dict(texman.texref)),
+    )
+
+
+def _run_job(job, outdir, formats):
+    """
+    Generate and write a single map, returning its row for the summary table
+    """
+    from redeclipse import prefabs
+    from redeclipse.cli import output
+    from redeclipse.cli.magica_rooms import generate
+
+    name = job_name(job)
+    row = dict(job, name=name, error=None)
+    # Textures registered by previous jobs in this process would change the
+    # atlas indices used by this one.
+    (atlas, atlas_backref, texref) = _WORKER['texman_state']
+    texman = prefabs.TEXMAN
+    (texman.atlas, texman.atlas_backref, texman.texref) = (dict(atlas), dict(atlas_backref), dict(texref))
+
+    paths = {fmt: os.path.join(outdir, name + ext) for (fmt, ext) in (('mpz', '.mpz'), ('vox', '.vox'), ('graph', '.json'))}
+    t0 = time.time()
+    try:
+        (v, mymap, upm) = generate(copy.deepcopy(_WORKER['template']), size=_WORKER['size'], **job)
+        t1 = time.time()
+        args = argparse.Namespace(
+            mpz_out=open(paths['mpz'], 'w') if 'mpz' in formats else None,
+            magica=open(paths['vox'], 'wb') if 'vox' in formats else None,
+            graph=open(paths['graph'], 'w') if 'graph' in formats else None,
+        )
+        try:
+            # Texture data is copied once for the whole batch, see run.
+            output(v, mymap, upm, prefabs, args, copy_textures=False)
+        finally:
+            for handle in (args.mpz_out, args.magica, args.graph):
+                if handle is not None:
+                    handle.close()
+        t2 = time.time()
+    except Exception as e:
+        log.exception("Job %s failed", name)
+        row.update(error='%s: %s' % (type(e).__name__, e), generate=time.time() - t0, output=0, voxels=0, ents=0)
+        return row
+
+    row.update(
+        generate=t1 - t0,
+        output=t2 - t1,
+        voxels=len(v.world),
+        ents=len(mymap.ents),
+        # Every texture the map's .cfg refers to
+        textures=[(name, texman.atlas[pos]) for (name, pos) in texman.atlas_backref.items()],
+    )
+    for fmt in formats:
+        row[fmt] = os.path.getsize(paths[fmt])
+    return row
+
+
+def _size(value):
+    if value is None:
+        return '-'
+    for unit in ('B', 'K', 'M'):
+        if value < 1024:
+            return '%d%s' % (value, unit)
+        value //= 1024
+    return '%dG' % value
+
+
+def summary(rows, formats, handle=sys.stdout):
+    """
+    Print a table with the timings and output sizes of every job
+    """
+    header = ['name', 'generate', 'output', 'voxels', 'ents'] + list(formats)
+    table = [header]
+    for row in rows:
+        line = [row['name'], '%.2fs' % row['generate'], '%.2fs' % row['output'], str(row['voxels']), str(row['ents'])]
+        if row['error']:
+            line += ['FAILED: ' + row['error']]
+        else:
+            line += [_size(row.get(fmt, None)) for fmt in formats]
+        table.append(line)
+
+    widths = [max(len(line[i]) for line in table if i < len(line)) for i in range(len(header))]
+    for line in table:
+        handle.write('  '.join(cell.ljust(width) for (cell, width) in zip(line, widths)).rstrip() + '\n')
+
+    failed = sum(1 for row in rows if row['error'])
+    total = sum(row['generate'] + row['output'] for row in rows)
+    handle.write('%d jobs, %d failed, %.2fs of work\n' % (len(rows), failed, total))
+
+
+def copy_textures(rows):
+    """
+    Copy the texture data used by every job to the game directory at once,
+    as ``magica_rooms.py`` does for every map (see ``TextureManager.copy_data``)
+    """
+    from redeclipse import prefabs
+
+    texman = copy.copy(prefabs.TEXMAN)
+    (texman.atlas, texman.atlas_backref, texman.texref) = (
+        dict(texman.atlas), dict(texman.atlas_backref), dict(texman.texref)
+    )
+    for row in rows:
+        for (name, tex) in row.get('textures', ()):
+            texman.register(name, tex)
+    texman.copy_data()
+
+
+def run(template, jobs, outdir, formats=FORMATS, size=2**8, processes=None, textures=True):
+    """
+    Run a list of jobs (see ``build_jobs``) on a pool of worker processes.
+
+    :param str template: path to the .mpz file every map starts from
+    :param str outdir: directory receiving the outputs, named after ``job_name``
+    :param formats: outputs to write, any of ``FORMATS``
+    :param int processes: pool size, defaults to the number of CPUs
+    :param bool textures: copy the texture data the maps use to the game
+                          directory, once all jobs are done
+
+    :returns: one summary row per job, in the order of ``jobs``
+    :rtype: list(dict)
+    """
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    processes = min(processes or os.cpu_count() or 1, len(jobs)) or 1
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(template, size)) as pool:
+        results = [pool.apply_async(_run_job, (job, outdir, formats)) for job in jobs]
+        rows = []
+        for result in results:
+            row = result.get()
+            log.info("%s done in %.2fs", row['name'], row['generate'] + row['output'])
+            rows.append(row)
+    if textures and 'mpz' in formats:
+        copy_textures(rows)
+    for row in rows:
+        row.pop('textures', None)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a batch of maps')
+    parser.add_argument('mpz_in', help='Input .mpz file, used as the template for every map')
+    parser.add_argument('--outdir', default='.', help='Output directory')
+    parser.add_argument('--seeds', type=seed_range, nargs='+', default=[[42]], help="Seeds or seed ranges, e.g. 1:100 (inclusive)")
+    parser.add_argument('--rooms', type=int, nargs='+', default=[200], help="Numbers of rooms to place")
+    parser.add_argument('--mirror', type=int, nargs='+', default=[2], choices=[1, 2, 4], help="Mirror modes")
+    parser.add_argument('--ctf', type=int, nargs='+', default=[0], choices=[0, 1], help="Without (0) and/or with (1) CTF flags")
+    parser.add_argument('--flavor', nargs='*', action='append', choices=redeclipse.worldflavors.choices,
+                        help="World flavours, may be given several times to try several sets of flavours")
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=FORMATS, help="Outputs to write for every map")
+    parser.add_argument('--size', default=2**8, type=int, help="World size. Danger!")
+    parser.add_argument('--processes', type=int, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument('--light-radius', default=0, type=float, help="Merge lights closer than this (in world units) to each other")
+    parser.add_argument('--light-budget', type=int, help="Maximum number of lights per map")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    seeds = [seed for seeds in args.seeds for seed in seeds]
+    jobs = build_jobs(seeds, args.rooms, args.mirror, [bool(c) for c in args.ctf], args.flavor or [None],
+                      light_radius=args.light_radius, light_budget=args.light_budget)
+    rows = run(args.mpz_in, jobs, args.outdir, formats=args.formats, size=args.size, processes=args.processes)
+    summary(rows, args.formats)
+    if any(row['error'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
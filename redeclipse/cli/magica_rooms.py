@@ -9,10 +9,13 @@ from redeclipse import prefabs
 # prefabs.TEXMAN = RainbowPukeTextureManager()
 # Back to our normally scheduled imports.
 prefabs.LIGHTMAN.brightness = 0.3
-from redeclipse.cli import parse, output, output_args
+from redeclipse.cli import parse, output, output_args, profile_args
 from redeclipse.entities import Sunlight
+from redeclipse.lighting import merge_lights
 from redeclipse.prefabs import STARTING_POSITION
 from redeclipse.prefabs import castle, dungeon, spacestation, original, egypt  # noqa
+from redeclipse.profiling import Profiler, profile
+from redeclipse.render import render_rooms
 from redeclipse.upm import UnusedPositionManager
 from redeclipse.vector.orientations import EAST
 from redeclipse.voxel import VoxelWorld
@@ -22,9 +25,27 @@ logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
 
-def main(mpz_in, size=2**8, seed=42, rooms=200, debug=False, ctf=False, mirror=2, flavor=None, **kwargs):
+def main(mpz_in, profiler=None, **kwargs):
+    profiler = profiler or Profiler()
+    with profiler.stage('parse'):
+        mymap = parse(mpz_in.name)
+    return generate(mymap, profiler=profiler, **kwargs)
+
+
+def generate(mymap, size=2**8, seed=42, rooms=200, debug=False, ctf=False, mirror=2, flavor=None, processes=1,
+             light_radius=0, light_budget=None, profiler=None, **kwargs):
+    """
+    Place and render rooms on top of an already parsed map, which is
+    modified in place.
+
+    :param profiler: records the time spent in every stage
+    :type profiler: redeclipse.profiling.Profiler
+
+    :returns: the rendered world, the map and the position manager
+    :rtype: tuple(redeclipse.voxel.VoxelWorld, redeclipse.Map, redeclipse.upm.UnusedPositionManager)
+    """
+    profiler = profiler or Profiler()
     random.seed(seed)
-    mymap = parse(mpz_in.name)
     v = VoxelWorld(size=size)
     # Update with chosen world flavouring
     mymap = redeclipse.worldflavors.update(mymap, flavor)
@@ -103,14 +124,25 @@ def main(mpz_in, size=2**8, seed=42, rooms=200, debug=False, ctf=False, mirror=2
     mymap.ents.append(sunlight)
 
     # Place all rooms
-    upm.place_rooms(debug, possible_rooms, rooms=rooms)
+    with profiler.stage('place_rooms') as stage:
+        upm.place_rooms(debug, possible_rooms, rooms=rooms)
+    stage['rooms'] = len(upm.rooms)
     # Apply endcaps
-    upm.endcap(debug=debug, possible_endcaps=possible_endcaps)
+    with profiler.stage('endcap') as stage:
+        upm.endcap(debug=debug, possible_endcaps=possible_endcaps)
+    stage['rooms'] = len(upm.rooms)
 
     # Now we get around to actually rendering the rooms, allowing us to do
     # modifications to their models before we render to our VoxelWorld.
-    for room in upm.rooms:
-        room.render(v, mymap)
+    with profiler.stage('render') as stage:
+        render_rooms(upm.rooms, v, mymap, seed=seed, processes=processes)
+    stage.update(voxels=len(v.world), ents=len(mymap.ents))
+
+    # Rooms place their lights without knowing about their neighbours'
+    if light_radius or light_budget is not None:
+        with profiler.stage('merge_lights') as stage:
+            mymap.ents = merge_lights(mymap.ents, radius=light_radius, budget=light_budget)
+        stage['ents'] = len(mymap.ents)
 
     # from redeclipse.aftereffects import box_outline
     # box_outline(v, height=48)
@@ -133,8 +165,17 @@ if __name__ == '__main__':
     parser.add_argument('--ctf', action='store_true', help="Include flags for CTFs")
     parser.add_argument('--mirror', type=int, choices=[1, 2, 4], help="Mirror mode (1 = unmirrored, 2 = 2-way mirroring, 4 = 4-way mirroring)")
     parser.add_argument('--flavor', nargs='*', choices=redeclipse.worldflavors.choices)
+    parser.add_argument('--processes', default=1, type=int, help="Number of processes used to render rooms")
+    parser.add_argument('--light-radius', default=0, type=float, help="Merge lights closer than this (in world units) to each other")
+    parser.add_argument('--light-budget', type=int, help="Maximum number of lights, the least important ones are dropped")
+    profile_args(parser)
     args = parser.parse_args()
-    # Build our map
-    v, mymap, upm = main(**vars(args))
-    # Save our map in whatever formats are requested.
-    output(v, mymap, upm, prefabs, args)
+    profiler = Profiler(memory=args.report is not None)
+    with profile(args.profile):
+        # Build our map
+        v, mymap, upm = main(profiler=profiler, **vars(args))
+        # Save our map in whatever formats are requested.
+        output(v, mymap, upm, prefabs, args, profiler=profiler)
+    profiler.stop()
+    if args.report:
+        profiler.write(args.report)
@@ -4,7 +4,7 @@ import argparse
 import logging
 import os
 
-from redeclipse.magicavoxel.reader import Magicavoxel
+from redeclipse.magicavoxel.reader import VoxFile
 from redeclipse.voxel import VoxelWorld
 
 logging.basicConfig(level=logging.INFO)
@@ -12,25 +12,24 @@ log = logging.getLogger(__name__)
 
 
 def main(mv_in):
-    try:
-        model = Magicavoxel.from_file(mv_in)
-    except Exception:
-        Magicavoxel.SIZE = 255
-        model = Magicavoxel.from_file(mv_in)
+    model = VoxFile.from_file(mv_in)
+    if len(model.palette) != 256:
         log.error("Odd: colours were shorter than expected.")
 
     classname = os.path.splitext(os.path.basename(mv_in))[0]
 
     print("Model: %s" % classname)
+    if len(model.models) > 1:
+        print("File contains %s models, showing the first" % len(model.models))
     world = VoxelWorld()
-    for vox in model.model_voxels.voxels:
-        world.set_point(vox.x, vox.y, vox.z, vox.c)
+    for (x, y, z, c) in model.voxels.tolist():
+        world.set_point(x, y, z, c)
     print("Model boundaries: x in [{0.xmin}, {0.xmax}]; y in [{0.ymin}, {0.ymax}]; z in [{0.zmin}, {0.zmax}]".format(world))
 
     print("Pallette")
-    for idx, colour in enumerate(model.palette.colours):
-        if colour.r != 0 or colour.g != 0 or colour.b != 0:
-            print("C[%s] = (%s, %s, %s)" % (idx, colour.r, colour.g, colour.b))
+    for idx, (r, g, b, a) in enumerate(model.palette.tolist()):
+        if r != 0 or g != 0 or b != 0:
+            print("C[%s] = (%s, %s, %s)" % (idx, r, g, b))
 
     for z in range(world.zmin, world.zmax + 1):
         print("==== z = %s ====" % z)
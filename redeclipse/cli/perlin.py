@@ -1,12 +1,12 @@
 #!/usr/bin/env python
-from redeclipse.voxel import VoxelWorld
-from redeclipse.cli import parse
+from redeclipse.voxel import DenseVoxelWorld
+from redeclipse.cli import parse, profile_args, write_map
 from redeclipse.objects import cube
+from redeclipse.perlin import pnoise2
+from redeclipse.profiling import Profiler, profile
 import argparse
-import sys  # noqa
-import random  # noqa
-import math  # noqa
-import noise  # noqa
+import random
+import numpy
 random.seed(22)
 IJ_SIZE = 2**7
 K_SIZE = 50
@@ -15,66 +15,63 @@ octaves = 1
 noise_scaling = 32
 
 
-def main():
-    parser = argparse.ArgumentParser(description='Add trees to map')
-    parser.add_argument('input', help='Input .mpz file')
-    parser.add_argument('output', help='Output .mpz file')
-    args = parser.parse_args()
-
-    mymap = parse(args.input)
-    v = VoxelWorld(size=2**7)
+def terrain(v):
+    """
+    Fill the world with ground, buildings and trees
+    """
+    (i, j) = numpy.ogrid[0:IJ_SIZE, 0:IJ_SIZE]
 
-    treeDensityMap = {}
-    for i in range(IJ_SIZE):
-        for j in range(IJ_SIZE):
-            w = noise.pnoise2(j / noise_scaling, i / noise_scaling, octaves=2, base=MAP_SEED + 128)
-            # This is a forrest
-            if w < -0.1:
-                # Then we take a chance
-                if random.random() < (abs(w) / 4):
-                    treeDensityMap[i, j] = True
+    treeDensityMap = numpy.zeros((IJ_SIZE, IJ_SIZE), dtype=bool)
+    w = pnoise2(j / noise_scaling, i / noise_scaling, octaves=2, base=MAP_SEED + 128)
+    # This is a forrest, where we take a chance for every point (in order,
+    # to keep the random sequence)
+    for (ti, tj) in numpy.argwhere(w < -0.1).tolist():
+        if random.random() < (abs(w[ti, tj]) / 4):
+            treeDensityMap[ti, tj] = True
 
-    bldgDensityMap = {}
-    for i in range(IJ_SIZE // 4):
-        for j in range(IJ_SIZE // 4):
-            w = noise.pnoise2(j / noise_scaling, i / noise_scaling, octaves=2, base=MAP_SEED + 64)
-            # This is a forrest
-            if w < -0.1:
-                # Then we take a chance
-                if random.random() < (abs(w) / 3):
-                    for i2 in range(4 * i, 4 * (i + 1)):
-                        for j2 in range(4 * j, 4 * (j + 1)):
-                            bldgDensityMap[i2, j2] = True
+    bldgDensityMap = numpy.zeros((IJ_SIZE, IJ_SIZE), dtype=bool)
+    (bi, bj) = numpy.ogrid[0:IJ_SIZE // 4, 0:IJ_SIZE // 4]
+    w = pnoise2(bj / noise_scaling, bi / noise_scaling, octaves=2, base=MAP_SEED + 64)
+    for (ti, tj) in numpy.argwhere(w < -0.1).tolist():
+        if random.random() < (abs(w[ti, tj]) / 3):
+            bldgDensityMap[4 * ti:4 * (ti + 1), 4 * tj:4 * (tj + 1)] = True
 
-    def point(i, j, k):
-        q = noise.pnoise2(i / noise_scaling, j / noise_scaling, octaves=octaves, base=MAP_SEED)
-        q *= 5
-        q += 30
+    q = pnoise2(i / noise_scaling, j / noise_scaling, octaves=octaves, base=MAP_SEED)
+    q *= 5
+    q += 30
+    q = q[..., None]
+    k = numpy.arange(K_SIZE).reshape(1, 1, -1)
 
-        if i % 10 == 0 and j == 0 and k == 0:
-            sys.stderr.write('%s / %s %s %s\n' % (i, IJ_SIZE, q, w))
+    trees = numpy.broadcast_to(treeDensityMap[..., None], (IJ_SIZE, IJ_SIZE, K_SIZE))
+    buildings = bldgDensityMap[..., None] & (k < q + 4) & (k >= q) & ~trees
+    ground = (k < q) & ~trees & ~buildings
 
-        if (i, j) in treeDensityMap:
-            return [58, 58, 58, 58, 59, 59]
+    v.set_mask(trees, cube.solid(tex=[58, 58, 58, 58, 59, 59]))
+    v.set_mask(buildings, cube.solid(tex=[57, 57, 57, 57, 57, 57]))
+    v.set_mask(ground, cube.solid(tex=[23, 23, 23, 23, 22, 61]))
 
-        if (i, j) in bldgDensityMap and k < q + 4 and k >= q:
-            return [57, 57, 57, 57, 57, 57]
 
-        if k < q:
-            return [23, 23, 23, 23, 22, 61]
+def main():
+    parser = argparse.ArgumentParser(description='Add trees to map')
+    parser.add_argument('input', help='Input .mpz file')
+    parser.add_argument('output', help='Output .mpz file')
+    profile_args(parser)
+    args = parser.parse_args()
 
-        return False
+    profiler = Profiler(memory=args.report is not None)
+    with profile(args.profile):
+        with profiler.stage('parse'):
+            mymap = parse(args.input)
+        v = DenseVoxelWorld(size=2**7)
 
-    for i in range(IJ_SIZE):
-        for j in range(IJ_SIZE):
-            for k in range(K_SIZE):
-                q = point(i, j, k)
-                if q:
-                    v.set_point(i, j, k, cube.newtexcube(tex=q))
+        with profiler.stage('terrain') as stage:
+            terrain(v)
+        stage['voxels'] = len(v.world)
 
-    mymap.world = v.to_octree()
-    mymap.world[0].octsav = 0
-    mymap.write(args.output)
+        write_map(v, mymap, args.output, profiler)
+    profiler.stop()
+    if args.report:
+        profiler.write(args.report)
 
 
 if __name__ == '__main__':
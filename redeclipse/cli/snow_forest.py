@@ -1,12 +1,15 @@
 #!/usr/bin/env python
-from redeclipse.voxel import VoxelWorld
+from redeclipse.voxel import DenseVoxelWorld
 from redeclipse.entities.model import MapModel
 from redeclipse.entities import PlayerSpawn
-from redeclipse.cli import parse
+from redeclipse.cli import parse, profile_args, write_map
 from redeclipse.objects import cube
+from redeclipse.perlin import pnoise2
+from redeclipse.profiling import Profiler, profile
+from redeclipse.vector import FineVector
 import argparse
 import random
-import noise
+import numpy
 from tqdm import tqdm
 random.seed(22)
 IJ_SIZE = 2**8
@@ -19,29 +22,26 @@ noise_scaling = 32
 
 
 def _light_distribution(i, j, wan=0.2, ldist=0.215, wan_a=2.9, wan_b=1.1, lan_a=26.9, lan_b=23.1, LSEED=0):
-    wide_area = noise.pnoise2(
+    wide_area = pnoise2(
         OVERALL_SCALING * wan_a * i / noise_scaling,
         OVERALL_SCALING * wan_b * j / noise_scaling,
         octaves=octaves, base=MAP_SEED + LSEED
-    )
-    if wide_area < wan:
-        wide_area = 0
-    else:
-        wide_area = 1
+    ) >= wan
 
-    local_distribution = noise.pnoise2(
+    local_distribution = pnoise2(
         OVERALL_SCALING * lan_a * i / noise_scaling,
         OVERALL_SCALING * lan_b * j / noise_scaling,
         octaves=octaves, base=MAP_SEED + LSEED
     )
-    if 0.2 < local_distribution < ldist:
-        local_distribution = 1
-    else:
-        local_distribution = 0
+    local_distribution = (0.2 < local_distribution) & (local_distribution < ldist)
 
     return wide_area & local_distribution
 
 
+# The point_* functions accept single coordinates, or arrays of them (e.g.
+# from numpy.ogrid) to evaluate a whole tile at once.
+
+
 def point_spawn(i, j):
     # Shift so we don't spawn *In* a tree.
     return _light_distribution(i + 1, j + 1)
@@ -56,7 +56,7 @@ def point_rock(i, j):
 
 
 def point_height(i, j):
-    q = noise.pnoise2(
+    q = pnoise2(
         0.3 * i / noise_scaling,
         0.7 * j / noise_scaling,
         octaves=octaves, base=MAP_SEED
@@ -67,81 +67,100 @@ def point_height(i, j):
 
 
 def point_snow(i, j):
-    q = noise.pnoise2(0.9 * j / noise_scaling, 0.7 * i / noise_scaling, octaves=octaves, base=MAP_SEED + 100)
+    q = pnoise2(0.9 * j / noise_scaling, 0.7 * i / noise_scaling, octaves=octaves, base=MAP_SEED + 100)
     return q < 0
 
 
+def terrain(v):
+    """
+    Fill the world with snowy ground
+
+    :returns: the height of the ground at every (i, j)
+    :rtype: numpy.ndarray
+    """
+    (i, j) = numpy.ogrid[0:IJ_SIZE, 0:IJ_SIZE]
+    # These are not z-dependent
+    heightmap = point_height(i, j).astype(int)
+    snow = point_snow(i, j)
+
+    # Two layers of ground, ten more along the border wall
+    border = (i == 0) | (j == 0) | (i == IJ_SIZE - 1) | (j == IJ_SIZE - 1)
+    top = numpy.where(border, heightmap + 9, heightmap)
+    k = numpy.arange(top.max() + 1).reshape(1, 1, -1)
+    ground = (k >= (heightmap - 2)[..., None]) & (k < top[..., None])
+    v.set_mask(ground & ~snow[..., None], cube.solid(tex=11))
+    v.set_mask(ground & snow[..., None], cube.solid(tex=13))
+    return heightmap
+
+
+def place_entities(mymap, heightmap):
+    """
+    Place trees, rocks and spawns on the ground
+    """
+    (i, j) = numpy.ogrid[0:IJ_SIZE, 0:IJ_SIZE]
+    trees = point_tree(i, j)
+    spawns = point_spawn(i, j)
+    rocks = point_rock(i, j)
+    for (i, j) in tqdm(numpy.argwhere(trees | spawns | rocks).tolist(), desc='Placing Entities'):
+        height = int(heightmap[i, j])
+        if trees[i, j]:
+            # Place tree
+            tree = MapModel(
+                FineVector(i, j, height),
+                type=137,
+                yaw=random.randint(0, 360),
+                scale=random.randint(56, 200),
+            )
+            mymap.ents.append(tree)
+
+        if spawns[i, j]:
+            spawn = PlayerSpawn(
+                xyz=FineVector(i, j, height),
+                team=0,
+                yaw=random.randint(0, 360),
+            )
+            mymap.ents.append(spawn)
+
+        if rocks[i, j]:
+            # Sink rocks a little into the ground
+            sink = random.randint(0, 5)
+            rock = MapModel(
+                FineVector(i, j, height),
+                type=122,
+                yaw=random.randint(0, 360),
+                roll=random.randint(0, 360),
+                pitch=random.randint(0, 360),
+                scale=random.randint(56, 300),
+            )
+            rock.o.z -= sink
+            mymap.ents.append(rock)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Snowy forest map')
     parser.add_argument('input', help='Input .mpz file')
     parser.add_argument('output', help='Output .mpz file')
+    profile_args(parser)
     args = parser.parse_args()
 
-    mymap = parse(args.input)
-    v = VoxelWorld(size=WORLD_SIZE)
-
-    heightmap = {}
-    for i in tqdm(range(IJ_SIZE), leave=False, desc='Heightmap'):
-        for j in range(IJ_SIZE):
-            # These are not z-dependent
-            height = int(point_height(i, j))
-            heightmap[(i, j)] = height
-            snow = point_snow(i, j)
-
-            for k in range(height - 2, height):
-                tex = 11
-                if snow:
-                    tex = 13
-
-                v.set_point(i, j, k, cube.newtexcube(tex=tex))
-
-                # # Border wall
-                if i == 0 or j == 0 or i == IJ_SIZE - 1 or j == IJ_SIZE - 1:
-                    for q in range(10):
-                        v.set_point(i, j, k + q, cube.newtexcube(tex=tex))
-
-    tree_count = 0
-    for i in tqdm(range(IJ_SIZE), desc='Placing Entities'):
-        for j in range(IJ_SIZE):
-            if point_tree(i, j):
-                tree_count += 1
-                # Place tree
-                tree = MapModel(
-                    x=i * 4,
-                    y=j * 4,
-                    z=heightmap[(i, j)] * 4,
-                    type=137,
-                    yaw=random.randint(0, 360),
-                    scale=random.randint(56, 200),
-                )
-                mymap.ents.append(tree)
-
-            if point_spawn(i, j):
-                spawn = PlayerSpawn(
-                    x=i * 4,
-                    y=j * 4,
-                    z=heightmap[(i, j)] * 4,
-                    team=0,
-                    yaw=random.randint(0, 360),
-                )
-                mymap.ents.append(spawn)
-
-            if point_rock(i, j):
-                rock = MapModel(
-                    x=i * 4,
-                    y=j * 4,
-                    z=heightmap[(i, j)] * 4 - random.randint(0, 5),
-                    type=122,
-                    yaw=random.randint(0, 360),
-                    roll=random.randint(0, 360),
-                    pitch=random.randint(0, 360),
-                    scale=random.randint(56, 300),
-                )
-                mymap.ents.append(rock)
-
-    mymap.world = v.to_octree()
-    mymap.world[0].octsav = 0
-    mymap.write(args.output)
+    profiler = Profiler(memory=args.report is not None)
+    with profile(args.profile):
+        with profiler.stage('parse'):
+            mymap = parse(args.input)
+        v = DenseVoxelWorld(size=WORLD_SIZE)
+
+        with profiler.stage('terrain') as stage:
+            heightmap = terrain(v)
+        stage['voxels'] = len(v.world)
+
+        with profiler.stage('entities') as stage:
+            place_entities(mymap, heightmap)
+        stage['ents'] = len(mymap.ents)
+
+        write_map(v, mymap, args.output, profiler)
+    profiler.stop()
+    if args.report:
+        profiler.write(args.report)
 
 
 if __name__ == '__main__':
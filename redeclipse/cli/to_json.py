@@ -12,7 +12,8 @@ def main():
     parser.add_argument('--section', help='Section name, e.g. "entities"')
     args = parser.parse_args()
 
-    mymap = parse(args.input)
+    # The octree is only read if it is dumped
+    mymap = parse(args.input, lazy=True)
 
     if args.section:
         sys.stdout.write(json.dumps(mymap.to_dict()[args.section], iterable_as_array=True))
@@ -3,6 +3,7 @@ from redeclipse.enums import EntType, WeaponType
 
 
 class Entity:
+    __slots__ = ('o', 'type', 'attrs', 'attr_annotations', 'links', 'reserved')
 
     def __init__(self, xyz, type, attrs, links, reserved):
         xyz = xyz.fine() * 4
@@ -73,10 +74,8 @@ class Entity:
         }
 
         for (key, value) in zip(self.attr_annotations, self.attrs):
-            data['attr'][key] = value
-
-        if self.type == EntType.ET_WEAPON:
-            data['attr']['type'] = data['attr']['type'].name
+            # Weapon types, and player start teams, are parsed as WeaponType
+            data['attr'][key] = value.name if isinstance(value, WeaponType) else value
 
         data['attr']['_order'] = self.attr_annotations
 
@@ -98,6 +97,7 @@ class Entity:
 
 
 class PlayerSpawn(Entity):
+    __slots__ = ()
 
     def __init__(self, xyz=(0, 0, 0), team=0, yaw=0, pitch=0, modes=0, muts=0, id=0, links=None, reserved=None):
         self.o = ivec3(*(xyz * 4))
@@ -113,6 +113,7 @@ class PlayerSpawn(Entity):
 
 
 class Sunlight(Entity):
+    __slots__ = ()
 
     def __init__(self, xyz=(0, 0, 0), yaw=0, pitch=0, red=255, green=255, blue=255, offset=45, flare=0, flarescale=0, links=None, reserved=None):
         self.o = ivec3(*xyz)
@@ -128,6 +129,7 @@ class Sunlight(Entity):
 
 
 class Light(Entity):
+    __slots__ = ()
 
     def __init__(self, xyz, radius=64, red=255, green=255, blue=255, flare=0, flarescale=0, links=None, reserved=None):
         xyz = xyz.fine() * 4
@@ -144,6 +146,7 @@ class Light(Entity):
 
 
 class Pusher(Entity):
+    __slots__ = ()
 
     def __init__(self, xyz, yaw=0, pitch=45, force=150, maxrad=0, minrad=0, type=0, links=None, reserved=None):
         xyz = xyz.fine() * 4
@@ -160,6 +163,7 @@ class Pusher(Entity):
 
 
 class TeamFlag(Entity):
+    __slots__ = ()
 
     def __init__(self, xyz, team=1, yaw=0, pitch=0, modes=2, muts=0, id=0, links=None, reserved=None):
         xyz = xyz.fine() * 4
@@ -4,6 +4,7 @@ from redeclipse.enums import EntType
 
 
 class MapModel(Entity):
+    __slots__ = ()
 
     def __init__(self, xyz, type=0, yaw=0, pitch=0, roll=0, blend=0,
                  scale=0, flags=0, colour=0, palette=0, palindex=0, spinyaw=0,
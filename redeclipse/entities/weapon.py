@@ -4,6 +4,7 @@ from redeclipse.enums import EntType
 
 
 class Weapon(Entity):
+    __slots__ = ()
 
     def __init__(self, xyz, type=0, flags=0, modes=0, muts=0, id=0,
                  links=None, reserved=None):
@@ -21,6 +22,7 @@ class Weapon(Entity):
 
 
 class Grenade(Entity):
+    __slots__ = ()
 
     def __init__(self, xyz, flags=0, modes=0, muts=0, id=0,
                  links=None, reserved=None):
@@ -38,6 +40,7 @@ class Grenade(Entity):
 
 
 class Shotgun(Entity):
+    __slots__ = ()
 
     def __init__(self, xyz, flags=0, modes=0, muts=0, id=0,
                  links=None, reserved=None):
@@ -1,14 +1,21 @@
 """Light manager"""
-import colorsys
-import noise
+import contextlib
+import logging
+import math
+
+import numpy
 
 from redeclipse.entities import Light
+from redeclipse.enums import EntType
+from redeclipse.perlin import pnoise3
 from redeclipse.vector.orientations import TILE_CENTER, HALF_HEIGHT
 
 SIZE = 8
 SIZE_OFFSET = 1
 GLOBAL_BRIGHTNESS_SCALING = 1.0
 
+log = logging.getLogger(__name__)
+
 
 class LightManager:
     """
@@ -23,6 +30,33 @@ class LightManager:
         self.brightness = brightness
         self.saturation = saturation
         self._world_size_factor = world_size / 2 ** 6
+        # Lights waiting for their colour, while in a batch()
+        self._pending = None
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Context manager deferring the colour of every light placed inside
+        of it. The lights are still added to the map right away (keeping
+        the entity order), but their hues are computed together with
+        ``hues`` when the outermost batch ends.
+        """
+        if self._pending is not None:
+            yield
+            return
+
+        self._pending = []
+        try:
+            yield
+        finally:
+            (pending, self._pending) = (self._pending, None)
+            self._resolve(pending)
+
+    def _resolve(self, pending):
+        if not pending:
+            return
+        for ((light, _), colour) in zip(pending, self.hues([pos for (_, pos) in pending])):
+            light.attrs[1:4] = colour
 
     def light(self, xmap, position, colour_override=None, autocenter=True, size_factor=1):
         """
@@ -37,15 +71,19 @@ class LightManager:
 
         :param boolean autocenter: Automatically add FineVector(4, 4, 4) to the position
         """
+        pos = position
         if autocenter:
             pos = position + TILE_CENTER + HALF_HEIGHT
 
         if colour_override:
-            (red, green, blue) = colour_override
+            light = self.get_light(pos, *colour_override, size_factor=size_factor)
+        elif self._pending is not None:
+            # Coloured at the end of the batch
+            light = self.get_light(pos, 0, 0, 0, size_factor=size_factor)
+            self._pending.append((light, pos))
         else:
             (red, green, blue) = self.hue(pos)
-
-        light = self.get_light(pos, red, green, blue, size_factor=size_factor)
+            light = self.get_light(pos, red, green, blue, size_factor=size_factor)
         xmap.ents.append(light)
 
     def hue(self, pos):
@@ -61,6 +99,19 @@ class LightManager:
         """
         return (255, 255, 255)
 
+    def hues(self, positions):
+        """
+        Get the hues for many positions at once. Child classes with an
+        expensive ``hue`` should override this with a vectorised version.
+
+        :param positions: The positions
+        :type positions: list(tuple(int, int, int))
+
+        :returns: A colour per position
+        :rtype: list(tuple(int, int, int))
+        """
+        return [self.hue(pos) for pos in positions]
+
     def get_light(self, position, red, green, blue, size_factor=1):
         """
         Return a light entity for a position and colour
@@ -87,11 +138,148 @@ class LightManager:
         )
 
 
+def _is_mergeable(ent):
+    # Linked lights (e.g. spotlights) are left alone
+    return ent.type == EntType.ET_LIGHT and not ent.links
+
+
+def _importance(light):
+    (radius, red, green, blue) = light.attrs[0:4]
+    return radius * max(red, green, blue)
+
+
+def merge_lights(ents, radius=0, budget=None):
+    """
+    Merge lights closer than ``radius`` to each other, then drop the least
+    important lights until at most ``budget`` are left.
+
+    Lights are visited in entity order. Every light either joins the
+    group whose first light is the nearest one within ``radius``, or
+    starts a new group. Only first lights count: a light within ``radius``
+    of another group member, but not of its first light, starts a new
+    group. First lights are looked up in a grid of ``radius`` sized cells,
+    so only those in the 27 neighbouring cells are compared. A group
+    becomes a single light at the position of its first member, with
+    the radius-weighted average colour. Its radius is grown to cover
+    every member's light.
+
+    Importance is ``radius * max(red, green, blue)``. Ties keep the
+    earlier light.
+
+    :param ents: map entities, e.g. ``xmap.ents``. Not modified, but the
+                 light entities in it are.
+    :type ents: list(redeclipse.entities.Entity)
+    :param float radius: merge distance in world units, 0 to not merge
+    :param int budget: maximum number of lights, None for no limit
+
+    :returns: the entities to keep, in their original order
+    :rtype: list(redeclipse.entities.Entity)
+    """
+    lights = [ent for ent in ents if _is_mergeable(ent)]
+    before = len(lights)
+
+    if radius > 0:
+        grid = {}
+        # index of the group's first light -> [members, weight, red, green, blue, radius]
+        groups = {}
+        merged = set()
+        for (idx, light) in enumerate(lights):
+            pos = (light.o.x, light.o.y, light.o.z)
+            cell = tuple(int(c // radius) for c in pos)
+            (best, best_dist) = (None, None)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for dz in (-1, 0, 1):
+                        for (other, other_pos) in grid.get((cell[0] + dx, cell[1] + dy, cell[2] + dz), ()):
+                            dist = math.sqrt(sum((a - b) ** 2 for (a, b) in zip(pos, other_pos)))
+                            if dist <= radius and (best is None or (dist, other) < (best_dist, best)):
+                                (best, best_dist) = (other, dist)
+
+            (size, red, green, blue) = light.attrs[0:4]
+            if best is None:
+                grid.setdefault(cell, []).append((idx, pos))
+                groups[idx] = [1, size, red * size, green * size, blue * size, size]
+            else:
+                group = groups[best]
+                group[0] += 1
+                group[1] += size
+                group[2] += red * size
+                group[3] += green * size
+                group[4] += blue * size
+                group[5] = max(group[5], size + best_dist)
+                merged.add(id(light))
+
+        for (idx, (members, weight, red, green, blue, size)) in groups.items():
+            if members == 1:
+                continue
+            light = lights[idx]
+            if weight > 0:
+                light.attrs[1:4] = [int(round(red / weight)), int(round(green / weight)), int(round(blue / weight))]
+            light.attrs[0] = int(math.ceil(size))
+        lights = [light for light in lights if id(light) not in merged]
+        ents = [ent for ent in ents if id(ent) not in merged]
+
+    if budget is not None and len(lights) > budget:
+        ranked = sorted(range(len(lights)), key=lambda i: (-_importance(lights[i]), i))
+        dropped = set(id(lights[i]) for i in ranked[budget:])
+        ents = [ent for ent in ents if id(ent) not in dropped]
+        lights = [light for light in lights if id(light) not in dropped]
+
+    log.info("Lights: %d -> %d", before, len(lights))
+    return list(ents)
+
+
+def _rgb_to_hue(red, grn, blu):
+    """
+    Vectorised ``colorsys.rgb_to_hsv(red, grn, blu)[0]``
+    """
+    maxc = numpy.maximum(numpy.maximum(red, grn), blu)
+    minc = numpy.minimum(numpy.minimum(red, grn), blu)
+    rangec = maxc - minc
+    grey = rangec == 0
+    rangec = numpy.where(grey, 1, rangec)
+    rc = (maxc - red) / rangec
+    gc = (maxc - grn) / rangec
+    bc = (maxc - blu) / rangec
+    hue = numpy.where(
+        red == maxc, bc - gc,
+        numpy.where(grn == maxc, 2.0 + rc - bc, 4.0 + gc - rc)
+    )
+    return numpy.where(grey, 0.0, numpy.mod(hue / 6.0, 1.0))
+
+
+def _hsv_to_rgb(hue, saturation, value):
+    """
+    Vectorised ``colorsys.hsv_to_rgb``, for an array of hues and a single
+    saturation and value.
+    """
+    if saturation == 0.0:
+        return tuple(numpy.full(hue.shape, value) for _ in range(3))
+    i = (hue * 6.0).astype(int)
+    f = (hue * 6.0) - i
+    p = numpy.full(hue.shape, value * (1.0 - saturation))
+    q = value * (1.0 - saturation * f)
+    t = value * (1.0 - saturation * (1.0 - f))
+    v = numpy.full(hue.shape, value)
+    i = i % 6
+    return tuple(
+        numpy.choose(i, choices)
+        for choices in ((v, q, p, p, t, v), (t, v, v, q, p, p), (p, p, t, v, v, q))
+    )
+
+
 class PositionBasedLightManager(LightManager):
     """
     A lighting manager for a map which returns a different colour based on position.
+
+    Hues are remembered per position (lights sit on the voxel grid, so
+    positions repeat a lot, e.g. in mirrored maps).
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hue_cache = {}
+
     def hue(self, pos):
         """
         Get a hue for a position. This returns a coloured light that changes hue gradually over x/y/z
@@ -102,28 +290,45 @@ class PositionBasedLightManager(LightManager):
         :returns: A colour
         :rtype: tuple(int, int, int)
         """
-        nums = [
-            x * (2 ** -8.4)
-            for x in pos
-        ]
+        return self.hues([pos])[0]
+
+    def hues(self, positions):
+        # Brightness and saturation may be changed at any point
+        settings = (self.brightness, self.saturation)
+        keys = [(settings, tuple(pos)) for pos in positions]
+        missing = list(dict.fromkeys(key for key in keys if key not in self._hue_cache))
+        if missing:
+            colours = self._compute_hues(numpy.array([pos for (_, pos) in missing], dtype=numpy.float64))
+            self._hue_cache.update(zip(missing, colours))
+        return [self._hue_cache[key] for key in keys]
+
+    def _compute_hues(self, positions):
+        """
+        :param positions: (N, 3) array of positions
+        :type positions: numpy.ndarray
+
+        :rtype: list(tuple(int, int, int))
+        """
+        nums = positions * (2 ** -8.4)
 
         # convert a tuple of three nums (x,y,z) + offset into a
         # 0-255 integer.
-        def kleur(nums, base):
-            return int(abs(noise.pnoise3(*nums, base=base)) * 255)
+        def kleur(base):
+            return (numpy.abs(pnoise3(nums[:, 0], nums[:, 1], nums[:, 2], base=base)) * 255).astype(int)
 
         # Now we generate our colour:
-        red = kleur(nums, 10)
-        grn = kleur(nums, 0)
-        blu = kleur(nums, 43)
+        red = kleur(10)
+        grn = kleur(0)
+        blu = kleur(43)
 
         # RGB isn't great, because it means low values of RGB are
         # low luminance. So we convert to HSV to get pure hue
-        (hue, _, _) = colorsys.rgb_to_hsv(red, grn, blu)
+        hue = _rgb_to_hue(red, grn, blu)
 
-        (red1, grn1, blu1) = colorsys.hsv_to_rgb(hue, self.saturation, 255)
         # We then peg S and V to high and only retain hue
-        (red, grn, blu) = colorsys.hsv_to_rgb(hue, self.saturation, int(255 * min(self.brightness, 1.0)))
-        print(red, grn, blu, red1, grn1, blu1)
+        (red, grn, blu) = _hsv_to_rgb(hue, self.saturation, int(255 * min(self.brightness, 1.0)))
+        colours = list(zip(red.astype(int).tolist(), grn.astype(int).tolist(), blu.astype(int).tolist()))
+        for (pos, colour) in zip(positions.tolist(), colours):
+            log.debug("Light at %s: %s", pos, colour)
         # This should give us a bright colour on a continuous range
-        return (int(red), int(grn), int(blu))
+        return colours
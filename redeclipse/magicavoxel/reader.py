@@ -1,14 +1,126 @@
 import struct
 from pkg_resources import parse_version
 
+import numpy
 from kaitaistruct import __version__ as ks_version, KaitaiStruct
 
 
 if parse_version(ks_version) < parse_version('0.7'):
     raise Exception("Incompatible Kaitai Struct Python API: 0.7 or later is required, but you have %s" % (ks_version))
 
+_HEADER = struct.Struct('<4si')
+_CHUNK = struct.Struct('<4sii')
+_INT = struct.Struct('<i')
+_SIZE = struct.Struct('<3i')
+
+
+def _default_palette():
+    """
+    MagicaVoxel's default palette, in the layout of an RGBA chunk. A 6x6x6
+    colour cube (minus black) followed by ramps of red, green, blue and grey.
+    """
+    steps = (0xff, 0xcc, 0x99, 0x66, 0x33, 0x00)
+    ramp = (0xee, 0xdd, 0xbb, 0xaa, 0x88, 0x77, 0x55, 0x44, 0x22, 0x11)
+    colours = [(r, g, b, 255) for r in steps for g in steps for b in steps][:-1]
+    colours += [(v, 0, 0, 255) for v in ramp]
+    colours += [(0, v, 0, 255) for v in ramp]
+    colours += [(0, 0, v, 255) for v in ramp]
+    colours += [(v, v, v, 255) for v in ramp]
+    colours += [(0, 0, 0, 0)]
+    return numpy.array(colours, dtype=numpy.uint8)
+
+
+#: Palette used by files without an RGBA chunk
+DEFAULT_PALETTE = _default_palette()
+
+
+class VoxModel(object):
+    """
+    A single model from a .vox file
+
+    :param tuple size: (x, y, z) dimensions from the SIZE chunk
+    :param numpy.ndarray voxels: (N, 4) uint8 array of x, y, z and colour index
+    """
+
+    def __init__(self, size, voxels):
+        self.size = size
+        self.voxels = voxels
+
+    def __repr__(self):
+        return '<VoxModel size=%s voxels=%d>' % (self.size, len(self.voxels))
+
+
+class VoxFile(object):
+    """
+    A MagicaVoxel .vox file. Chunks are located by walking the chunk
+    headers, any chunk other than SIZE, XYZI and RGBA (nTRN, nGRP, MATL,
+    ...) is skipped over.
+
+    Voxel arrays are read-only views of the file's data.
+
+    :param bytes data: contents of the .vox file
+    """
+
+    def __init__(self, data):
+        data = memoryview(data)
+        if len(data) < _HEADER.size + _CHUNK.size:
+            raise Exception("Not a MagicaVoxel file: too short")
+        (magic, self.version) = _HEADER.unpack_from(data, 0)
+        if magic != b'VOX ':
+            raise Exception("Not a MagicaVoxel file: %r" % magic)
+
+        (chunk_id, content, children) = _CHUNK.unpack_from(data, _HEADER.size)
+        if chunk_id != b'MAIN':
+            raise Exception("Expected MAIN chunk, found %r" % chunk_id)
+
+        #: Models in the order they appear in the file
+        self.models = []
+        #: Palette as stored in the RGBA chunk, an (N, 4) uint8 array
+        self.palette = DEFAULT_PALETTE
+        #: Identifiers of the chunks which were skipped
+        self.skipped = []
+
+        size = None
+        index = _HEADER.size + _CHUNK.size + content
+        end = min(index + children, len(data))
+        while index < end:
+            if index + _CHUNK.size > end:
+                raise Exception("Truncated chunk header at %d" % index)
+            (chunk_id, content, children) = _CHUNK.unpack_from(data, index)
+            start = index + _CHUNK.size
+            index = start + content + children
+            if index > end:
+                raise Exception("Chunk %r at %d runs past the end of the file" % (chunk_id, start))
+
+            if chunk_id == b'SIZE':
+                size = _SIZE.unpack_from(data, start)
+            elif chunk_id == b'XYZI':
+                (count, ) = _INT.unpack_from(data, start)
+                voxels = numpy.frombuffer(data, dtype=numpy.uint8, count=count * 4, offset=start + 4)
+                self.models.append(VoxModel(size, voxels.reshape(-1, 4)))
+                size = None
+            elif chunk_id == b'RGBA':
+                self.palette = numpy.frombuffer(data, dtype=numpy.uint8, count=content - content % 4, offset=start).reshape(-1, 4)
+            else:
+                self.skipped.append(chunk_id.decode('ascii', 'replace'))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as handle:
+            return cls(handle.read())
+
+    @property
+    def voxels(self):
+        """Voxels of the first model"""
+        return self.models[0].voxels
+
 
 class Magicavoxel(KaitaiStruct):
+    """
+    The original (Kaitai Struct generated) parser. Only reads files with a
+    single model and no chunks besides SIZE, XYZI and RGBA, and creates an
+    object per voxel. Kept for compatibility, use ``VoxFile`` instead.
+    """
     SIZE = 256
 
     def __init__(self, _io, _parent=None, _root=None):
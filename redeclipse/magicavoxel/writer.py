@@ -1,45 +1,148 @@
 import struct
 
+import numpy
 
-def to_magicavoxel(voxel_world, handle, texman):
-    cs = 4 * (1 + len(voxel_world.world))
-    handle.write(struct.pack('4s', b'VOX '))
-    handle.write(struct.pack('i', 150))
-    handle.write(struct.pack('4s', b'MAIN'))
-    handle.write(struct.pack('i', 0))  # Chunk size
-    handle.write(struct.pack('i', cs + 36 + 1024))  # child chunk size TODO
-    # Size chunk
-    handle.write(struct.pack('4s', b'SIZE'))
-    handle.write(struct.pack('i', 12))
-    handle.write(struct.pack('i', 0))
-    handle.write(struct.pack('i', int(voxel_world.xmax)))  # x
-    handle.write(struct.pack('i', int(voxel_world.ymax)))  # y
-    handle.write(struct.pack('i', int(voxel_world.zmax)))  # z
-    # xyzi chunk
-    handle.write(struct.pack('4s', b'XYZI'))
-    handle.write(struct.pack('i', cs))  # chunk size TODO
-    handle.write(struct.pack('i', 0))  # child chunk size
-    handle.write(struct.pack('i', len(voxel_world.world)))  # numvoxels
-
-    def m(x):
-        return int(x)
-
-    for ((x, y, z), value) in voxel_world.world.items():
-        if x > 255 or y > 255 or z > 255 or x < 0 or y < 0 or z < 0:
+#: Maximum size of a single model along each axis
+MODEL_SIZE = 256
+
+_HEADER = struct.Struct('<4si')
+_CHUNK = struct.Struct('<4sii')
+_INT = struct.Struct('<i')
+
+
+def _chunk(name, content=b'', children=b''):
+    return _CHUNK.pack(name, len(content), len(children)) + content + children
+
+
+def _string(value):
+    value = value.encode('utf-8')
+    return _INT.pack(len(value)) + value
+
+
+def _dict(values):
+    return _INT.pack(len(values)) + b''.join(
+        _string(k) + _string(v) for (k, v) in values.items()
+    )
+
+
+def _colour(value):
+    """Palette index for a value stored in a voxel world"""
+    texture = getattr(value, 'texture', None)
+    if not texture:
+        return 1
+    return texture[0] + 1
+
+
+def _voxel_arrays(voxel_world):
+    """
+    The points in a voxel world, as an (N, 3) array of coordinates and an
+    (N, ) array of palette indices.
+    """
+    if hasattr(voxel_world, 'occupied'):
+        # DenseVoxelWorld, map every palette entry to a colour once.
+        points = numpy.argwhere(voxel_world.occupied)
+        lookup = numpy.array(
+            [_colour(voxel_world.palette_value(i)) for i in range(len(voxel_world.palette))] or [1],
+            dtype=numpy.int64
+        )
+        colours = lookup[voxel_world.voxels[voxel_world.occupied]]
+        return points, colours
+
+    cache = {}
+    points = []
+    colours = []
+    for (point, value) in voxel_world.world.items():
+        if value is None:
             continue
-        handle.write(struct.pack('BBBB', m(x), m(y), m(z), m(value.texture[0] + 1)))
-        # handle.write(struct.pack('BBBB', m(x), m(y), m(z), 1))
+        points.append(point)
+        key = id(value)
+        if key not in cache:
+            cache[key] = _colour(value)
+        colours.append(cache[key])
+    points = numpy.array(points, dtype=numpy.float64).reshape(-1, 3)
+    return numpy.floor(points).astype(numpy.int64), numpy.array(colours, dtype=numpy.int64)
+
+
+def _palette(texman):
+    palette = numpy.zeros((256, 4), dtype=numpy.uint8)
+    palette[:, 3] = 255
+    for idx, (tex_key, tex) in enumerate(list(texman.atlas.items())[:256]):
+        palette[idx, :3] = (int(255 * tex.r), int(255 * tex.g), int(255 * tex.b))
+    return palette
+
+
+def _scene(origins, sizes):
+    """
+    Scene graph placing every model at its origin: a root transform
+    holding a group, with a transform + shape node per model.
+    """
+    chunks = [
+        _chunk(b'nTRN', _INT.pack(0) + _dict({}) + struct.pack('<iiii', 1, -1, -1, 1) + _dict({})),
+        _chunk(b'nGRP', _INT.pack(1) + _dict({}) + _INT.pack(len(origins)) + b''.join(
+            _INT.pack(2 + 2 * i) for i in range(len(origins))
+        )),
+    ]
+    for (i, (origin, size)) in enumerate(zip(origins, sizes)):
+        # Models are positioned by their center
+        translation = ' '.join(str(int(o + s // 2)) for (o, s) in zip(origin, size))
+        chunks.append(_chunk(
+            b'nTRN',
+            _INT.pack(2 + 2 * i) + _dict({}) + struct.pack('<iiii', 3 + 2 * i, -1, 0, 1) + _dict({'_t': translation})
+        ))
+        chunks.append(_chunk(b'nSHP', _INT.pack(3 + 2 * i) + _dict({}) + struct.pack('<ii', 1, i) + _dict({})))
+    return b''.join(chunks)
+
+
+def to_magicavoxel(voxel_world, handle, texman):
+    """
+    Write a voxel world to a MagicaVoxel .vox file. Worlds which do not
+    fit in a single 256x256x256 model are split into several models,
+    placed in the scene with transform (nTRN) nodes, as is a single model
+    which is not at the origin.
+
+    The first face's texture of every voxel is used as its colour, the
+    palette is built from ``texman``'s atlas.
+
+    :param voxel_world: world to export
+    :type voxel_world: redeclipse.voxel.VoxelWorld
+    :param handle: file handle, opened in binary mode
+    :param texman: texture manager the world was built with
+    :type texman: redeclipse.textures.TextureManager
+    """
+    (points, colours) = _voxel_arrays(voxel_world)
+    if len(colours) and (colours.min() < 1 or colours.max() > 255):
+        raise Exception("Texture indices must be in [0, 254] to fit a .vox palette")
+
+    # Group the voxels by the model they fall in
+    blocks = points // MODEL_SIZE
+    # (sorted the same way as numpy.unique sorts rows)
+    order = numpy.lexsort((blocks[:, 2], blocks[:, 1], blocks[:, 0]))
+    (points, colours, blocks) = (points[order], colours[order], blocks[order])
+    (unique, starts) = numpy.unique(blocks, axis=0, return_index=True)
+    if not len(unique):
+        unique = numpy.zeros((1, 3), dtype=numpy.int64)
+        starts = numpy.zeros(1, dtype=numpy.int64)
+    ends = list(starts[1:]) + [len(points)]
 
-    # colour chunk
-    handle.write(struct.pack('4s', b'RGBA'))
-    handle.write(struct.pack('i', 1024))  # chunk size
-    handle.write(struct.pack('i', 0))  # child chunk size
+    children = bytearray()
+    origins = []
+    sizes = []
+    for (block, start, end) in zip(unique, starts, ends):
+        origin = block * MODEL_SIZE
+        local = points[start:end] - origin
+        size = local.max(axis=0) + 1 if end > start else numpy.ones(3, dtype=numpy.int64)
+        origins.append(origin.tolist())
+        sizes.append(size.tolist())
 
-    def n(x):
-        return int(255 * x)
+        xyzi = numpy.empty((end - start, 4), dtype=numpy.uint8)
+        xyzi[:, :3] = local
+        xyzi[:, 3] = colours[start:end]
+        children += _chunk(b'SIZE', struct.pack('<3i', *sizes[-1]))
+        children += _chunk(b'XYZI', _INT.pack(end - start) + xyzi.tobytes())
 
-    for idx, (tex_key, tex) in enumerate(texman.atlas.items()):
-        handle.write(struct.pack('BBBB', n(tex.r), n(tex.g), n(tex.b), 255))  # white
+    # Without a scene graph, a lone model is placed at the origin
+    if len(origins) > 1 or any(origins[0]):
+        children += _scene(origins, sizes)
+    children += _chunk(b'RGBA', _palette(texman).tobytes())
 
-    for i in range(255 - len(texman.atlas)):
-        handle.write(struct.pack('BBBB', 0, 0, 0, 255))  # white
+    handle.write(_HEADER.pack(b'VOX ', 150) + _chunk(b'MAIN', children=bytes(children)))
@@ -0,0 +1,254 @@
+"""
+Byte offsets of the subtrees of a map's octree, to load maps lazily.
+
+The octree is the last (and by far the largest) part of a map file. Reading
+a map normally decodes every one of its cubes, even if only the header or
+entities are wanted. ``MapParser().read(path, lazy=True)`` stops before the
+octree instead. The octree is only read once ``Map.world`` is used, and then
+only as far as needed:
+
+- The first use of ``Map.world`` indexes the octree: the offset and length
+  of every subtree down to ``depth`` levels are recorded, skipping over the
+  cubes without decoding them.
+- Subtrees with children come back as :class:`LazyCube`, which decode their
+  children when those are first used.
+- Subtrees which were never decoded are written back by copying their bytes.
+
+Indexes are cached in memory, and in a file next to the map if asked to::
+
+    mymap = MapParser().read('big.mpz', lazy=True, index_path='big.mpz.idx')
+    mymap.ents  # Only the header and entities have been read
+    mymap.world[3].children[5]  # Decodes a single subtree
+"""
+import json
+import os
+
+from redeclipse.enums import Faces, OCT, OctLayers
+from redeclipse.objects import cube
+
+_OCTSAV_CHILDREN = OCT.OCTSAV_CHILDREN.value
+_OCTSAV_EMPTY = OCT.OCTSAV_EMPTY.value
+_OCTSAV_SOLID = OCT.OCTSAV_SOLID.value
+_OCTSAV_NORMAL = OCT.OCTSAV_NORMAL.value
+_OCTSAV_LODCUBE = OCT.OCTSAV_LODCUBE.value
+_MAXFACEVERTS = OctLayers.MAXFACEVERTS.value
+# Slot storing the children of a cube, which LazyCube hides behind a property
+_CHILDREN = cube.children
+
+
+def skip(view, index):
+    """
+    Skip over a cube (and its children) without decoding it, the
+    counterpart of ``MapParser._loadc``
+
+    :param memoryview view: the decompressed map
+    :param int index: offset of the cube
+
+    :returns: offset of the next cube
+    :rtype: int
+    """
+    remaining = 1
+    while remaining:
+        remaining -= 1
+        octsav = view[index]
+        index += 1
+        kind = octsav & 0x7
+        if kind == _OCTSAV_CHILDREN:
+            remaining += 8
+            continue
+        elif kind == _OCTSAV_NORMAL:
+            # Edges
+            index += 12
+        elif kind not in (_OCTSAV_EMPTY, _OCTSAV_SOLID, _OCTSAV_LODCUBE):
+            raise Exception("Invalid cube type %d at offset %d" % (kind, index - 1))
+
+        # Textures
+        index += 12
+        if octsav & 0x40:
+            index += 2
+        if octsav & 0x80:
+            index += 1
+        if octsav & 0x20:
+            surfmask = view[index]
+            index += 2
+            for i in range(6):
+                if surfmask & (1 << i):
+                    # SurfaceInfo, whose last byte is the vertex count
+                    if view[index + 3] & _MAXFACEVERTS:
+                        raise NotImplementedError("Gross in")
+                    index += 4
+    return index
+
+
+class Subtree(object):
+    """
+    Where a cube (and its children) is stored in the decompressed map
+
+    :param int offset: offset of the cube
+    :param int length: number of bytes taken by the cube and its children
+    :param children: the children's subtrees, if indexed
+    :type children: list(Subtree)
+    """
+    __slots__ = ('offset', 'length', 'children')
+
+    def __init__(self, offset, length, children=None):
+        self.offset = offset
+        self.length = length
+        self.children = children
+
+    def to_list(self):
+        if self.children is None:
+            return [self.offset, self.length]
+        return [self.offset, self.length, [s.to_list() for s in self.children]]
+
+    @classmethod
+    def from_list(cls, data):
+        children = None
+        if len(data) > 2:
+            children = [cls.from_list(s) for s in data[2]]
+        return cls(data[0], data[1], children)
+
+
+def _index_children(view, offset, depth):
+    """
+    Index the eight cubes starting at ``offset``, and their children down
+    to ``depth`` levels
+    """
+    subtrees = []
+    for i in range(8):
+        if depth > 1 and view[offset] & 0x7 == _OCTSAV_CHILDREN:
+            children = _index_children(view, offset + 1, depth - 1)
+            end = children[-1].offset + children[-1].length
+        else:
+            (children, end) = (None, skip(view, offset))
+        subtrees.append(Subtree(offset, end - offset, children))
+        offset = end
+    return subtrees
+
+
+class MapIndex(object):
+    """
+    Offsets of the subtrees of a map's octree
+
+    :param int depth: number of levels indexed, 1 for the top level cubes
+                      only
+    :param roots: the subtrees of the top level cubes
+    :type roots: list(Subtree)
+    :param stat: size and modification time of the map file indexed, to
+                 tell whether a saved index is stale
+    :type stat: tuple(int)
+    """
+
+    def __init__(self, depth, roots, stat=None):
+        self.depth = depth
+        self.roots = roots
+        self.stat = stat
+
+    @classmethod
+    def build(cls, view, offset, depth, stat=None):
+        """
+        Index the octree starting at ``offset``
+
+        :param memoryview view: the decompressed map
+        """
+        if depth < 1:
+            raise Exception("Index depth must be at least 1")
+        return cls(depth, _index_children(view, offset, depth), stat=stat)
+
+    @property
+    def end(self):
+        """
+        Offset just past the octree
+        """
+        return self.roots[-1].offset + self.roots[-1].length
+
+    def to_dict(self):
+        return {
+            'depth': self.depth,
+            'stat': self.stat,
+            'roots': [s.to_list() for s in self.roots],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stat = tuple(data['stat']) if data['stat'] is not None else None
+        return cls(data['depth'], [Subtree.from_list(s) for s in data['roots']], stat=stat)
+
+    def save(self, path):
+        with open(path, 'w') as handle:
+            json.dump(self.to_dict(), handle)
+
+    @classmethod
+    def load(cls, path, depth, stat):
+        """
+        Load an index saved by ``save``
+
+        :returns: the index, or None if there is none at ``path`` or it is
+                  not for this map or depth
+        :rtype: MapIndex
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as handle:
+            index = cls.from_dict(json.load(handle))
+        if index.depth != depth or index.stat != stat:
+            return None
+        return index
+
+
+def map_stat(path):
+    """
+    Size and modification time of a map file, which identify the version
+    of the map an index was built for
+
+    :rtype: tuple(int)
+    """
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+class LazyCube(cube):
+    """
+    A cube with children, which are only decoded from the map when first
+    used. Until then, writing the map copies the cube's bytes from the
+    original.
+
+    :param parser: parser holding the decompressed map
+    :type parser: redeclipse.MapParser
+    :param Subtree subtree: where the cube is stored
+    :param int size: edge length of the cube
+    """
+    __slots__ = ('_source', )
+
+    def __init__(self, parser, subtree, size):
+        super().__init__()
+        self.octsav = parser.view[subtree.offset]
+        self.haschildren = False
+        self.setfaces(Faces.F_EMPTY)
+        self._source = (parser, subtree, size)
+
+    @property
+    def children(self):
+        source = self._source
+        if source is not None:
+            (parser, subtree, size) = source
+            _CHILDREN.__set__(self, parser._loadsubtree(subtree, size))
+            self._source = None
+        return _CHILDREN.__get__(self)
+
+    @children.setter
+    def children(self, value):
+        _CHILDREN.__set__(self, value)
+        self._source = None
+
+    def encoded(self):
+        """
+        The cube as stored in the map, or None once its children have been
+        decoded (and so may have been changed)
+
+        :rtype: memoryview
+        """
+        if self._source is None:
+            return None
+        (parser, subtree, size) = self._source
+        return parser.view[subtree.offset:subtree.offset + subtree.length]
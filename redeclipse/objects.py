@@ -1,3 +1,5 @@
+import copy
+
 from redeclipse.enums import Faces, TextNum, OctLayers
 from redeclipse.vector.re import ivec2, ivec3, vec2, vec3
 
@@ -70,9 +72,10 @@ class VSlot:
 
 
 class SurfaceInfo:
+    __slots__ = ('lmid', 'verts', 'numverts')
 
     def __init__(self, lmid0, lmid1, verts, numverts):
-        self.lmid = [lmid0, lmid1]
+        self.lmid = (lmid0, lmid1)
         self.verts = verts
         self.numverts = numverts
 
@@ -96,6 +99,7 @@ class SurfaceInfo:
 
 
 class vertinfo:
+    __slots__ = ('x', 'y', 'z', 'u', 'v', 'norm')
 
     def __init__(self, x, y, z, u, v, norm):
         self.x = x
@@ -134,6 +138,7 @@ class SlotShaderParam:
 
 
 class cubext:
+    __slots__ = ('va', 'ents', 'tjoints', 'surfaces', 'verts', 'surfaceinfo', 'maxverts')
 
     def __init__(self, old=None, maxverts=0):
         if old:
@@ -168,6 +173,12 @@ class cubext:
         return ce
 
 
+_DEFAULT_EDGES = (128, ) * 12
+_DEFAULT_TEXTURE = (TextNum.DEFAULT_GEOM, ) * 6
+# Face tuples for setfaces, by face value
+_FACES = {}
+
+
 class cubeedge:
 
     def __init__(self, next, offset, size, index, flags):
@@ -179,6 +190,14 @@ class cubeedge:
 
 
 class cube:
+    # Millions of these are alive while building or reading a map, so they
+    # are slotted. Edges, faces and textures are tuples (shared between
+    # cubes where possible), assign a new tuple to change them.
+    __slots__ = (
+        'children', 'ext', 'edges', 'faces', 'texture', 'material', 'mat',
+        'merged', 'escaped', 'visible', 'surfmask', 'totalverts', 'octsav',
+        'haschildren', 'cube_id',
+    )
 
     def __init__(self):
         # points to 8 cube structures which are its children, or NULL. -Z first, then -Y, -X
@@ -186,11 +205,11 @@ class cube:
         # extended info for the cube
         self.ext = None  # extended info
         # edges of the cube, each uchar is 2 4bit values denoting the range.
-        self.edges = [128] * 12  # 12
+        self.edges = _DEFAULT_EDGES  # 12
         # 4 edges of each dimension together representing 2 perpendicular faces
-        self.faces = []  # 3
+        self.faces = ()  # 3
         # one for each face. same order as orient.
-        self.texture = [TextNum.DEFAULT_GEOM] * 6
+        self.texture = _DEFAULT_TEXTURE
         # empty-space material
         self.material = None
         # merged faces of the cube
@@ -213,7 +232,7 @@ class cube:
         d = {
             '_id': self.cube_id,
             'ext': self.ext.to_dict() if self.ext else None,
-            'edges': self.edges,
+            'edges': list(self.edges),
             'faces': [f.name for f in self.faces],
             'texture': [t if isinstance(t, int) else t.value for t in self.texture],
             'material': self.material,
@@ -251,13 +270,47 @@ class cube:
         c = cube.newcube()
         return cube.texturize(c, tex=tex)
 
+    @classmethod
+    def solid(cls, tex=2):
+        """
+        Shared, immutable equivalent of ``newtexcube``. Every call with the
+        same textures returns the same instance, use ``copy()`` to get a
+        cube which may be modified.
+
+        :param tex: texture for all faces, or a list of six textures
+        :type tex: int or list(int)
+
+        :rtype: redeclipse.objects.SolidCube
+        """
+        return SolidCube.get(tex)
+
+    def copy(self):
+        """
+        Return a mutable copy of this cube. Children and the (immutable)
+        edge, face and texture tuples are shared with the original,
+        everything else is copied.
+        """
+        c = cube()
+        for key in cube.__slots__:
+            if key == 'cube_id' or not hasattr(self, key):
+                continue
+            setattr(c, key, getattr(self, key))
+
+        if self.ext:
+            c.ext = copy.copy(self.ext)
+            c.ext.surfaces = [
+                None if s is None else SurfaceInfo(s.lmid[0], s.lmid[1], s.verts, s.numverts)
+                for s in self.ext.surfaces
+            ]
+        return c
+
     @classmethod
     def texturize(cls, c, tex=2):
         c.set_solid()
         if isinstance(tex, int):
-            c.texture = [tex, tex, tex, tex, tex, tex]
+            c.texture = (tex, tex, tex, tex, tex, tex)
         else:
-            c.texture = tex
+            c.texture = tuple(tex)
 
         c.ext = cubext()
         c.ext.verts = 0
@@ -292,11 +345,10 @@ class cube:
 
     def setfaces(self, face):
         # octa.h L256
-        self.faces = [
-            face,
-            face,
-            face
-        ]
+        faces = _FACES.get(face, None)
+        if faces is None:
+            faces = _FACES[face] = (face, face, face)
+        self.faces = faces
 
     def newcubeext(self, maxverts, init):
         if self.ext and self.ext.maxverts >= maxverts:
@@ -478,3 +530,50 @@ class cube:
     @classmethod
     def emptyfaces(cls, cube):
         cube.setfaces(Faces.F_EMPTY)
+
+
+class SolidCube(cube):
+    """
+    A solid textured cube which is shared between every voxel with the same
+    textures (see ``cube.solid``), the same as what ``cube.newtexcube``
+    builds. Instances are immutable, assigning to any attribute raises an
+    ``AttributeError``; ``copy()`` returns a regular cube to modify instead.
+    """
+    __slots__ = ('packed', '_frozen')
+    _interned = {}
+
+    def __init__(self, texture):
+        super().__init__()
+        cube.texturize(self, tex=texture)
+        self.mat = 0
+        self.ext.surfaces = tuple(self.ext.surfaces)
+        # Serialized form of this cube, cached by the map writer.
+        self.packed = None
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if name != 'packed' and getattr(self, '_frozen', False):
+            raise AttributeError("SolidCube instances are shared between voxels, use copy() before modifying them")
+        super().__setattr__(name, value)
+
+    def __reduce__(self):
+        # Unpickle to the interned instance of the receiving process
+        return (SolidCube.get, (self.texture,))
+
+    @classmethod
+    def get(cls, tex=2):
+        """
+        Get the interned instance for a set of textures
+
+        :param tex: texture for all faces, or a list of six textures
+        :type tex: int or list(int)
+        """
+        if isinstance(tex, int):
+            key = (tex, tex, tex, tex, tex, tex)
+        else:
+            key = tuple(t.value if isinstance(t, TextNum) else t for t in tex)
+
+        c = cls._interned.get(key, None)
+        if c is None:
+            c = cls._interned[key] = cls(key)
+        return c
@@ -0,0 +1,342 @@
+"""
+Queries on a map's octree (``Map.world``), without voxelizing it.
+
+Positions are in world units: the octree spans ``[0, worldsize)`` on every
+axis, the eight cubes of ``Map.world`` each cover an octant of half that
+size, and so on down to the leaves. Child ``i`` of a cube lies in the upper
+half of the x, y and z axes if bit 0, 1 and 2 of ``i`` are set.
+
+Leaves are either empty, solid, or (normal) cubes whose edges give their
+shape, which may not fill the whole cube. Such deformed cubes are treated as the box bounding their
+geometry, which is what matters for e.g. placing entities on floors::
+
+    tree = mymap.octree()
+    z = tree.height(x, y)
+    (distance, position, leaf) = tree.raycast((x, y, z + 64), (0, 1, -1))
+"""
+import math
+
+from redeclipse.enums import OCT
+
+_OCTSAV_SOLID = OCT.OCTSAV_SOLID.value
+_OCTSAV_NORMAL = OCT.OCTSAV_NORMAL.value
+_FULL = ((0, 8), (0, 8), (0, 8))
+# Extent of the geometry of deformed cubes, by edges
+_EXTENTS = {}
+
+
+def extent(c):
+    """
+    Extent of a leaf cube's geometry along each axis, in eighths of the
+    cube: ``((0, 8), (0, 8), (0, 8))`` for a solid cube.
+
+    :returns: a (lower, upper) pair per axis, or None if the cube is empty
+    :rtype: tuple(tuple(int))
+    """
+    # The node type decides how the cube is saved, and is set both by the
+    # parser and by e.g. ``cube.texturize``, unlike the faces.
+    kind = c.octsav & 0x7
+    if kind == _OCTSAV_SOLID:
+        return _FULL
+    if kind != _OCTSAV_NORMAL:
+        return None
+
+    # Four edges per axis, their lower and upper nibbles are where the
+    # geometry starts and ends along that axis.
+    edges = c.edges
+    extent = _EXTENTS.get(edges, False)
+    if extent is False:
+        extent = []
+        for axis in range(3):
+            axis_edges = edges[4 * axis:4 * axis + 4]
+            (lower, upper) = (min(e & 0xF for e in axis_edges), max(e >> 4 for e in axis_edges))
+            if lower >= upper:
+                extent = None
+                break
+            extent.append((lower, upper))
+        if extent is not None:
+            extent = tuple(extent)
+        _EXTENTS[edges] = extent
+    return extent
+
+
+def _slab(origin, direction, lower, upper):
+    """
+    Distances along the ray at which it enters and leaves the box, or None
+    if it misses it
+    """
+    (near, far) = (-math.inf, math.inf)
+    for axis in range(3):
+        (o, d) = (origin[axis], direction[axis])
+        if d == 0:
+            if not lower[axis] <= o <= upper[axis]:
+                return None
+            continue
+        (t0, t1) = ((lower[axis] - o) / d, (upper[axis] - o) / d)
+        if t0 > t1:
+            (t0, t1) = (t1, t0)
+        near = max(near, t0)
+        far = min(far, t1)
+        if near > far:
+            return None
+    return (near, far)
+
+
+class Leaf(object):
+    """
+    A leaf cube of the octree and the cell it occupies
+
+    :param cube: the leaf cube
+    :type cube: redeclipse.objects.cube
+    :param int x: lower x coordinate of the cell
+    :param int y: lower y coordinate of the cell
+    :param int z: lower z coordinate of the cell
+    :param int size: edge length of the cell
+    """
+    __slots__ = ('cube', 'x', 'y', 'z', 'size')
+
+    def __init__(self, cube, x, y, z, size):
+        self.cube = cube
+        self.x = x
+        self.y = y
+        self.z = z
+        self.size = size
+
+    def bounds(self):
+        """
+        Lower and upper corner of the box bounding the cube's geometry, or
+        None if the cube is empty
+
+        :rtype: tuple(tuple(float))
+        """
+        eighths = extent(self.cube)
+        if eighths is None:
+            return None
+        scale = self.size / 8
+        return (
+            tuple(o + lower * scale for (o, (lower, upper)) in zip((self.x, self.y, self.z), eighths)),
+            tuple(o + upper * scale for (o, (lower, upper)) in zip((self.x, self.y, self.z), eighths)),
+        )
+
+    def __repr__(self):
+        return '<Leaf %d %d %d size=%d>' % (self.x, self.y, self.z, self.size)
+
+
+class Octree(object):
+    """
+    Point, box, column and ray queries on an octree
+
+    :param world: the eight top level cubes, e.g. ``Map.world``
+    :type world: list(redeclipse.objects.cube)
+    :param int worldsize: edge length of the whole octree, e.g. ``Map.meta['worldsize']``
+    """
+
+    def __init__(self, world, worldsize):
+        self.world = world
+        self.worldsize = worldsize
+
+    def lookup(self, x, y, z):
+        """
+        The leaf containing a point
+
+        :returns: the leaf, or None if the point is outside of the world
+        :rtype: Leaf
+        """
+        size = self.worldsize >> 1
+        if not (0 <= x < 2 * size and 0 <= y < 2 * size and 0 <= z < 2 * size):
+            return None
+
+        (ox, oy, oz) = (0, 0, 0)
+        children = self.world
+        while True:
+            i = 0
+            if x >= ox + size:
+                i |= 1
+                ox += size
+            if y >= oy + size:
+                i |= 2
+                oy += size
+            if z >= oz + size:
+                i |= 4
+                oz += size
+            c = children[i]
+            if not c.children:
+                return Leaf(c, ox, oy, oz, size)
+            children = c.children
+            size >>= 1
+
+    def solid(self, x, y, z):
+        """
+        Whether a point is inside of the geometry
+        """
+        leaf = self.lookup(x, y, z)
+        if leaf is None:
+            return False
+        bounds = leaf.bounds()
+        if bounds is None:
+            return False
+        return all(lower <= p < upper for (p, lower, upper) in zip((x, y, z), *bounds))
+
+    def _cells(self, children, ox, oy, oz, size, lower, upper):
+        """
+        Every leaf below ``children`` whose cell intersects the box
+        [lower, upper)
+        """
+        for i in range(8):
+            (cx, cy, cz) = (ox + (i & 1) * size, oy + (i >> 1 & 1) * size, oz + (i >> 2) * size)
+            if cx >= upper[0] or cy >= upper[1] or cz >= upper[2]:
+                continue
+            if cx + size <= lower[0] or cy + size <= lower[1] or cz + size <= lower[2]:
+                continue
+            c = children[i]
+            if c.children:
+                yield from self._cells(c.children, cx, cy, cz, size >> 1, lower, upper)
+            else:
+                yield Leaf(c, cx, cy, cz, size)
+
+    def box(self, lower, upper, empty=False):
+        """
+        The leaves intersecting the box [lower, upper), in octree order
+
+        :param lower: lower corner of the box
+        :type lower: tuple(float)
+        :param upper: upper corner of the box
+        :type upper: tuple(float)
+        :param bool empty: include empty leaves
+
+        :rtype: list(Leaf)
+        """
+        leaves = []
+        for leaf in self._cells(self.world, 0, 0, 0, self.worldsize >> 1, lower, upper):
+            if empty:
+                leaves.append(leaf)
+                continue
+            bounds = leaf.bounds()
+            if bounds is None:
+                continue
+            if all(lo < u and hi > l for (lo, hi, l, u) in zip(bounds[0], bounds[1], lower, upper)):
+                leaves.append(leaf)
+        return leaves
+
+    def column(self, x, y):
+        """
+        The non-empty leaves whose cells contain the column at (x, y), from
+        the top down
+
+        :rtype: list(Leaf)
+        """
+        size = self.worldsize >> 1
+        if not (0 <= x < 2 * size and 0 <= y < 2 * size):
+            return []
+
+        leaves = []
+        stack = []
+
+        def push(children, ox, oy, oz, size):
+            i = 0
+            if x >= ox + size:
+                i |= 1
+                ox += size
+            if y >= oy + size:
+                i |= 2
+                oy += size
+            # Lower child first, so the upper one is visited first
+            stack.append((children[i], ox, oy, oz, size))
+            stack.append((children[i | 4], ox, oy, oz + size, size))
+
+        push(self.world, 0, 0, 0, size)
+        while stack:
+            (c, ox, oy, oz, size) = stack.pop()
+            if c.children:
+                push(c.children, ox, oy, oz, size >> 1)
+            elif extent(c) is not None:
+                leaves.append(Leaf(c, ox, oy, oz, size))
+        return leaves
+
+    def height(self, x, y, below=None):
+        """
+        Height of the highest surface in the column at (x, y), e.g. the
+        floor to put an entity on.
+
+        :param float below: only consider surfaces at or below this height
+                            (e.g. to find the floor of a room rather than
+                            its roof)
+
+        :returns: the height, or None if there is no such surface
+        :rtype: float
+        """
+        for leaf in self.column(x, y):
+            if below is not None and leaf.z >= below:
+                continue
+            ((lx, ly, lz), (ux, uy, uz)) = leaf.bounds()
+            if not (lx <= x < ux and ly <= y < uy):
+                continue
+            if below is None or uz <= below:
+                return uz
+        return None
+
+    def raycast(self, origin, direction, distance=None):
+        """
+        The first geometry hit by a ray. The ray descends the tree to the
+        leaf containing its current position, and steps from leaf to leaf
+        through the faces it leaves them by.
+
+        :param origin: start of the ray
+        :type origin: tuple(float)
+        :param direction: direction of the ray, need not be normalised
+        :type direction: tuple(float)
+        :param float distance: maximum distance to look at
+
+        :returns: the distance to the hit, the position of the hit and the
+                  leaf which was hit, or None if nothing was hit
+        :rtype: tuple(float, tuple(float), Leaf)
+        """
+        length = math.sqrt(sum(d * d for d in direction))
+        if length == 0:
+            raise Exception("Ray direction must not be zero")
+        direction = tuple(d / length for d in direction)
+        origin = tuple(origin)
+
+        size = self.worldsize
+        span = _slab(origin, direction, (0, 0, 0), (size, size, size))
+        if span is None or span[1] < 0:
+            return None
+        (t, end) = (max(span[0], 0), span[1])
+        if distance is not None:
+            end = min(end, distance)
+
+        # Rays entering through a face of the world may land just outside
+        probe = [min(max(o + d * t, 0), size - 1e-6) for (o, d) in zip(origin, direction)]
+        while t <= end:
+            leaf = self.lookup(*probe)
+            if leaf is None:
+                return None
+            lower = (leaf.x, leaf.y, leaf.z)
+            upper = (leaf.x + leaf.size, leaf.y + leaf.size, leaf.z + leaf.size)
+
+            exits = [
+                (upper[axis] - origin[axis]) / d if d > 0 else (lower[axis] - origin[axis]) / d if d < 0 else math.inf
+                for (axis, d) in enumerate(direction)
+            ]
+            leave = min(exits)
+
+            bounds = leaf.bounds()
+            if bounds is not None:
+                span = _slab(origin, direction, *bounds)
+                # Merely touching an edge or corner is not a hit
+                if span is not None and span[0] < span[1] and span[1] > t and span[0] <= leave:
+                    hit = max(span[0], t)
+                    if hit > end:
+                        return None
+                    return (hit, tuple(o + d * hit for (o, d) in zip(origin, direction)), leaf)
+
+            t = leave
+            for axis in range(3):
+                if exits[axis] == leave:
+                    # Step over the face into the next cell, cells are at
+                    # least one unit large.
+                    probe[axis] = upper[axis] if direction[axis] > 0 else lower[axis] - 0.5
+                else:
+                    # Rounding must not push the other axes out of this cell
+                    probe[axis] = min(max(origin[axis] + direction[axis] * t, lower[axis]), upper[axis] - 1e-6)
+        return None
@@ -0,0 +1,219 @@
+"""
+Vectorised Perlin "improved" noise.
+
+``pnoise2`` and ``pnoise3`` take the same arguments as ``noise.pnoise2`` and
+``noise.pnoise3``, but accept numpy arrays for the coordinates (broadcast
+against each other), so a whole tile is evaluated at once::
+
+    (i, j) = numpy.ogrid[0:256, 0:256]
+    height = pnoise2(0.3 * i / 32, 0.7 * j / 32, octaves=2)
+
+They reproduce the ``noise`` package's C implementation exactly (it works
+in single precision), so they can replace calls to it without changing
+generated maps.
+"""
+import numpy
+
+_PERMUTATION = (
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225,
+    140, 36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148,
+    247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32,
+    57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175,
+    74, 165, 71, 134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122,
+    60, 211, 133, 230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54,
+    65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169,
+    200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64,
+    52, 217, 226, 250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212,
+    207, 206, 59, 227, 47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213,
+    119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9,
+    129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185, 112, 104,
+    218, 246, 97, 228, 251, 34, 242, 193, 238, 210, 144, 12, 191, 179, 162, 241,
+    81, 51, 145, 235, 249, 14, 239, 107, 49, 192, 214, 31, 181, 199, 106, 157,
+    184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138, 236, 205, 93,
+    222, 114, 67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180,
+)
+
+_GRAD3 = numpy.array((
+    (1, 1, 0), (-1, 1, 0), (1, -1, 0), (-1, -1, 0),
+    (1, 0, 1), (-1, 0, 1), (1, 0, -1), (-1, 0, -1),
+    (0, 1, 1), (0, -1, 1), (0, 1, -1), (0, -1, -1),
+    (1, 0, -1), (-1, 0, -1), (0, -1, 1), (0, 1, 1),
+), dtype=numpy.float32)
+
+_GRAD4 = numpy.array([
+    (w, x, y, z)
+    for (w, x) in ((0, 1), (0, -1), (1, 0), (-1, 0))
+    for y in (1, -1) for z in (1, -1)
+] + [
+    (x, y, w, z)
+    for (x, y) in ((1, 1), (1, -1), (-1, 1), (-1, -1))
+    for w in (0, )
+    for z in (1, -1)
+] + [
+    (x, y, z, 0)
+    for x in (1, -1) for y in (1, -1) for z in (1, -1)
+], dtype='<f4')
+
+# A non-zero base shifts the lookups past the end of the (doubled)
+# permutation table. The C implementation then reads out of bounds, into
+# the 4D gradient table the compiler lays out right after it. Replicate
+# that so such bases give the same noise; this relies on the layout of the
+# compiled library, which the tests check for every base up to MAX_BASE.
+_PERM = numpy.concatenate([
+    numpy.array(_PERMUTATION * 2, dtype=numpy.uint8),
+    _GRAD4.view(numpy.uint8).ravel(),
+]).astype(numpy.intp)
+
+#: Largest base for which the lookups stay within the known table
+MAX_BASE = len(_PERM) - 2 * 256 + 1
+
+_ONE = numpy.float32(1)
+
+
+def _check_base(base):
+    if not 0 <= base <= MAX_BASE:
+        raise Exception("Noise base must be in [0, %d]" % MAX_BASE)
+
+
+def _fade(t):
+    return t * t * t * (t * (t * numpy.float32(6) - numpy.float32(15)) + numpy.float32(10))
+
+
+def _lerp(t, a, b):
+    return a + t * (b - a)
+
+
+def _lattice(x, repeat, base):
+    """
+    Lattice indices (cell and next cell) and the position within the cell
+    """
+    i = numpy.floor(numpy.fmod(x, repeat)).astype(numpy.intp)
+    ii = numpy.fmod((i + 1).astype(numpy.float32), repeat).astype(numpy.intp)
+    return ((i & 255) + base, (ii & 255) + base, x - numpy.floor(x))
+
+
+def _noise2(x, y, repeatx, repeaty, base):
+    (i, ii, x) = _lattice(x, repeatx, base)
+    (j, jj, y) = _lattice(y, repeaty, base)
+    (fx, fy) = (_fade(x), _fade(y))
+
+    (a, b) = (_PERM[i], _PERM[ii])
+    (aa, ab, ba, bb) = (_PERM[a + j], _PERM[a + jj], _PERM[b + j], _PERM[b + jj])
+
+    def grad(h, x, y):
+        g = _GRAD3[_PERM[h] & 15]
+        return x * g[..., 0] + y * g[..., 1]
+
+    return _lerp(
+        fy,
+        _lerp(fx, grad(aa, x, y), grad(ba, x - _ONE, y)),
+        _lerp(fx, grad(ab, x, y - _ONE), grad(bb, x - _ONE, y - _ONE))
+    )
+
+
+def _noise3(x, y, z, repeatx, repeaty, repeatz, base):
+    (i, ii, x) = _lattice(x, repeatx, base)
+    (j, jj, y) = _lattice(y, repeaty, base)
+    (k, kk, z) = _lattice(z, repeatz, base)
+    (fx, fy, fz) = (_fade(x), _fade(y), _fade(z))
+
+    (a, b) = (_PERM[i], _PERM[ii])
+    (aa, ab, ba, bb) = (_PERM[a + j], _PERM[a + jj], _PERM[b + j], _PERM[b + jj])
+
+    def grad(h, x, y, z):
+        g = _GRAD3[_PERM[h] & 15]
+        return x * g[..., 0] + y * g[..., 1] + z * g[..., 2]
+
+    (x1, y1, z1) = (x - _ONE, y - _ONE, z - _ONE)
+    return _lerp(
+        fz,
+        _lerp(
+            fy,
+            _lerp(fx, grad(aa + k, x, y, z), grad(ba + k, x1, y, z)),
+            _lerp(fx, grad(ab + k, x, y1, z), grad(bb + k, x1, y1, z))
+        ),
+        _lerp(
+            fy,
+            _lerp(fx, grad(aa + kk, x, y, z1), grad(ba + kk, x1, y, z1)),
+            _lerp(fx, grad(ab + kk, x, y1, z1), grad(bb + kk, x1, y1, z1))
+        )
+    )
+
+
+def _octaves(noise, coords, repeats, octaves, persistence, lacunarity, base):
+    _check_base(base)
+    coords = [numpy.asarray(c, dtype=numpy.float32) for c in coords]
+    repeats = [numpy.float32(r) for r in repeats]
+    # Like the C implementation, work in single precision but return doubles
+    if octaves == 1:
+        total = noise(*coords, *repeats, base)
+    else:
+        (persistence, lacunarity) = (numpy.float32(persistence), numpy.float32(lacunarity))
+        (freq, amp, total, maximum) = (_ONE, _ONE, numpy.float32(0), numpy.float32(0))
+        for _ in range(octaves):
+            total = total + noise(*[c * freq for c in coords], *[r * freq for r in repeats], base) * amp
+            maximum += amp
+            freq *= lacunarity
+            amp *= persistence
+        total = total / maximum
+    if all(c.ndim == 0 for c in coords):
+        return float(total)
+    return numpy.asarray(total, dtype=numpy.float64)
+
+
+def pnoise2(x, y, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=1024, repeaty=1024, base=0):
+    """
+    2D Perlin noise, a drop-in for ``noise.pnoise2`` which also accepts
+    arrays of coordinates.
+
+    :param x: x coordinate(s)
+    :type x: float or numpy.ndarray
+    :param y: y coordinate(s)
+    :type y: float or numpy.ndarray
+    :param int octaves: number of passes of fBm noise
+    :param float persistence: amplitude of each octave relative to the previous one
+    :param float lacunarity: frequency of each octave relative to the previous one
+    :param int base: offset into the permutation table, selects a different
+                     noise pattern, at most ``MAX_BASE``
+
+    :returns: noise, in the shape of the broadcast coordinates, or a float
+              if all coordinates are scalars
+    :rtype: numpy.ndarray or float
+    """
+    return _octaves(_noise2, (x, y), (repeatx, repeaty), octaves, persistence, lacunarity, base)
+
+
+def pnoise3(x, y, z, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=1024, repeaty=1024, repeatz=1024, base=0):
+    """
+    3D Perlin noise, a drop-in for ``noise.pnoise3`` which also accepts
+    arrays of coordinates. See ``pnoise2`` for the parameters.
+
+    :rtype: numpy.ndarray or float
+    """
+    return _octaves(_noise3, (x, y, z), (repeatx, repeaty, repeatz), octaves, persistence, lacunarity, base)
+
+
+def field(shape, scale=1.0, offset=0.0, **kwargs):
+    """
+    Noise over a whole 2D or 3D grid: the point at index ``idx`` samples
+    the noise at ``offset + idx * scale`` (per axis).
+
+    :param shape: grid shape, two or three dimensions
+    :type shape: tuple(int)
+    :param scale: distance between samples, for all or for each axis
+    :type scale: float or tuple(float)
+    :param offset: position of the first sample, for all or for each axis
+    :type offset: float or tuple(float)
+
+    Any other keyword arguments are passed to ``pnoise2``/``pnoise3``.
+
+    :rtype: numpy.ndarray
+    """
+    if len(shape) not in (2, 3):
+        raise Exception("Noise fields must have two or three dimensions")
+    scale = numpy.broadcast_to(scale, (len(shape), ))
+    offset = numpy.broadcast_to(offset, (len(shape), ))
+    coords = [o + g * s for (g, s, o) in zip(numpy.ogrid[tuple(slice(0, n) for n in shape)], scale, offset)]
+    if len(shape) == 2:
+        return pnoise2(*coords, **kwargs)
+    return pnoise3(*coords, **kwargs)
@@ -35,6 +35,16 @@ DISTMAN = CastleDistributionManager()
 
 STARTING_POSITION = CoarseVector(8, 8, 3)
 
+# Footprints and doorways of rooms, see Room.template
+_TEMPLATES = {}
+# The same, relative to the pos given to the constructor, see Room.class_template
+_CLASS_TEMPLATES = {}
+
+
+def _int_offset(vector):
+    """Convert a rotated vector to an (x, y, z) tuple of integers"""
+    return tuple(int(c) if c == int(c) else c for c in (vector.x, vector.y, vector.z))
+
 
 # Room is an object, but is also inherits from CKM which inherits from object,
 # so we just inherit from CKM
@@ -68,6 +78,68 @@ class Room(ConstructionKitMixin):
             {'orientation': WEST, 'offset': WEST},
         ]
 
+    def template(self, orientation=None):
+        """The positions and doorways of this room when facing orientation
+        (by default the room's own), relative to self.pos.
+
+        These are computed once per room class, orientation and set of
+        randflags, which is everything _get_positions and _get_doorways
+        may depend on. Subclasses with other state affecting their shape
+        should override ``_template_key``.
+
+        :returns: a tuple of (positions, doorways). Positions are (x, y, z)
+                  integer offsets, doorways are (orientation, offset) tuples
+                  with the orientation as a CoarseVector.
+        :rtype: tuple
+        """
+        if orientation is None:
+            orientation = self.orientation
+        key = self._template_key(orientation)
+        template = _TEMPLATES.get(key)
+        if template is None:
+            # Work on a copy, computing the layout may load data (e.g. a
+            # MagicaRoom's model) that we don't want to carry around.
+            room = copy.copy(self)
+            positions = tuple(_int_offset(p.rotate(orientation)) for p in room._get_positions())
+            doorways = tuple(
+                (
+                    CoarseVector(*_int_offset(q['orientation'].rotate(orientation))),
+                    _int_offset(q['offset'].rotate(orientation))
+                )
+                for q in room._get_doorways()
+            )
+            template = _TEMPLATES[key] = (positions, doorways)
+        return template
+
+    def _template_key(self, orientation):
+        return (self.__class__, orientation, tuple(self._randflags) if hasattr(self, '_randflags') else None)
+
+    @classmethod
+    def class_template(cls, orientation):
+        """The template of this room class when built without randflags,
+        only instantiating the class if it has not been seen before.
+
+        Unlike ``template``, the offsets are relative to the ``pos`` given
+        to the constructor, which some rooms (e.g. large rooms) shift.
+
+        :param orientation: orientation of the room
+        :type orientation: redeclipse.vector.CoarseVector
+
+        :returns: see ``template``
+        :rtype: tuple
+        """
+        key = (cls, orientation, tuple(cls._randflags) if hasattr(cls, '_randflags') else None)
+        template = _CLASS_TEMPLATES.get(key)
+        if template is None:
+            room = cls(pos=SELF, orientation=orientation)
+            (positions, doorways) = room.template()
+            (sx, sy, sz) = _int_offset(room.pos)
+            template = _CLASS_TEMPLATES[key] = (
+                tuple((x + sx, y + sy, z + sz) for (x, y, z) in positions),
+                tuple((ori, (x + sx, y + sy, z + sz)) for (ori, (x, y, z)) in doorways),
+            )
+        return template
+
     def get_doorways(self):
         """The get_doorways function that most things actually use, which applies the offset.
 
@@ -75,12 +147,13 @@ class Room(ConstructionKitMixin):
         your doorways. Everyone will call this and have access to shifted
         values.
         """
+        (x, y, z) = (self.pos.x, self.pos.y, self.pos.z)
         return [
             {
-                'orientation': q['orientation'].rotate(self.orientation),
-                'offset': self.pos + q['offset'].rotate(self.orientation)
+                'orientation': orientation,
+                'offset': CoarseVector(x + dx, y + dy, z + dz)
             }
-            for q in self._get_doorways()
+            for (orientation, (dx, dy, dz)) in self.template()[1]
         ]
 
     def _get_positions(self):
@@ -88,8 +161,9 @@ class Room(ConstructionKitMixin):
 
     def get_positions(self):
         """Positions occupied by this unit"""
+        (x, y, z) = (self.pos.x, self.pos.y, self.pos.z)
         return [
-            self.pos + p.rotate(self.orientation) for p in self._get_positions()
+            CoarseVector(x + dx, y + dy, z + dz) for (dx, dy, dz) in self.template()[0]
         ]
 
     @classmethod
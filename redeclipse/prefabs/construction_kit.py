@@ -3,7 +3,7 @@ import random
 from bresenham import bresenham
 
 from redeclipse.objects import cube
-from redeclipse.vector import FineVector
+from redeclipse.vector import FineVector, VoxelVector
 from redeclipse.vector.orientations import TILE_VOX_OFF, NORTH, SOUTH, EAST, WEST, ABOVE, BELOW
 ROOM_SIZE = 8
 
@@ -126,6 +126,19 @@ def wall_points(size, direction, limit_j=100, limit_i=100):
                 yield FineVector(size - 1, i, j)
 
 
+def _cube_ranges(x, y, z):
+    """
+    Ranges of the i, j, k indices of ``cube_points``
+    """
+    ranges = []
+    for size in (x, y, z):
+        if size > 0:
+            ranges.append(range(0, size))
+        else:
+            ranges.append(range(size + 1, 1))
+    return ranges
+
+
 def cube_points(x, y, z):
     """
     Yield points needed to draw a rectangular prism or cube.
@@ -140,30 +153,10 @@ def cube_points(x, y, z):
     :returns: An iterable of FineVectors
     :rtype: list(redeclipse.vector.FineVector)
     """
-    if x > 0:
-        x_lower_bound = 0
-        x_upper_bound = x
-    else:
-        x_lower_bound = x + 1
-        x_upper_bound = 1
-
-    if y > 0:
-        y_lower_bound = 0
-        y_upper_bound = y
-    else:
-        y_lower_bound = y + 1
-        y_upper_bound = 1
-
-    if z > 0:
-        z_lower_bound = 0
-        z_upper_bound = z
-    else:
-        z_lower_bound = z + 1
-        z_upper_bound = 1
-
-    for i in range(x_lower_bound, x_upper_bound):
-        for j in range(y_lower_bound, y_upper_bound):
-            for k in range(z_lower_bound, z_upper_bound):
+    (x_range, y_range, z_range) = _cube_ranges(x, y, z)
+    for i in x_range:
+        for j in y_range:
+            for k in z_range:
                 yield FineVector(i, j, k)
 
 
@@ -211,30 +204,50 @@ class ConstructionKitMixin(object):
         if 'prob' in kwargs:
             del kwargs['prob']
 
+        # Every point shares the same (immutable) cube
+        data = cube.solid(tex=tex)
         for point in func(*args, **kwargs):
             if subtract_or_skip(subtract, prob):
                 world.del_pointv(point)
                 continue
-            world.set_pointv(point, cube.newtexcube(tex=tex))
+            world.set_pointv(point, data)
+
+    def _local_position(self, offset):
+        """
+        World position of ``offset``, given relative to this room (and in
+        its orientation).
+
+        Offsets on the integer grid, which is nearly all of them, are
+        handled as a VoxelVector.
+        """
+        cached = getattr(self, '_voxel_pos', None)
+        if cached is None or cached[0] is not self.pos:
+            # Rooms are moved around (e.g. mirrored) by replacing their pos
+            cached = self._voxel_pos = (self.pos, VoxelVector.from_vector(self.pos))
+        origin = cached[1]
+        local = VoxelVector.from_vector(offset)
+        if origin is None or local is None:
+            return self.pos + offset.offset_rotate(self.orientation, offset=TILE_VOX_OFF)
+        return origin + local.offset_rotate(self.orientation, offset=TILE_VOX_OFF)
 
     def x_cube(self, offset):
-        yield self.pos + offset.offset_rotate(self.orientation, offset=TILE_VOX_OFF)
+        yield self._local_position(offset)
 
     def x_column(self, offset, direction, length):
-        local_position = self.pos + offset.offset_rotate(self.orientation, offset=TILE_VOX_OFF)
+        local_position = self._local_position(offset)
         for point in column_points(length, direction.rotate(self.orientation)):
             yield point + local_position
 
     def x_interpolate(self, offset, start, end):
         start = start.rotate(self.orientation).vox()
         end = end.rotate(self.orientation).vox()
-        local_position = self.pos + offset.offset_rotate(self.orientation, offset=TILE_VOX_OFF)
+        local_position = self._local_position(offset)
 
         for point in line_points(start, end):
             yield point + local_position
 
     def x_dotted_column(self, offset, direction, length, on=2, off=2):
-        local_position = self.pos + offset.offset_rotate(self.orientation, offset=TILE_VOX_OFF)
+        local_position = self._local_position(offset)
         onoff = [True] * on + [False] * off
         for idx, point in enumerate(column_points(length, direction.rotate(self.orientation))):
             if onoff[idx % len(onoff)]:
@@ -268,7 +281,16 @@ class ConstructionKitMixin(object):
 
     def x_rectangular_prism(self, offset, xyz):
         xyz = xyz.rotate(self.orientation).vox()
-        local_position = self.pos + offset.offset_rotate(self.orientation, offset=TILE_VOX_OFF)
+        local_position = self._local_position(offset)
 
-        for point in cube_points(xyz.x, xyz.y, xyz.z):
-            yield point + local_position
+        if type(local_position) is not VoxelVector:
+            for point in cube_points(xyz.x, xyz.y, xyz.z):
+                yield point + local_position
+            return
+
+        (x, y, z) = local_position
+        (x_range, y_range, z_range) = _cube_ranges(xyz.x, xyz.y, xyz.z)
+        for i in x_range:
+            for j in y_range:
+                for k in z_range:
+                    yield VoxelVector(x + i, y + j, z + k)
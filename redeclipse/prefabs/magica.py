@@ -1,8 +1,60 @@
+import numpy
+
 from redeclipse.prefabs import Room, TEXMAN
-from redeclipse.magicavoxel.reader import Magicavoxel
+from redeclipse.magicavoxel.reader import VoxFile
 from redeclipse.voxel import VoxelWorld
-from redeclipse.vector import FineVector, CoarseVector
-from redeclipse.vector.orientations import SELF, EAST, SOUTH, WEST, NORTH, n
+from redeclipse.vector import CoarseVector, VoxelVector
+from redeclipse.vector.orientations import EAST, SOUTH, WEST, NORTH, n
+
+
+class MagicaModel(object):
+    """
+    A MagicaVoxel model as used by the prefabs. Use ``MagicaModel.load``,
+    which parses every file only once.
+
+    :param str vox_file: path to the .vox file
+    """
+    _cache = {}
+
+    def __init__(self, vox_file):
+        model = VoxFile.from_file(vox_file)
+        #: Colour of every palette index, as (r, g, b) in [0, 1]
+        self.colours = {
+            idx: (r / 255, g / 255, b / 255)
+            for idx, (r, g, b, a) in enumerate(model.palette.tolist())
+        }
+        self.vox = VoxelWorld()
+        for (x, y, z, c) in model.voxels.tolist():
+            self.vox.set_point(x, y, z, c)
+        #: (N, 4) array of x, y, z, colour index, in file order (minus any
+        #: duplicated positions)
+        self.voxels = numpy.array(
+            [k + (c,) for (k, c) in self.vox.world.items()], dtype=numpy.uint8
+        ).reshape(-1, 4)
+        self._positions = {}
+
+    @classmethod
+    def load(cls, vox_file):
+        if vox_file not in cls._cache:
+            cls._cache[vox_file] = cls(vox_file)
+        return cls._cache[vox_file]
+
+    def positions(self, offset=(0, 0, 0)):
+        """
+        Unique coarse positions occupied by the model, in the order they
+        are first seen.
+
+        :param tuple offset: (x, y, z) offset applied to every voxel.
+
+        :rtype: list(redeclipse.vector.CoarseVector)
+        """
+        if offset not in self._positions:
+            coarse = (self.voxels[:, :3].astype(numpy.int64) + offset) // 8
+            (unique, first) = numpy.unique(coarse, axis=0, return_index=True)
+            self._positions[offset] = [
+                CoarseVector(*p) for p in unique[numpy.argsort(first)].tolist()
+            ]
+        return self._positions[offset]
 
 
 class MagicaRoom(Room):
@@ -18,7 +70,7 @@ class MagicaRoom(Room):
     ]
 
     def __init__(self, pos, roof=False, orientation=EAST, randflags=None):
-        self._off = FineVector(self.boundary_additions.get('WEST', 0), self.boundary_additions.get('SOUTH', 0), 0).rotate(orientation)
+        self._off = VoxelVector(self.boundary_additions.get('WEST', 0), self.boundary_additions.get('SOUTH', 0), 0).rotate(orientation)
         self.orientation = orientation
         self.pos = CoarseVector(*pos)
         if randflags:
@@ -28,43 +80,31 @@ class MagicaRoom(Room):
         return '<MagicaRoom %s facing:%s,pos:%s>' % (self.name, n(self.orientation), self.pos)
 
     def load_model(self):
-        self.model = Magicavoxel.from_file(self.vox_file)
-        self.vox = VoxelWorld()
-        self._colours = {}
-        for vox in self.model.model_voxels.voxels:
-            self.vox.set_point(vox.x, vox.y, vox.z, vox.c)
-            # For every colour in the palette, register it with the current
-            # class's colour atlas (non-global colour atlas).
-            for idx, colour in enumerate(self.model.palette.colours):
-                self._colours[idx] = (colour.r / 255, colour.g / 255, colour.b / 255)
-
-        self.__doors = []
-        for door in self.doors:
-            self.__doors.append(door)
-
-        # We'll calculate a unique list of coarse vectors which are occupied
-        self.__positions = []
-        # Sometimes we need to offset our model because it doesn't fully
-        # extend. We get the western + southern side additions which should
-        # offset every voxel.
-        offset = FineVector(self.boundary_additions.get('WEST', 0), self.boundary_additions.get('SOUTH', 0), 0)
-        # Now looping over every voxel
-        for (vox, value) in self.vox.world.items():
-            # We offset it and convert it to a coarse version ( // 8)
-            tmp = (FineVector(*vox) + offset).coarse()
-            # And ensure that our list is unique
-            if tmp not in self.__positions:
-                self.__positions.append(tmp)
+        """
+        The parsed model of ``vox_file``. Models are loaded once per
+        process and shared between all rooms, so treat them as read-only.
+
+        :rtype: MagicaModel
+        """
+        return MagicaModel.load(self.vox_file)
+
+    @property
+    def vox(self):
+        return self.load_model().vox
+
+    @property
+    def _colours(self):
+        return self.load_model().colours
 
     def _get_doorways(self):
-        if not hasattr(self, 'model'):
-            self.load_model()
-        return self.__doors
+        return self.doors
 
     def _get_positions(self):
-        if not hasattr(self, 'model'):
-            self.load_model()
-        return self.__positions
+        # Sometimes we need to offset our model because it doesn't fully
+        # extend. We get the western + southern side additions which should
+        # offset every voxel.
+        offset = (self.boundary_additions.get('WEST', 0), self.boundary_additions.get('SOUTH', 0), 0)
+        return self.load_model().positions(offset)
 
     def render_extra(self, world, xmap):
         self.light(xmap)
@@ -97,15 +137,12 @@ class MagicaRoom(Room):
         """
         (r, g, b) = self._colours[self.vox.world[v]]
         c = self.colour_to_texture(r, g, b)
-        self.x('cube', world, SELF + FineVector(*v) + self._off, tex=c)
+        self.x('cube', world, VoxelVector(*v) + self._off, tex=c)
 
     def render(self, world, xmap):
         """
         Render the magica room to the world.
         """
-        if not hasattr(self, 'model'):
-            self.load_model()
-
         # (re)initialize textures for self.
         self.initialize_textures()
 
@@ -0,0 +1,150 @@
+"""
+Per-stage instrumentation for the map generators.
+
+A :class:`Profiler` times the named stages of a run (parsing, placing rooms,
+rendering, building the octree, writing...)::
+
+    profiler = Profiler(memory=True)
+    with profiler.stage('to_octree') as stage:
+        mymap.world = v.to_octree()
+        stage['octree_nodes'] = octree_nodes(mymap.world)
+    profiler.stop()
+    profiler.write('report.json')
+
+Every stage records its wall and CPU time. With ``memory`` enabled it also
+records the peak memory allocated during the stage (via ``tracemalloc``,
+which slows the run down considerably) and the number of objects tracked by
+the garbage collector afterwards. Anything else worth reporting, like voxel
+counts or bytes written, is stored in the dict the stage yields.
+
+Work done in other processes (e.g. rendering with ``processes > 1``) only
+shows up in the wall time.
+"""
+import contextlib
+import cProfile
+import gc
+import json
+import logging
+import time
+import tracemalloc
+
+log = logging.getLogger(__name__)
+
+
+def octree_nodes(world):
+    """
+    Count the cubes in an octree
+
+    :param world: the eight top level cubes, e.g. ``Map.world``
+    :type world: list(redeclipse.objects.cube)
+
+    :rtype: int
+    """
+    count = 0
+    stack = [world]
+    while stack:
+        children = stack.pop()
+        count += len(children)
+        stack.extend(c.children for c in children if c.children)
+    return count
+
+
+class Profiler(object):
+    """
+    Records per-stage timings (and optionally memory use) of a run
+
+    :param bool memory: trace memory allocations and count objects
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = []
+        self.info = {}
+        self._tracing = False
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time the body of the ``with`` block as stage ``name``. Stages are
+        not meant to be nested, each one resets the memory peak. Before
+        Python 3.9, the peak can only be reset if this profiler started
+        tracing; otherwise it is the peak since tracing started.
+
+        :returns: the stage's entry in the report, extra figures may be added to it
+        :rtype: dict
+        """
+        entry = {'name': name}
+        self.stages.append(entry)
+
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            elif self._tracing:
+                # Python < 3.9 can not reset the peak, start over instead
+                tracemalloc.stop()
+                tracemalloc.start()
+            start_memory = tracemalloc.get_traced_memory()[0]
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield entry
+        finally:
+            entry['wall'] = time.perf_counter() - wall
+            entry['cpu'] = time.process_time() - cpu
+            if self.memory:
+                (current, peak) = tracemalloc.get_traced_memory()
+                entry['memory'] = current - start_memory
+                entry['peak_memory'] = peak - start_memory
+                entry['objects'] = len(gc.get_objects())
+            log.debug("Stage %s took %.2fs", name, entry['wall'])
+
+    def stop(self):
+        """
+        Stop tracing memory allocations, if this profiler started it
+        """
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def report(self):
+        """
+        The recorded stages, in the order in which they started
+
+        :rtype: dict
+        """
+        return {
+            'info': self.info,
+            'stages': self.stages,
+            'wall': sum(s['wall'] for s in self.stages if 'wall' in s),
+        }
+
+    def write(self, path):
+        """
+        Write ``report()`` to ``path`` as JSON
+        """
+        with open(path, 'w') as handle:
+            json.dump(self.report(), handle, indent=2)
+
+
+@contextlib.contextmanager
+def profile(path=None):
+    """
+    Run the body of the ``with`` block under cProfile, and dump the stats
+    to ``path`` (e.g. for ``python -m pstats`` or snakeviz). Does nothing if
+    ``path`` is None.
+    """
+    if path is None:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,229 @@
+"""
+Render placed rooms into a VoxelWorld, optionally spread over several
+processes.
+
+Every room is rendered with its own random seed (derived from the map seed
+and the room's index), so a room's contents do not depend on which rooms
+were rendered before it, or on which process rendered it.
+
+Workers render rooms into a :class:`RoomBuffer` rather than the real world,
+and send back the final state of every point they touched, the entities
+they added and the textures they added to the texture manager. The main
+process then applies those results in room order, assigning atlas indices
+for new textures in the same order a serial render would, so the resulting
+world, entities and texture atlas are identical to a serial render.
+
+Rooms reading the world back (``get_point``) see their own changes, and
+otherwise the world as it was before rendering started: changes made by
+earlier rooms are only visible to rooms rendered serially.
+
+Another limitation: workers only know about the textures registered before
+rendering started. Textures referenced by a literal index which is not yet
+in the atlas at that point (rather than obtained from the texture manager)
+are indistinguishable from textures the worker added, and will be
+renumbered.
+"""
+import logging
+import multiprocessing
+import random
+
+from redeclipse.objects import SolidCube
+from redeclipse.voxel import VoxelWorld
+
+log = logging.getLogger(__name__)
+
+# Shared with the forked workers, see render_rooms.
+_JOB = {}
+
+
+class RoomBuffer(VoxelWorld):
+    """
+    A VoxelWorld which records changes, to be applied to another world
+    later with ``apply``.
+
+    Every touched point is stored once, in the order in which the real
+    world's dict would end up holding it, together with whether the point
+    was deleted along the way. Replaying these reproduces the target
+    world's contents, key order and boundaries exactly.
+
+    :param parent: world read back for points this buffer did not touch
+    :type parent: redeclipse.voxel.VoxelWorld
+    """
+
+    def __init__(self, size=2**7, parent=None):
+        super().__init__(size=size)
+        # point -> (deleted, value); value None if the point ends up empty
+        self.changes = {}
+        self.parent = parent
+
+    def set_point(self, x, y, z, data):
+        self._update_boundaries(x, y, z)
+        key = (x, y, z)
+        if key in self.changes:
+            self.changes[key] = (self.changes[key][0], data)
+        else:
+            self.changes[key] = (False, data)
+
+    def set_pointv(self, xyz, data):
+        self.set_point(xyz.x, xyz.y, xyz.z, data)
+
+    def del_point(self, x, y, z):
+        key = (x, y, z)
+        self.changes.pop(key, None)
+        self.changes[key] = (True, None)
+
+    def del_pointv(self, xyz):
+        (x, y, z) = xyz
+        self.del_point(x, y, z)
+
+    def get_point(self, x, y, z):
+        change = self.changes.get((x, y, z), None)
+        if change is not None:
+            return change[1]
+        if self.parent is not None:
+            return self.parent.get_point(x, y, z)
+        return None
+
+    @property
+    def touched(self):
+        return self.xmin <= self.xmax
+
+    def apply(self, world, value=None):
+        """
+        Apply the recorded changes to ``world``.
+
+        :param value: function mapping recorded values to the values to
+                      store, e.g. to translate texture indices.
+        """
+        for (key, (deleted, data)) in self.changes.items():
+            if deleted:
+                world.del_point(*key)
+            if data is not None:
+                world.set_point(key[0], key[1], key[2], data if value is None else value(data))
+
+        if self.touched:
+            # Points deleted again still count towards the boundaries
+            world._update_boundaries(self.xmin, self.ymin, self.zmin)
+            world._update_boundaries(self.xmax, self.ymax, self.zmax)
+
+
+def room_seed(seed, idx):
+    """
+    Random seed used to render the room at position ``idx``
+    """
+    return '%s:%s' % (seed, idx)
+
+
+def _texman_state(texman):
+    return (dict(texman.atlas), dict(texman.atlas_backref), dict(texman.texref))
+
+
+def _render_job(idx):
+    """
+    Render a single room in a worker, starting from the texture manager
+    state at the time the pool was started.
+    """
+    texman = _JOB['texman']
+    (atlas, atlas_backref, texref) = _JOB['texman_state']
+    (texman.atlas, texman.atlas_backref, texman.texref) = (dict(atlas), dict(atlas_backref), dict(texref))
+    xmap = _JOB['xmap']
+    nents = len(xmap.ents)
+
+    # The world as it was when the workers were forked
+    buf = RoomBuffer(size=_JOB['size'], parent=_JOB['world'])
+    random.seed(room_seed(_JOB['seed'], idx))
+    # Colour the room's lights before they are sent back
+    with _JOB['lightman'].batch():
+        _JOB['rooms'][idx].render(buf, xmap)
+
+    ents = xmap.ents[nents:]
+    del xmap.ents[nents:]
+    names = {pos: name for (name, pos) in texman.atlas_backref.items()}
+    textures = [(names[pos], texman.atlas[pos]) for pos in range(len(atlas), len(texman.atlas))]
+
+    # Send every distinct value once, shared cubes only need their textures
+    palette = {}
+    values = []
+    for (key, (deleted, data)) in buf.changes.items():
+        if data is None:
+            continue
+        ref = data.texture if type(data) is SolidCube else id(data)
+        if ref not in palette:
+            palette[ref] = len(values)
+            values.append(data.texture if type(data) is SolidCube else data)
+        buf.changes[key] = (deleted, palette[ref])
+    return buf, values, ents, textures
+
+
+def _renumber(data, base, renumber):
+    """
+    Translate the texture indices a worker assigned to new textures (those
+    from ``base`` onwards) to the ones assigned in this process.
+    """
+    if type(data) is tuple:
+        return SolidCube.get(tuple(renumber[t - base] if t >= base else t for t in data))
+
+    texture = getattr(data, 'texture', None)
+    if texture is None or all(not isinstance(t, int) or t < base for t in texture):
+        return data
+    data = data.copy()
+    data.texture = tuple(renumber[t - base] if isinstance(t, int) and t >= base else t for t in texture)
+    return data
+
+
+def _render_serial(rooms, world, xmap, seed, lightman):
+    with lightman.batch():
+        for (idx, room) in enumerate(rooms):
+            random.seed(room_seed(seed, idx))
+            room.render(world, xmap)
+
+
+def _render_parallel(rooms, world, xmap, seed, processes, texman, lightman):
+    _JOB.update(
+        rooms=rooms, world=world, xmap=xmap, seed=seed, size=world.size,
+        texman=texman, texman_state=_texman_state(texman), lightman=lightman,
+    )
+    base = len(texman.atlas)
+    try:
+        ctx = multiprocessing.get_context('fork')
+        with ctx.Pool(processes) as pool:
+            chunksize = max(1, len(rooms) // (processes * 8))
+            for (buf, values, ents, textures) in pool.imap(_render_job, range(len(rooms)), chunksize):
+                renumber = [texman.register(name, tex) for (name, tex) in textures]
+                values = [_renumber(data, base, renumber) for data in values]
+                buf.apply(world, values.__getitem__)
+                xmap.ents.extend(ents)
+    finally:
+        _JOB.clear()
+
+
+def render_rooms(rooms, world, xmap, seed=0, processes=1):
+    """
+    Render every room into the world, in order.
+
+    :param rooms: rooms to render, e.g. ``UnusedPositionManager.rooms``
+    :type rooms: list(redeclipse.prefabs.Room)
+    :param world: world to render into
+    :type world: redeclipse.voxel.VoxelWorld
+    :param xmap: map receiving the rooms' entities
+    :type xmap: redeclipse.Map
+    :param seed: map seed, every room is rendered with a seed derived from it
+    :param int processes: number of worker processes, rooms are rendered in
+                          this process if 1. The output does not depend on
+                          the number of processes.
+
+    Lights are coloured in batches (see ``LightManager.batch``), all at once
+    when rendering serially or per room in the workers.
+    """
+    from redeclipse.prefabs import LIGHTMAN, TEXMAN
+
+    state = random.getstate()
+    if processes > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        log.warning("Parallel rendering needs fork() support, rendering serially")
+        processes = 1
+
+    if processes > 1 and len(rooms) > 1:
+        _render_parallel(rooms, world, xmap, seed, processes, TEXMAN, LIGHTMAN)
+    else:
+        _render_serial(rooms, world, xmap, seed, LIGHTMAN)
+    random.setstate(state)
@@ -0,0 +1,204 @@
+"""
+Octrees whose identical subtrees are shared (hash-consed).
+
+Generated maps repeat themselves a lot: the same prefab is placed many
+times, mirrored layouts repeat whole rooms, and terrain is made of many
+identical columns. Every copy normally becomes a tree of cubes of its own.
+Shared octrees build every distinct subtree once instead::
+
+    world = v.to_octree(share=True)
+    mymap = MapParser().read('map.mpz', share=True)
+
+Subtrees are :class:`SharedCube` instances, interned by their structure:
+leaves by everything which is written to the map, and cubes with children
+by the identity of their (interned) children. Two shared subtrees are thus
+identical exactly if they are the same object, so comparing them is O(1)
+(``a is b``), even across octrees.
+
+Shared cubes can not be modified, ``copy()`` returns a regular cube to
+modify instead. The entries of a ``Map.world`` are such copies, as those
+are regularly modified. The map writer caches the serialized bytes of
+every shared leaf and of every shared subtree used more than once, so
+repeated subtrees are serialized once.
+"""
+import weakref
+
+from redeclipse.enums import OCT, TextNum
+from redeclipse.objects import cube, cubext, SolidCube, SurfaceInfo
+
+_OCTSAV_CHILDREN = OCT.OCTSAV_CHILDREN.value
+
+# Interned subtrees by key, only as long as something else refers to them.
+# Children are kept alive by their parents, so the ids in the keys of
+# cubes with children can not be reused while they are in here.
+_interned = weakref.WeakValueDictionary()
+
+
+def _surface_key(s):
+    return None if s is None else (tuple(s.lmid), s.verts, s.numverts)
+
+
+def _leaf_key(c):
+    """
+    Everything written to the map for a leaf cube (see ``Map._savec``),
+    plus its faces
+    """
+    surfaces = None
+    if c.ext and c.ext.surfaces is not None:
+        surfaces = tuple(map(_surface_key, c.ext.surfaces))
+    texture = c.texture
+    if TextNum in map(type, texture):
+        texture = tuple(t.value if isinstance(t, TextNum) else t for t in texture)
+    return (
+        c.octsav, c.faces, tuple(c.edges), tuple(texture),
+        c.material, c.merged, c.surfmask, c.totalverts, surfaces,
+    )
+
+
+class SharedCube(cube):
+    """
+    An immutable cube, shared between every place in which its subtree
+    occurs, see ``redeclipse.sharing``. Use :func:`share` (or
+    ``SharedCube.get``) rather than creating these directly.
+
+    :param template: cube whose fields are copied
+    :type template: redeclipse.objects.cube
+    :param children: the (shared) children, if any
+    :type children: tuple(redeclipse.objects.cube)
+    """
+    __slots__ = ('packed', 'reused', '_frozen', '__weakref__')
+
+    def __init__(self, template, children=None):
+        super().__init__()
+        for key in cube.__slots__:
+            if key in ('cube_id', 'children', 'ext') or not hasattr(template, key):
+                continue
+            setattr(self, key, getattr(template, key))
+        if template.ext:
+            self.ext = cubext()
+            self.ext.verts = template.ext.verts
+            self.ext.surfaces = tuple(
+                None if s is None else SurfaceInfo(s.lmid[0], s.lmid[1], s.verts, s.numverts)
+                for s in template.ext.surfaces
+            )
+        self.children = children
+        # Serialized form of this subtree, cached by the map writer.
+        self.packed = None
+        # Whether this subtree was interned more than once
+        self.reused = False
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if name not in ('packed', 'reused') and getattr(self, '_frozen', False):
+            raise AttributeError("SharedCube instances are shared between subtrees, use copy() before modifying them")
+        super().__setattr__(name, value)
+
+    def __reduce__(self):
+        # Unpickle to the interned instance of the receiving process
+        return (share, (self.copy(), ))
+
+    def copy(self):
+        c = super().copy()
+        if c.children is not None:
+            c.children = list(c.children)
+        return c
+
+    @classmethod
+    def get(cls, children, octsav=_OCTSAV_CHILDREN):
+        """
+        Get the interned cube with these children
+
+        :param children: eight shared cubes, None for empty ones
+        :type children: list(redeclipse.objects.cube)
+        """
+        children = tuple(_EMPTY if x is None else x for x in children)
+        key = (octsav, ) + tuple(id(x) for x in children)
+        c = _interned.get(key, None)
+        if c is None:
+            template = cube.newcube()
+            template.octsav = octsav
+            c = _interned[key] = cls(template, children)
+        else:
+            c.reused = True
+        return c
+
+    @classmethod
+    def leaf(cls, c):
+        """
+        Get the interned equivalent of a leaf cube
+        """
+        key = _leaf_key(c)
+        shared = _interned.get(key, None)
+        if shared is None:
+            shared = _interned[key] = cls(c)
+        return shared
+
+
+_EMPTY = SharedCube.leaf(cube.newcube())
+
+
+def share(c):
+    """
+    The shared equivalent of a cube and its subtree, built bottom-up
+
+    :type c: redeclipse.objects.cube
+    :rtype: redeclipse.objects.cube
+    """
+    if type(c) is SolidCube or type(c) is SharedCube:
+        return c
+    if c.children:
+        return SharedCube.get([share(x) for x in c.children], octsav=c.octsav)
+    return SharedCube.leaf(c)
+
+
+def share_world(world):
+    """
+    Share the subtrees of a whole octree
+
+    :param world: the eight top level cubes, e.g. ``Map.world``
+    :type world: list(redeclipse.objects.cube)
+
+    :returns: the new top level cubes, regular cubes which may be modified
+    :rtype: list(redeclipse.objects.cube)
+    """
+    return [copy_root(share(c)) for c in world]
+
+
+def copy_root(c):
+    """
+    Top level cubes are regularly modified, so are never shared
+    """
+    if type(c) is SolidCube or type(c) is SharedCube:
+        return c.copy()
+    return c
+
+
+def count_nodes(world):
+    """
+    Count the cubes in an octree, both in total and without counting
+    shared subtrees more than once
+
+    :param world: the eight top level cubes, e.g. ``Map.world``
+    :type world: list(redeclipse.objects.cube)
+
+    :returns: the number of cubes, and the number of distinct cube objects
+    :rtype: tuple(int, int)
+    """
+    # Size of the subtree of every distinct cube, by id
+    sizes = {}
+    stack = list(world)
+    while stack:
+        c = stack[-1]
+        if id(c) in sizes:
+            stack.pop()
+        elif not c.children:
+            sizes[id(c)] = 1
+            stack.pop()
+        else:
+            pending = [x for x in c.children if id(x) not in sizes]
+            if pending:
+                stack.extend(pending)
+                continue
+            sizes[id(c)] = 1 + sum(sizes[id(x)] for x in c.children)
+            stack.pop()
+    return (sum(sizes[id(c)] for c in world), len(sizes))
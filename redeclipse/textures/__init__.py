@@ -161,8 +161,20 @@ class TextureManager:
 
     def get(self, name):
         if name not in self.atlas_backref:
+            self.register(name, self.texref[name])
+        return self.atlas_backref[name]
+
+    def register(self, name, tex):
+        """
+        Add a texture to the atlas under name, unless a texture with that
+        name is already known.
+
+        :returns: the texture's atlas index
+        :rtype: int
+        """
+        if name not in self.atlas_backref:
+            tex = self.texref.setdefault(name, tex)
             # Insert tex
-            tex = self.texref[name]
             pos = len(self.atlas)
             self.atlas[pos] = tex
             # Now insert backref
@@ -257,13 +269,7 @@ class AutomatedMagicaTextureManager(TextureManager):
             tmp.r = r
             tmp.g = g
             tmp.b = b
-            self.texref[name] = tmp
-            # Insert tex
-            tex = self.texref[name]
-            pos = len(self.atlas)
-            self.atlas[pos] = tex
-            # Now insert backref
-            self.atlas_backref[name] = pos
+            self.register(name, tmp)
         return self.atlas_backref[name]
 
     def get_c(self, category):
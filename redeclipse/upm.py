@@ -10,6 +10,62 @@ import logging
 log = logging.getLogger(__name__)
 
 
+class WeightTree:
+    """A Fenwick (binary indexed) tree of weights, supporting appending,
+    updating and weighted sampling in O(log n).
+
+    Sampling returns the same index as a linear scan over the weights would
+    (see :meth:`UnusedPositionManager.weighted_choice`), exactly so for
+    integer weights.
+    """
+
+    def __init__(self, weights=()):
+        self.tree = [0]
+        self.weights = []
+        for w in weights:
+            self.append(w)
+
+    def __len__(self):
+        return len(self.weights)
+
+    def append(self, weight):
+        self.weights.append(weight)
+        i = len(self.weights)
+        # Node i covers the range (i - lowbit(i), i]
+        self.tree.append(weight + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+    def update(self, idx, weight):
+        """Replace the weight at position idx"""
+        delta = weight - self.weights[idx]
+        self.weights[idx] = weight
+        i = idx + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, count):
+        """Sum of the first count weights"""
+        total = 0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+    def total(self):
+        return self.prefix(len(self.weights))
+
+    def search(self, r):
+        """Index of the first position whose running total is >= r"""
+        pos = 0
+        step = 1 << (len(self.weights).bit_length() - 1) if self.weights else 0
+        while step:
+            if pos + step < len(self.tree) and self.tree[pos + step] < r:
+                pos += step
+                r -= self.tree[pos]
+            step >>= 1
+        return pos
+
+
 class UnusedPositionManager:
     """Class for maintaining a quick-lookup list of which 8x8x8 cubes are in-use
 
@@ -21,8 +77,17 @@ class UnusedPositionManager:
         self.noclip = noclip
         # Set of occupied positions
         self.occupied = {}
-        # Set of doors that we can connect to
-        self.unoccupied = []
+        # The same positions, as (x, y, z) tuples
+        self._occupied_cells = set()
+        # Doors that we can connect to, in the order they were found. Slots
+        # of removed doors are set to None (and compacted away once they
+        # make up half of the list), see the ``unoccupied`` property.
+        self._doors = []
+        self._door_count = 0
+        # Door position -> slots with a door at that position
+        self._door_index = {}
+        # Flavour function -> WeightTree over self._doors
+        self._door_weights = {}
         # Set of all rooms rendered to the map
         self.rooms = []
         # Set of linked rooms by doorway.
@@ -38,6 +103,77 @@ class UnusedPositionManager:
         elif self.mirror == 4:
             self.mirror_rotations = [0, 90, 180, 270]
 
+    @property
+    def unoccupied(self):
+        """Doors that we can connect to
+
+        :returns: a list of (position, room, orientation) tuples
+        :rtype: list
+        """
+        return [d for d in self._doors if d is not None]
+
+    @unoccupied.setter
+    def unoccupied(self, doors):
+        self._doors = []
+        self._door_count = 0
+        self._door_index = {}
+        self._door_weights = {}
+        for door in doors:
+            self._add_door(door)
+
+    def _add_door(self, door):
+        slot = len(self._doors)
+        self._doors.append(door)
+        self._door_count += 1
+        self._door_index.setdefault(door[0], []).append(slot)
+        for (flavour_function, tree) in self._door_weights.items():
+            tree.append(flavour_function(*door[0]))
+
+    def _remove_slot(self, slot):
+        self._doors[slot] = None
+        self._door_count -= 1
+        for tree in self._door_weights.values():
+            tree.update(slot, 0)
+
+    def _remove_doors_at(self, position):
+        for slot in self._door_index.pop(position, ()):
+            self._remove_slot(slot)
+
+    def _remove_door(self, door):
+        slots = self._door_index.get(door[0], [])
+        for slot in [s for s in slots if self._doors[s] == door]:
+            slots.remove(slot)
+            self._remove_slot(slot)
+        if not slots:
+            self._door_index.pop(door[0], None)
+
+    def _compact_doors(self):
+        """Drop the slots of removed doors, once they are the majority."""
+        if self._door_count * 2 >= len(self._doors):
+            return
+        flavours = list(self._door_weights)
+        self.unoccupied = self.unoccupied
+        for flavour_function in flavours:
+            self._weights(flavour_function)
+
+    def _weights(self, flavour_function):
+        if flavour_function not in self._door_weights:
+            self._door_weights[flavour_function] = WeightTree(
+                0 if d is None else flavour_function(*d[0]) for d in self._doors
+            )
+        return self._door_weights[flavour_function]
+
+    def _sample_slot(self, flavour_function):
+        """Slot of a door, chosen with weighted_choice's semantics."""
+        tree = self._weights(flavour_function)
+        slot = tree.search(random.uniform(0, tree.total()))
+        # A removed door has no weight, but can still be the first slot to
+        # reach r if r sits exactly on a boundary. weighted_choice would
+        # pick the next remaining door.
+        while slot < len(self._doors) and self._doors[slot] is None:
+            slot += 1
+        return slot
+
     def is_legal(self, position):
         """Is the position within the bounds of the map.
 
@@ -47,10 +183,13 @@ class UnusedPositionManager:
         :returns: Whether or not that position is legal to occuply.
         :rtype: boolean
         """
+        return self._is_legal(position.x, position.y, position.z)
+
+    def _is_legal(self, x, y, z):
         # TODO: dependent on world size.
-        return 0 <= position.x <= 32 and \
-            0 <= position.y <= 32 and \
-            0 <= position.z <= 32
+        return 0 <= x <= 32 and \
+            0 <= y <= 32 and \
+            0 <= z <= 32
 
     def _yield_mirrored(self, room):
         for orientation in self.mirror_rotations:
@@ -80,23 +219,20 @@ class UnusedPositionManager:
         :returns: Whether or not it is OK to register this room.
         :rtype: boolean
         """
-        new_rooms = self._yield_mirrored(room)
-        return self._preregister_room(new_rooms)
-
-    def _preregister_room(self, rooms):
-        # logging.info("Prereg: %s", '|'.join([x.__class__.__name__ for x in rooms]))
         added_occupied = set()
-        for room in rooms:
-            used = room.get_positions()
+        for (pos, orientation) in self._yield_mirrored_positions(room):
+            (positions, doorways) = room.template(orientation)
+            (x, y, z) = (pos.x, pos.y, pos.z)
+            used = [(x + dx, y + dy, z + dz) for (dx, dy, dz) in positions]
             # First, we need to check that ALL of those positions are
             # unoccupied.
             for position in used:
-                if position in self.occupied.keys() or position in added_occupied:
+                if position in self._occupied_cells or position in added_occupied:
                     return False
-            added_occupied = added_occupied.union(set(used))
+            added_occupied.update(used)
             # Don't add the room if the door is off the edge.
-            for door in room.get_doorways():
-                if not self.is_legal(door['offset']):
+            for (_, (dx, dy, dz)) in doorways:
+                if not self._is_legal(x + dx, y + dy, z + dz):
                     return False
         return True
 
@@ -130,8 +266,10 @@ class UnusedPositionManager:
         # Otherwise, all positions are fine to use.
 
         self.occupied.update({pos: room for pos in used})
+        self._occupied_cells.update((pos.x, pos.y, pos.z) for pos in used)
         # Remove occupied positions from possibilities
-        self.unoccupied = [(p, r, o) for (p, r, o) in self.unoccupied if p not in used]
+        for pos in used:
+            self._remove_doors_at(pos)
 
         # logging.info("  OCC: %s", list(map(str, self.occupied)))
         # logging.info("UNOCC: %s", list(map(str, self.unoccupied)))
@@ -144,7 +282,8 @@ class UnusedPositionManager:
             # If that door position is not occupied by something else
             if self.is_legal(position['offset']) and not position['offset'] in self.occupied.keys():
                 # and cache in our doorway list
-                self.unoccupied.append((position['offset'], room, position['orientation']))
+                self._add_door((position['offset'], room, position['orientation']))
+        self._compact_doors()
 
     def random_position(self):
         """Select a random doorway to use
@@ -153,7 +292,10 @@ class UnusedPositionManager:
         :rtype: tuple of (position, room, orientation), whatever the heck those are.
         """
         if len(self.occupied.keys()) > 0:
-            return random.choice(self.unoccupied)
+            # Same draw as random.choice(self.unoccupied), a count of doors
+            # is a WeightTree with all weights set to one.
+            tree = self._weights(self.nrp_flavour_plain)
+            return self._doors[tree.search(random.randrange(self._door_count) + 1)]
         else:
             raise Exception("No more space!")
 
@@ -217,13 +359,8 @@ class UnusedPositionManager:
         :param flavour_function: A function from this class (or a custom one)
         :type flavour_function: function
         """
-        choices = [
-            (idx, flavour_function(*posD[0]))
-            for idx, posD in enumerate(self.unoccupied)
-        ]
-        wc = self.weighted_choice(choices)
-        if len(self.unoccupied) > 0:
-            return self.unoccupied[wc]
+        if self._door_count > 0:
+            return self._doors[self._sample_slot(flavour_function)]
         else:
             raise Exception("No more space!")
 
@@ -288,6 +425,12 @@ class UnusedPositionManager:
         """
 
         # If we are here, we do have a position + orientation to place in
+        opposite = prev_room_orientation.rotate(180)
+        (x, y, z) = (
+            prev_room_door.x - prev_room_orientation.x,
+            prev_room_door.y - prev_room_orientation.y,
+            prev_room_door.z - prev_room_orientation.z,
+        )
         # Get the COMPLETE set of rooms, influenced by the prev_room
         for roomClass in self.random_room_stream(prev_room, possible_rooms):
             # We loop over a (random permutation) of the possible orientations in
@@ -295,26 +438,23 @@ class UnusedPositionManager:
             # not be necessary but it doesn't hurt anything.
             for orientation in random.sample(CARDINALS, 4):
                 kwargs = {'orientation': orientation}
-                # Initialize room, required to correctly calculate get_positions()/get_doorways()
-                r = roomClass(pos=CoarseVector(2, 2, 3), **kwargs)
                 # We've already picked a prev_room_door (and we know its orientation)
                 # Now we pick a door on the new room we'll place.
-                roomClass_doors = r.get_doorways()
+                (_, roomClass_doors) = roomClass.class_template(orientation)
                 # Find a door that is facing in the opposite direction as prev_room_orientation
-                options = [x for x in roomClass_doors if x['orientation'] == prev_room_orientation.rotate(180)]
+                options = [offset for (ori, offset) in roomClass_doors if ori == opposite]
                 # If we don't have any options, continue, let's try a different orientation.
                 if len(options) == 0:
                     continue
                 # If we do have doors though, choose a door on our new room that's
                 # in the correct orientation
-                for chosen_door in options:
-                    # Room offset
-                    room_offset = chosen_door['offset'] - prev_room_door + prev_room_orientation
+                for (dx, dy, dz) in options:
                     # Add our random options
                     kwargs.update(roomClass.randOpts(prev_room))
                     # Last, we yield all possible versions of this room (in case
-                    # some of them don't fit.)
-                    r = roomClass(pos=CoarseVector(2, 2, 3) - room_offset, **kwargs)
+                    # some of them don't fit.) The room is placed such that
+                    # its door sits just behind prev_room_door.
+                    r = roomClass(pos=CoarseVector(x - dx, y - dy, z - dz), **kwargs)
                     # If the room can be registered in this position, safely, ONLY
                     # then do we yield it.
                     if self.preregister_room(r):
@@ -324,63 +464,68 @@ class UnusedPositionManager:
         return TestRoom(pos, orientation=EAST)
 
     def _room_cap_real(self, prev_room_door, prev_room, prev_room_orientation, possible_endcaps=None):
+        opposite = prev_room_orientation.rotate(180)
+        (x, y, z) = (
+            prev_room_door.x - prev_room_orientation.x,
+            prev_room_door.y - prev_room_orientation.y,
+            prev_room_door.z - prev_room_orientation.z,
+        )
         # Pick a random room class
         for roomClass in random.sample(possible_endcaps, len(possible_endcaps)):
             # Test all the orientations
             for c in CARDINALS:
-                # 2,2,3 is not a special value, it could be anything.
-                r = roomClass(pos=CoarseVector(2, 2, 3), orientation=c)
+                (positions, roomClass_doors) = roomClass.class_template(c)
                 # There will only be one door.
-                roomClass_doors = r.get_doorways()
-                options = [x for x in roomClass_doors if x['orientation'] == prev_room_orientation.rotate(180)]
+                options = [offset for (ori, offset) in roomClass_doors if ori == opposite]
                 if len(options) == 0:
                     continue
-                chosen_door = options[0]
-                room_offset = chosen_door['offset'] - prev_room_door + prev_room_orientation
-                r = roomClass(pos=CoarseVector(2, 2, 3) - room_offset, orientation=c)
+                (dx, dy, dz) = options[0]
+                (px, py, pz) = (x - dx, y - dy, z - dz)
+                used = [(px + ox, py + oy, pz + oz) for (ox, oy, oz) in positions]
                 # Ensure all room positions are legal
-                if not all([self.is_legal(pos) for pos in r.get_positions()]):
+                if not all([self._is_legal(*pos) for pos in used]):
                     continue
 
                 # Ensure all room positions are not occupied
-                if not all([pos not in self.occupied.keys() for pos in r.get_positions()]):
+                if not all([pos not in self._occupied_cells for pos in used]):
                     continue
 
-                return r
+                return roomClass(pos=CoarseVector(px, py, pz), orientation=c)
 
-    def endcap(self, debug=False, possible_endcaps=[]):
+    def endcap(self, debug=False, possible_endcaps=[], progress=True):
         if debug:
-            for (pos, typ, ori) in tqdm(self.unoccupied):
+            for (pos, typ, ori) in tqdm(self.unoccupied, disable=not progress):
                 r = self._room_cap_debug(pos, typ, ori)
                 if r:
                     self._register_room(r)
         else:
-            for (pos, typ, ori) in tqdm(self.unoccupied):
+            for (pos, typ, ori) in tqdm(self.unoccupied, disable=not progress):
                 r = self._room_cap_real(pos, typ, ori, possible_endcaps=possible_endcaps)
                 if r:
                     self._register_room(r)
 
-    def place_rooms(self, debug, possible_rooms, rooms=10):
+    def place_rooms(self, debug, possible_rooms, rooms=10, progress=True):
         room_count = 0
         logging.info("Placing rooms")
-        with tqdm(total=rooms) as pbar:
+        with tqdm(total=rooms, disable=not progress) as pbar:
             while True:
                 # Continually try and place rooms until we hit 200.
                 if room_count >= rooms:
                     logging.info("Placed enough rooms")
                     break
 
-                if len(self.unoccupied) == 0:
+                if self._door_count == 0:
                     logging.info("Ran out of unoccupied positions")
                     break
 
                 # Pick a random position for this notional room to go
-                (prev_room_door, prev_room, prev_room_orientation) = self.nonrandom_position(self.nrp_flavour_vertical)
+                door = self.nonrandom_position(self.nrp_flavour_vertical)
+                (prev_room_door, prev_room, prev_room_orientation) = door
                 for r in self.room_localization(possible_rooms, prev_room_door, prev_room, prev_room_orientation):
                     self.register_room(r)
 
                     pbar.update(self.mirror)
-                    pbar.set_description('u:%d o:%d r:%d' % (len(self.unoccupied), len(self.occupied.keys()), len(self.rooms)))
+                    pbar.set_description('u:%d o:%d r:%d' % (self._door_count, len(self.occupied.keys()), len(self.rooms)))
                     # If we get here, we've placed successfully so bump count + render
                     room_count += self.mirror
                     # Also register a link for the graph type output.
@@ -392,8 +537,5 @@ class UnusedPositionManager:
                 else:
                     # There are NO rooms which fit here, so we need to remove
                     # this from our positions so we don't bother trying again.
-                    self.unoccupied = [
-                        (d, r, o) for (d, r, o) in self.unoccupied
-                        if (d, r, o) != (prev_room_door, prev_room, prev_room_orientation)
-                    ]
+                    self._remove_door(door)
                     logging.info("No rooms fit here, removing")
@@ -2,9 +2,15 @@ from math import sin, cos, pi, floor, atan2
 
 
 class BaseVector(object):
+    __slots__ = ('x', 'y', 'z')
 
     def __hash__(self):
-        return (0 << 31) + (floor(self.x) << 20) + (floor(self.y) << 10) + floor(self.z)
+        # Hash of the fine position, the same for FineVectors and equal
+        # CoarseVectors (which hash their fine position too). Packing into
+        # a tuple mixes all the bits, rather than shifting coordinates into
+        # fixed width fields, which made large and negative coordinates
+        # collide.
+        return hash((self.x, self.y, self.z))
 
     def __eq__(self, other):
         return isinstance(other, BaseVector) and \
@@ -158,9 +164,9 @@ class BaseVector(object):
 
 
 class FineVector(BaseVector):
+    __slots__ = ()
 
-    def __hash__(self):
-        return (1 << 31) + (floor(self.x) << 20) + (floor(self.y) << 10) + floor(self.z)
+    __hash__ = BaseVector.__hash__
 
     def __eq__(self, other):
         if isinstance(other, CoarseVector):
@@ -219,9 +225,11 @@ class FineVector(BaseVector):
 
 
 class CoarseVector(BaseVector):
+    __slots__ = ()
 
     def __hash__(self):
-        return (2 << 31) + (floor(self.x) << 20) + (floor(self.y) << 10) + floor(self.z)
+        # Equal to the FineVector of the same position
+        return hash((self.x * 8, self.y * 8, self.z * 8))
 
     def __eq__(self, other):
         if isinstance(other, CoarseVector):
@@ -291,3 +299,167 @@ class CoarseVector(BaseVector):
 
     def entity(self):
         return self.fine() * 4
+
+
+#: (cos, sin) of the rotation to each cardinal direction, by degrees
+_CARDINAL_ROTATIONS = {
+    0: (1, 0),
+    90: (0, 1),
+    180: (-1, 0),
+    270: (0, -1),
+}
+# (rotation, offset) -> translation for VoxelVector.offset_rotate
+_OFFSET_TRANSLATIONS = {}
+
+
+def _cardinal_rotation(deg):
+    """
+    (cos, sin) for a rotation given like to ``BaseVector.rotate``, which
+    must be a multiple of 90 degrees.
+    """
+    if isinstance(deg, int):
+        rotation = _CARDINAL_ROTATIONS.get(deg % 360, None)
+    elif deg.x == 0 and deg.y != 0:
+        rotation = (0, 1 if deg.y > 0 else -1)
+    elif deg.y == 0 and deg.x != 0:
+        rotation = (1 if deg.x > 0 else -1, 0)
+    else:
+        rotation = None
+
+    if rotation is None:
+        raise Exception("VoxelVectors can only be rotated by multiples of 90 degrees, not %s" % (deg, ))
+    return rotation
+
+
+class VoxelVector(tuple):
+    """
+    Integer position on the voxel (fine) grid, a cheaper alternative to
+    FineVector for the common case of whole voxel coordinates.
+
+    This is a plain ``(x, y, z)`` tuple underneath, so it hashes and
+    compares like one (and can be used as a ``VoxelWorld`` key directly).
+    It does not compare equal to FineVector or CoarseVector, convert with
+    ``fine()`` or ``from_vector`` first.
+
+    Adding or subtracting a FineVector or CoarseVector returns a FineVector.
+    """
+    __slots__ = ()
+
+    def __new__(cls, x, y, z):
+        return tuple.__new__(cls, (x, y, z))
+
+    def __getnewargs__(self):
+        # For copy and pickle
+        return tuple(self)
+
+    @classmethod
+    def from_vector(cls, vec):
+        """
+        Convert any vector (or ``(x, y, z)`` tuple of fine coordinates).
+
+        :returns: the VoxelVector, or None if ``vec`` is not on the integer grid.
+        :rtype: redeclipse.vector.VoxelVector
+        """
+        if type(vec) is cls:
+            return vec
+        if isinstance(vec, BaseVector):
+            vec = vec.fine()
+        (x, y, z) = vec
+        if x % 1 or y % 1 or z % 1:
+            return None
+        return cls(int(x), int(y), int(z))
+
+    @property
+    def x(self):
+        return self[0]
+
+    @property
+    def y(self):
+        return self[1]
+
+    @property
+    def z(self):
+        return self[2]
+
+    def __repr__(self):
+        return 'VV(%s, %s, %s)' % self
+
+    # Ordering against other vectors is the same as BaseVector's (which is
+    # also a tuple's)
+    def __lt__(self, other):
+        return tuple.__lt__(self, tuple(other))
+
+    def __le__(self, other):
+        return tuple.__le__(self, tuple(other))
+
+    def __gt__(self, other):
+        return tuple.__gt__(self, tuple(other))
+
+    def __ge__(self, other):
+        return tuple.__ge__(self, tuple(other))
+
+    def __add__(self, other):
+        if isinstance(other, BaseVector):
+            return self.fine() + other
+        (x, y, z) = self
+        (ox, oy, oz) = other
+        return VoxelVector(x + ox, y + oy, z + oz)
+
+    def __sub__(self, other):
+        if isinstance(other, BaseVector):
+            return self.fine() - other
+        (x, y, z) = self
+        (ox, oy, oz) = other
+        return VoxelVector(x - ox, y - oy, z - oz)
+
+    def __mul__(self, m):
+        (x, y, z) = self
+        return VoxelVector(x * m, y * m, z * m)
+
+    __rmul__ = __mul__
+
+    def __floordiv__(self, m):
+        (x, y, z) = self
+        return VoxelVector(x // m, y // m, z // m)
+
+    def fine(self):
+        return FineVector(self[0], self[1], self[2])
+
+    def coarse(self):
+        (x, y, z) = self
+        return CoarseVector(x // 8, y // 8, z // 8)
+
+    def entity(self):
+        return self.fine() * 4
+
+    def vox(self):
+        return self
+
+    def rotate(self, deg):
+        """
+        Same as ``BaseVector.rotate``, using integer arithmetic. Only
+        rotations by multiples of 90 degrees are supported.
+        """
+        (c, s) = _cardinal_rotation(deg)
+        (x, y, z) = self
+        return VoxelVector(c * x - s * y, s * x + c * y, z)
+
+    def offset_rotate(self, deg, offset=None):
+        """
+        Same as ``BaseVector.offset_rotate``. The offset may be any vector,
+        as long as the result stays on the integer grid (e.g. voxel or tile
+        centers such as ``TILE_VOX_OFF``).
+        """
+        (c, s) = _cardinal_rotation(deg)
+        key = (c, s, type(offset), offset.x, offset.y, offset.z)
+        translation = _OFFSET_TRANSLATIONS.get(key, None)
+        if translation is None:
+            # Where the origin ends up, computed the regular way once
+            translation = VoxelVector.from_vector(FineVector(0, 0, 0).offset_rotate(deg, offset=offset.fine()))
+            if translation is None:
+                raise Exception("Rotating around %s does not keep voxels on the integer grid" % (offset, ))
+            _OFFSET_TRANSLATIONS[key] = translation
+
+        (x, y, z) = self
+        (tx, ty, tz) = translation
+        return VoxelVector(c * x - s * y + tx, s * x + c * y + ty, z + tz)
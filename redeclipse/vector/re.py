@@ -2,6 +2,7 @@ class ivec2:
     """
     2D integer vector class
     """
+    __slots__ = ('x', 'y')
 
     def __init__(self, x, y):
         self.x = x
@@ -22,6 +23,7 @@ class ivec2:
 
 class vec2:
     """Float version of ivec2"""
+    __slots__ = ('x', 'y')
 
     def __init__(self, x, y):
         self.x = x
@@ -44,6 +46,7 @@ class vec3:
     """
     3D vector class
     """
+    __slots__ = ('x', 'y', 'z')
 
     def __init__(self, x, y, z):
         self.x = x
@@ -70,6 +73,7 @@ class ivec3:
     """
     3D integer vector class
     """
+    __slots__ = ('x', 'y', 'z')
 
     def __init__(self, x, y, z):
         self.x = x
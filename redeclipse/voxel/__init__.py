@@ -4,11 +4,136 @@ We can't work with octrees. Just... no.
 So we work in a voxel world, and then convert this to an octree with the small
 resolution cube that makes sense, and then let RE optimise the map when need be.
 """
-from redeclipse.objects import cube
-from redeclipse.enums import OCT
+from collections.abc import Mapping
+from itertools import product
+from operator import itemgetter
+
+import numpy
+
+from redeclipse.objects import cube, SolidCube
+from redeclipse.enums import OCT, Faces, TextNum
+from redeclipse.octree import extent
+from redeclipse.sharing import _leaf_key, copy_root, share, share_world, SharedCube
 import logging
 log = logging.getLogger(__name__)
 
+# Extent (see redeclipse.octree.extent) of a cube filled with geometry
+_FULL_EXTENT = ((0, 8), (0, 8), (0, 8))
+
+
+def _spread_bits(v):
+    # Insert two zero bits between each bit of an 8 bit value
+    r = 0
+    for i in range(8):
+        r |= ((v >> i) & 1) << (3 * i)
+    return r
+
+
+_SPREAD = [_spread_bits(v) for v in range(256)]
+
+
+def morton_code(x, y, z):
+    """
+    Interleave the bits of a (non-negative, integer) point into a morton
+    code, x in the lowest bit. The lowest three bits of the code are then
+    exactly the index of the point within its parent octant, in the
+    order used by ``cube.children``.
+    """
+    code = 0
+    shift = 0
+    while x or y or z:
+        code |= (_SPREAD[x & 0xFF] | (_SPREAD[y & 0xFF] << 1) | (_SPREAD[z & 0xFF] << 2)) << shift
+        x >>= 8
+        y >>= 8
+        z >>= 8
+        shift += 24
+    return code
+
+
+def _spread_bits_array(v):
+    """
+    Vectorised ``_spread_bits`` for arrays of up to 21 bit coordinates
+    """
+    v = numpy.asarray(v, dtype=numpy.uint64) & numpy.uint64(0x1FFFFF)
+    for (shift, mask) in ((32, 0x1F00000000FFFF), (16, 0x1F0000FF0000FF),
+                          (8, 0x100F00F00F00F00F), (4, 0x10C30C30C30C30C3),
+                          (2, 0x1249249249249249)):
+        v = (v | (v << numpy.uint64(shift))) & numpy.uint64(mask)
+    return v
+
+
+def _uniform_key(c):
+    """
+    Everything that distinguishes a solid childless cube, or None if it is
+    not one.
+    """
+    if not isinstance(c, cube) or c.children:
+        return None
+    if any(f != Faces.F_SOLID for f in c.faces) or any(e != 128 for e in c.edges):
+        return None
+    surfaces = None
+    if c.ext:
+        surfaces = tuple(
+            None if x is None else (tuple(x.lmid), x.verts, x.numverts)
+            for x in c.ext.surfaces
+        )
+    return (
+        tuple(t.value if isinstance(t, TextNum) else t for t in c.texture),
+        c.material, c.merged, c.octsav, c.surfmask, c.totalverts, surfaces
+    )
+
+
+def _share(value):
+    # Only cubes are interned, anything else is told apart by its identity
+    return share(value) if isinstance(value, cube) else value
+
+
+def _first_solid(children):
+    """
+    The first leaf cube with geometry below ``children``, or None
+    """
+    stack = [iter(children)]
+    while stack:
+        for c in stack[-1]:
+            if c.children:
+                stack.append(iter(c.children))
+                break
+            if extent(c) is not None:
+                return c
+        else:
+            stack.pop()
+    return None
+
+
+def _worldroot(children):
+    """
+    Fill in the empty entries of the worldroot. Callers regularly modify
+    the worldroot entries, so shared cubes are replaced by a copy.
+    """
+    return [cube.newcube() if x is None else copy_root(x) for x in children]
+
+
+def _merge_octant(children, collapse=False, shared=False):
+    """
+    Build the parent of eight octree nodes (None for empty).
+
+    :param bool shared: intern the parent, see ``redeclipse.sharing``
+    """
+    if collapse:
+        first = children[0]
+        if type(first) is SolidCube and all(x is first for x in children):
+            return first
+        key = _uniform_key(first)
+        if key is not None and all(_uniform_key(x) == key for x in children[1:]):
+            return children[0]
+
+    if shared:
+        return SharedCube.get(children)
+    c = cube.newcube()
+    c.children = [cube.newcube() if x is None else x for x in children]
+    c.octsav = OCT.OCTSAV_CHILDREN.value
+    return c
+
 
 class VoxelWorld:
 
@@ -65,13 +190,234 @@ class VoxelWorld:
         else:
             return None
 
+    def fill_box(self, lower, upper, data):
+        """
+        Set every point in the box ``lower <= (x, y, z) < upper`` to ``data``.
+
+        :param lower: lower corner (inclusive)
+        :type lower: tuple(int, int, int)
+
+        :param upper: upper corner (exclusive)
+        :type upper: tuple(int, int, int)
+
+        :param data: value to store, shared by every point in the box.
+        """
+        ranges = [range(lo, hi) for (lo, hi) in zip(lower, upper)]
+        if not all(ranges):
+            return
+        self.world.update(dict.fromkeys(product(*ranges), data))
+        self._update_boundaries(*lower)
+        self._update_boundaries(*(hi - 1 for hi in upper))
+
+    def del_box(self, lower, upper):
+        """
+        Delete every point in the box ``lower <= (x, y, z) < upper``
+        """
+        for x in range(lower[0], upper[0]):
+            for y in range(lower[1], upper[1]):
+                for z in range(lower[2], upper[2]):
+                    self.del_point(x, y, z)
+
+    def set_mask(self, mask, data, overwrite=True):
+        """
+        Set every point where ``mask`` is true to ``data``. The mask starts
+        at the origin, but need not have the same shape as the world.
+
+        :param mask: boolean array indexed as ``mask[x, y, z]``
+        :type mask: numpy.ndarray
+
+        :param data: value to store, shared by every selected point.
+
+        :param bool overwrite: If false, points which already hold a value
+                               are left alone.
+        """
+        points = numpy.nonzero(mask)
+        keys = list(zip(*(p.tolist() for p in points)))
+        if not overwrite:
+            world = self.world
+            keep = numpy.fromiter((not world.get(key, None) for key in keys), dtype=bool, count=len(keys))
+            keys = [key for (key, k) in zip(keys, keep) if k]
+            points = [p[keep] for p in points]
+        if not keys:
+            return
+        self.world.update(dict.fromkeys(keys, data))
+        self._update_boundaries(*(int(p.min()) for p in points))
+        self._update_boundaries(*(int(p.max()) for p in points))
+
+    def del_mask(self, mask):
+        """
+        Delete every point where ``mask`` is true.
+
+        :param mask: boolean array indexed as ``mask[x, y, z]``
+        :type mask: numpy.ndarray
+        """
+        world = self.world
+        for key in zip(*(p.tolist() for p in numpy.nonzero(mask))):
+            world.pop(key, None)
+
+    def _region_empty(self, x_bounds, y_bounds, z_bounds):
+        """
+        Cheap test for whether a region is known to be empty, used to skip
+        recursing into it when building the octree. The dict backend has no
+        cheap way of answering this, so never skips.
+        """
+        return False
+
+    @classmethod
+    def from_octree(cls, world, worldsize, size=2**7):
+        """
+        Import an octree, e.g. that of a parsed map, to edit it::
+
+            v = VoxelWorld.from_octree(mymap.world, mymap.meta['worldsize'], size=2**8)
+
+        Every voxel covers ``worldsize / size`` world units. Cubes larger
+        than a voxel are filled in as a box, cubes of exactly the size of a
+        voxel are stored as is (a DenseVoxelWorld may return an equal cube
+        instead, see its palette). A voxel covering smaller cubes is set if any
+        of them has geometry, to the first of those. Deformed cubes which
+        do not become a single voxel are filled in as the box bounding
+        their geometry, with solid cubes of the same textures.
+
+        Maps with large solid areas (e.g. a floor filling half of the world)
+        are best imported into a DenseVoxelWorld, a VoxelWorld keeps every
+        voxel in a dict.
+
+        :param world: the eight top level cubes, e.g. ``Map.world``
+        :type world: list(redeclipse.objects.cube)
+        :param int worldsize: edge length of the whole octree, e.g. ``Map.meta['worldsize']``
+        :param int size: size of the voxel world, a power of two
+
+        :rtype: VoxelWorld
+        """
+        if size & (size - 1) or worldsize & (worldsize - 1) or size < 2:
+            raise Exception("World sizes must be powers of two")
+        v = cls(size=size)
+        # Cells are tracked in voxels, scaled up to keep cells smaller than
+        # a voxel integer.
+        scale = max(worldsize // size, 1)
+        unit = max(size // worldsize, 1)
+        stack = [(world, 0, 0, 0, (worldsize >> 1) * unit)]
+        # Voxel sized cells, stored in one go at the end
+        (points, values) = ([], [])
+        while stack:
+            (children, ox, oy, oz, cell) = stack.pop()
+            for (i, c) in enumerate(children):
+                (x, y, z) = (ox + (i & 1) * cell, oy + (i >> 1 & 1) * cell, oz + (i >> 2) * cell)
+                if cell > scale:
+                    if c.children:
+                        stack.append((c.children, x, y, z, cell >> 1))
+                    else:
+                        v._import_box(c, (x, y, z), cell, scale)
+                elif cell == scale:
+                    leaf = c if not c.children else _first_solid(c.children)
+                    if leaf is None or extent(leaf) is None:
+                        continue
+                    if leaf is not c and extent(leaf) != _FULL_EXTENT:
+                        leaf = cube.solid(tex=leaf.texture)
+                    points.append((x // scale, y // scale, z // scale))
+                    values.append(leaf)
+        v._set_points(points, values)
+        return v
+
+    def _set_points(self, points, values):
+        """
+        Set many points at once, ``set_point`` for every (point, value)
+        pair
+        """
+        if not points:
+            return
+        self.world.update(zip(points, values))
+        self._update_boundaries(*(min(p[axis] for p in points) for axis in range(3)))
+        self._update_boundaries(*(max(p[axis] for p in points) for axis in range(3)))
+
+    def _import_box(self, c, corner, cell, scale):
+        """
+        Fill in the voxels covered by a leaf cube larger than a voxel
+        """
+        eighths = extent(c)
+        if eighths is None:
+            return
+        if eighths != _FULL_EXTENT:
+            c = cube.solid(tex=c.texture)
+        # Round outwards, to the voxels the geometry touches
+        lower = [(8 * o + lo * cell) // (8 * scale) for (o, (lo, hi)) in zip(corner, eighths)]
+        upper = [-(-(8 * o + hi * cell) // (8 * scale)) for (o, (lo, hi)) in zip(corner, eighths)]
+        self.fill_box(lower, upper, c)
+
     def to_magicavoxel(self, path):
         import redeclipse.magicavoxel.writer
         from redeclipse.prefabs import TEXMAN
         with open(path, 'wb') as handle:
             redeclipse.magicavoxel.writer.to_magicavoxel(self, handle, TEXMAN)
 
-    def to_octree(self, x_bounds=None, y_bounds=None, z_bounds=None, layers=False):
+    def _leaves(self):
+        """
+        All occupied points which fall inside of the octree, as a list of
+        ``(morton code, value)`` sorted by morton code.
+        """
+        leaves = []
+        for ((x, y, z), value) in self.world.items():
+            if value is None:
+                continue
+            ix, iy, iz = int(x), int(y), int(z)
+            if ix != x or iy != y or iz != z:
+                continue
+            if 0 <= ix < self.size and 0 <= iy < self.size and 0 <= iz < self.size:
+                leaves.append((morton_code(ix, iy, iz), value))
+        leaves.sort(key=itemgetter(0))
+        return leaves
+
+    def to_octree(self, collapse=False, share=False):
+        """
+        Convert the world into an octree (the ``worldroot`` list of 8 cubes
+        expected by ``redeclipse.Map``).
+
+        The tree is built bottom-up from the occupied points only: they are
+        sorted by morton code, and then every level merges runs of siblings
+        sharing a parent code. Empty space is never visited. This produces
+        the same tree as ``to_octree_recursive``.
+
+        :param bool collapse: Replace any octant made of eight identical solid
+                              cubes by a single (larger) cube. This changes
+                              the output and is thus off by default.
+        :param bool share: Build every distinct subtree only once, see
+                           ``redeclipse.sharing``. The map written is the
+                           same.
+        """
+        depth = self.size.bit_length() - 1
+        if self.size != 1 << depth or depth < 1:
+            # Only power-of-two worlds can be addressed by morton code.
+            tree = self.to_octree_recursive()
+            return share_world(tree) if share else tree
+
+        nodes = self._leaves()
+        if share:
+            nodes = [(code, _share(value)) for (code, value) in nodes]
+        for level in range(depth - 1):
+            parents = []
+            i = 0
+            count = len(nodes)
+            while i < count:
+                parent_code = nodes[i][0] >> 3
+                children = [None] * 8
+                while i < count and nodes[i][0] >> 3 == parent_code:
+                    children[nodes[i][0] & 7] = nodes[i][1]
+                    i += 1
+                parents.append((parent_code, _merge_octant(children, collapse, share)))
+            nodes = parents
+
+        # Worldroot is an array not a cube
+        root = [None] * 8
+        for (code, node) in nodes:
+            root[code] = node
+        return _worldroot(root)
+
+    def to_octree_recursive(self, x_bounds=None, y_bounds=None, z_bounds=None, layers=False):
+        """
+        Top-down octree construction which visits every node of the tree
+        (so is O(size^3) irrespective of how full the world is). This is
+        kept as the reference implementation of ``to_octree``.
+        """
         if x_bounds is None:
             x_bounds = (
                 0, self.size
@@ -89,44 +435,48 @@ class VoxelWorld:
         if x_bounds[1] - x_bounds[0] == 1:
             return self.get_point(x_bounds[0], y_bounds[0], z_bounds[0])
 
+        # Skip over empty space, the root must always be populated though.
+        if x_bounds[1] - x_bounds[0] != self.size and self._region_empty(x_bounds, y_bounds, z_bounds):
+            return None
+
         # Otherwise, split into 8 smaller cubes
         current_level_cubes = [
-            self.to_octree(
+            self.to_octree_recursive(
                 (x_bounds[0], (sum(x_bounds) // 2)),
                 (y_bounds[0], (sum(y_bounds) // 2)),
                 (z_bounds[0], (sum(z_bounds) // 2))
             ),
-            self.to_octree(
+            self.to_octree_recursive(
                 ((sum(x_bounds) // 2), x_bounds[1]),
                 (y_bounds[0], (sum(y_bounds) // 2)),
                 (z_bounds[0], (sum(z_bounds) // 2))
             ),
-            self.to_octree(
+            self.to_octree_recursive(
                 (x_bounds[0], (sum(x_bounds) // 2)),
                 ((sum(y_bounds) // 2), y_bounds[1]),
                 (z_bounds[0], (sum(z_bounds) // 2))
             ),
-            self.to_octree(
+            self.to_octree_recursive(
                 ((sum(x_bounds) // 2), x_bounds[1]),
                 ((sum(y_bounds) // 2), y_bounds[1]),
                 (z_bounds[0], (sum(z_bounds) // 2))
             ),
-            self.to_octree(
+            self.to_octree_recursive(
                 (x_bounds[0], (sum(x_bounds) // 2)),
                 (y_bounds[0], (sum(y_bounds) // 2)),
                 ((sum(z_bounds) // 2), z_bounds[1])
             ),
-            self.to_octree(
+            self.to_octree_recursive(
                 ((sum(x_bounds) // 2), x_bounds[1]),
                 (y_bounds[0], (sum(y_bounds) // 2)),
                 ((sum(z_bounds) // 2), z_bounds[1])
             ),
-            self.to_octree(
+            self.to_octree_recursive(
                 (x_bounds[0], (sum(x_bounds) // 2)),
                 ((sum(y_bounds) // 2), y_bounds[1]),
                 ((sum(z_bounds) // 2), z_bounds[1])
             ),
-            self.to_octree(
+            self.to_octree_recursive(
                 ((sum(x_bounds) // 2), x_bounds[1]),
                 ((sum(y_bounds) // 2), y_bounds[1]),
                 ((sum(z_bounds) // 2), z_bounds[1])
@@ -136,7 +486,7 @@ class VoxelWorld:
 
         # Worldroot is an array not a cube
         if x_bounds[0] == 0 and x_bounds[1] == self.size:
-            return [cube.newcube() if x is None else x for x in current_level_cubes]
+            return _worldroot(current_level_cubes)
         elif all([x is None for x in current_level_cubes]):
             # If they're all empty, return
             return None
@@ -146,3 +496,240 @@ class VoxelWorld:
             c.children = [cube.newcube() if x is None else x for x in current_level_cubes]
             c.octsav = OCT.OCTSAV_CHILDREN.value
             return c
+
+
+class DenseVoxelWorld(VoxelWorld):
+    """
+    A VoxelWorld backed by dense numpy grids instead of a dict of cubes.
+
+    Every voxel holds a uint16 index into a shared palette, alongside an
+    occupancy grid. Solid textured cubes (``cube.solid``, or any cube
+    equivalent to one such as those built by ``cube.newtexcube``) are
+    stored as their six-face texture tuple, and read back as the shared
+    ``cube.solid`` instance, so no cube objects are created per voxel.
+    Other leaf cubes (e.g. deformed ones) are stored by everything which
+    is written to the map for them, and read back as the first such cube
+    stored. Cubes with children and unhashable values are stored by
+    identity, any other value by equality.
+
+    Points outside of ``[0, size)`` are silently dropped, they could never
+    be part of the octree anyway.
+    """
+
+    def __init__(self, size=2**7):
+        super().__init__(size=size)
+        self.occupied = numpy.zeros((size, size, size), dtype=bool)
+        self.voxels = numpy.zeros((size, size, size), dtype=numpy.uint16)
+        self.palette = []
+        self._palette_index = {}
+        self.world = DenseWorldView(self)
+
+    def palette_id(self, data):
+        """
+        Get (or allocate) the palette index used to store ``data``
+        """
+        if type(data) is SolidCube:
+            key = entry = (cube, data.texture)
+        elif isinstance(data, cube) and not data.children:
+            # Leaves are stored by everything written to the map, the first
+            # one stored is read back for every equal cube.
+            leaf = _leaf_key(data)
+            idx = self._palette_index.get(leaf, None)
+            if idx is None:
+                solid = SolidCube.get(data.texture)
+                if leaf == _leaf_key(solid):
+                    idx = self._allocate((cube, solid.texture), (cube, solid.texture))
+                else:
+                    idx = self._allocate(leaf, (id, data))
+                self._palette_index[leaf] = idx
+            return idx
+        elif isinstance(data, cube):
+            key = (id, id(data))
+            entry = (id, data)
+        else:
+            try:
+                hash(data)
+                key = entry = (type(data), data)
+            except TypeError:
+                key = (id, id(data))
+                entry = (id, data)
+        return self._allocate(key, entry)
+
+    def _allocate(self, key, entry):
+        idx = self._palette_index.get(key, None)
+        if idx is None:
+            idx = len(self.palette)
+            if idx > 0xFFFF:
+                raise Exception("Palette is full")
+            # Values stored by identity stay alive in the palette, so their
+            # id can not be reused.
+            self.palette.append(entry)
+            self._palette_index[key] = idx
+        return idx
+
+    def palette_value(self, idx):
+        """
+        Inverse of ``palette_id``, textured cubes come back as the shared
+        ``cube.solid`` instance.
+        """
+        (kind, value) = self.palette[idx]
+        if kind is cube:
+            return SolidCube.get(value)
+        return value
+
+    def _index(self, x, y, z):
+        ix, iy, iz = int(x), int(y), int(z)
+        if ix != x or iy != y or iz != z:
+            return None
+        if 0 <= ix < self.size and 0 <= iy < self.size and 0 <= iz < self.size:
+            return (ix, iy, iz)
+        return None
+
+    def set_point(self, x, y, z, data):
+        idx = self._index(x, y, z)
+        if idx is None:
+            log.debug("set_point (%s, %s, %s) outside of world, dropped", x, y, z)
+            return
+        self._update_boundaries(x, y, z)
+        self.occupied[idx] = True
+        self.voxels[idx] = self.palette_id(data)
+
+    def set_pointv(self, xyz, data):
+        self.set_point(xyz.x, xyz.y, xyz.z, data)
+
+    def _set_points(self, points, values):
+        if not points:
+            return
+        # Most points share a few cube objects, look up the palette index of
+        # every distinct object once.
+        ids = {}
+        palette = []
+        for value in values:
+            idx = ids.get(id(value), None)
+            if idx is None:
+                idx = ids[id(value)] = self.palette_id(value)
+            palette.append(idx)
+        idx = tuple(numpy.array(points, dtype=numpy.intp).T)
+        self.occupied[idx] = True
+        self.voxels[idx] = numpy.array(palette, dtype=numpy.uint16)
+        self._update_boundaries(*(int(a.min()) for a in idx))
+        self._update_boundaries(*(int(a.max()) for a in idx))
+
+    def del_point(self, x, y, z):
+        idx = self._index(x, y, z)
+        if idx is not None:
+            self.occupied[idx] = False
+
+    def del_pointv(self, xyz):
+        (x, y, z) = xyz
+        self.del_point(x, y, z)
+
+    def get_point(self, x, y, z):
+        idx = self._index(x, y, z)
+        if idx is None or not self.occupied[idx]:
+            return None
+        return self.palette_value(self.voxels[idx])
+
+    def _clip_box(self, lower, upper):
+        lo = [max(0, int(v)) for v in lower]
+        hi = [min(self.size, int(v)) for v in upper]
+        if any(a >= b for (a, b) in zip(lo, hi)):
+            return None
+        return tuple(slice(a, b) for (a, b) in zip(lo, hi))
+
+    def fill_box(self, lower, upper, data):
+        box = self._clip_box(lower, upper)
+        if box is None:
+            return
+        self.occupied[box] = True
+        self.voxels[box] = self.palette_id(data)
+        self._update_boundaries(box[0].start, box[1].start, box[2].start)
+        self._update_boundaries(box[0].stop - 1, box[1].stop - 1, box[2].stop - 1)
+
+    def del_box(self, lower, upper):
+        box = self._clip_box(lower, upper)
+        if box is not None:
+            self.occupied[box] = False
+
+    def _mask_region(self, mask):
+        """
+        The part of a mask (starting at the origin) which falls inside of
+        the world, and the slices selecting that part of the world.
+        """
+        mask = numpy.asarray(mask, dtype=bool)
+        region = tuple(slice(0, min(n, self.size)) for n in mask.shape)
+        return (mask[region], region)
+
+    def set_mask(self, mask, data, overwrite=True):
+        (mask, region) = self._mask_region(mask)
+        if not overwrite:
+            mask = mask & ~self.occupied[region]
+        if not mask.any():
+            return
+        self.occupied[region] |= mask
+        self.voxels[region][mask] = self.palette_id(data)
+
+        # Extents of the mask along each axis
+        (xs, ys, zs) = [
+            numpy.nonzero(mask.any(axis=axes))[0]
+            for axes in ((1, 2), (0, 2), (0, 1))
+        ]
+        self._update_boundaries(int(xs[0]), int(ys[0]), int(zs[0]))
+        self._update_boundaries(int(xs[-1]), int(ys[-1]), int(zs[-1]))
+
+    def del_mask(self, mask):
+        (mask, region) = self._mask_region(mask)
+        self.occupied[region] &= ~mask
+
+    def _leaves(self):
+        points = numpy.nonzero(self.occupied)
+        codes = numpy.zeros(len(points[0]), dtype=numpy.uint64)
+        for (axis, coords) in enumerate(points):
+            codes |= _spread_bits_array(coords) << numpy.uint64(axis)
+        order = numpy.argsort(codes, kind='stable')
+        values = self.voxels[points][order]
+        palette_value = self.palette_value
+        return [
+            (code, palette_value(idx))
+            for (code, idx) in zip(codes[order].tolist(), values.tolist())
+        ]
+
+    def _region_empty(self, x_bounds, y_bounds, z_bounds):
+        return not self.occupied[
+            x_bounds[0]:x_bounds[1],
+            y_bounds[0]:y_bounds[1],
+            z_bounds[0]:z_bounds[1]
+        ].any()
+
+
+class DenseWorldView(Mapping):
+    """
+    Read-only dict-like view of a DenseVoxelWorld, keyed by ``(x, y, z)``,
+    so code written against ``VoxelWorld.world`` keeps working.
+    """
+
+    def __init__(self, voxel_world):
+        self._vw = voxel_world
+
+    def __getitem__(self, key):
+        value = self._vw.get_point(*key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        idx = self._vw._index(*key)
+        return idx is not None and bool(self._vw.occupied[idx])
+
+    def __iter__(self):
+        for (x, y, z) in zip(*numpy.nonzero(self._vw.occupied)):
+            yield (int(x), int(y), int(z))
+
+    def __len__(self):
+        return int(numpy.count_nonzero(self._vw.occupied))
+
+    def items(self):
+        vw = self._vw
+        points = numpy.nonzero(vw.occupied)
+        for (x, y, z, idx) in zip(*points, vw.voxels[points]):
+            yield ((int(x), int(y), int(z)), vw.palette_value(idx))
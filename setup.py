@@ -17,7 +17,8 @@ REQUIRES = [
     'noise',
     'tqdm',
     'bresenham',
-    'kaitaistruct'
+    'kaitaistruct',
+    'numpy',
 ]
 
 setup(
@@ -42,6 +43,7 @@ setup(
                 'redeclipse_voxel_2 = redeclipse.cli.voxel_2:main',
                 'redeclipse_voxel_3 = redeclipse.cli.voxel_3:main',
                 'redeclipse_snow_forest = redeclipse.cli.snow_forest:main',
+                'redeclipse_batch = redeclipse.cli.batch:main',
             ]
         },
     classifiers=[
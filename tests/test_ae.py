@@ -1,5 +1,7 @@
+import numpy
+
 from redeclipse import aftereffects as ae
-from redeclipse.voxel import VoxelWorld
+from redeclipse.voxel import VoxelWorld, DenseVoxelWorld
 from redeclipse.upm import UnusedPositionManager
 from redeclipse.vector import FineVector
 
@@ -89,3 +91,22 @@ def test_endcap():
     ae.endcap(v, upm)
 
     assert (0, 0, 0) not in v.world.keys()
+
+
+def test_gradient_arrays():
+    z = numpy.arange(0, 1024, 7)
+    for func in (ae.vertical_gradient, ae.gradient3, ae.vertical_gradient2, ae.vertical_gradient2inv):
+        values = func(0, 0, z)
+        assert values.shape == z.shape
+        assert numpy.allclose(values, [func(0, 0, int(i)) for i in z])
+
+
+def test_decay_seeded():
+    worlds = []
+    for world_class in (VoxelWorld, VoxelWorld, DenseVoxelWorld):
+        v = world_class(size=16)
+        v.fill_box((0, 0, 0), (16, 16, 16), True)
+        ae.decay(v, ae.vertical_gradient2inv, seed=4)
+        worlds.append(sorted(v.world.keys()))
+    assert worlds[0] == worlds[1] == worlds[2]
+    assert 0 < len(worlds[0]) < 16 ** 3
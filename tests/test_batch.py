@@ -0,0 +1,45 @@
+import argparse
+import io
+
+import pytest
+
+from redeclipse.cli import batch
+
+
+def test_seed_range():
+    assert batch.seed_range('4') == [4]
+    assert batch.seed_range('1:3') == [1, 2, 3]
+    with pytest.raises(argparse.ArgumentTypeError):
+        batch.seed_range('3:1')
+    with pytest.raises(argparse.ArgumentTypeError):
+        batch.seed_range('a:b')
+
+
+def test_build_jobs():
+    jobs = batch.build_jobs([1, 2], [10], [2, 4], [False], [None, ['maliwan']])
+    assert len(jobs) == 8
+    assert jobs[0] == {'seed': 1, 'rooms': 10, 'mirror': 2, 'ctf': False, 'flavor': None}
+    assert [batch.job_name(j) for j in jobs[:2]] == ['map_s1_r10_m2', 'map_s1_r10_m2_maliwan']
+    assert len(set(batch.job_name(j) for j in jobs)) == 8
+
+
+def test_run(tmpdir, monkeypatch):
+    from redeclipse import prefabs
+
+    copied = []
+    monkeypatch.setattr(type(prefabs.TEXMAN), 'copy_data', lambda self: copied.append(list(self.atlas.values())))
+    jobs = batch.build_jobs([1], [4], [2], [False], [None])
+    rows = batch.run('tests/files/empty.mpz', jobs, str(tmpdir), formats=['mpz', 'graph'], processes=1)
+    assert [row['error'] for row in rows] == [None]
+    assert rows[0]['mpz'] > 0
+    assert tmpdir.join('map_s1_r4_m2.mpz').check()
+    assert tmpdir.join('map_s1_r4_m2.cfg').check()
+    assert not tmpdir.join('map_s1_r4_m2.vox').check()
+    # Texture data is copied once, for every texture the maps use
+    assert len(copied) == 1
+    assert ''.join(tex.conf(idx=idx) for (idx, tex) in enumerate(copied[0])) in tmpdir.join('map_s1_r4_m2.cfg').read()
+
+    out = io.StringIO()
+    batch.summary(rows, ['mpz', 'graph'], handle=out)
+    assert out.getvalue().splitlines()[0].split() == ['name', 'generate', 'output', 'voxels', 'ents', 'mpz', 'graph']
+    assert '1 jobs, 0 failed' in out.getvalue()
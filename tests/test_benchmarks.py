@@ -0,0 +1,51 @@
+import argparse
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import suite  # noqa: E402
+
+
+def _report(**times):
+    return {'results': {
+        name: {'best': best, 'median': median, 'times': [best, median]}
+        for (name, (best, median)) in times.items()
+    }}
+
+
+BASELINE = _report(same=(1.0, 1.2), slower=(1.0, 1.0), faster=(2.0, 2.0), gone=(1.0, 1.0))
+CURRENT = _report(same=(1.05, 1.5), slower=(1.5, 1.05), faster=(1.0, 1.0), added=(1.0, 1.0))
+
+
+def test_compare():
+    (rows, slower) = suite.compare(BASELINE, CURRENT, 0.1)
+    assert rows == [('faster', 2.0, 1.0, 0.5), ('same', 1.0, 1.05, 1.05), ('slower', 1.0, 1.5, 1.5)]
+    assert slower == ['slower']
+
+    # Medians instead
+    (rows, slower) = suite.compare(BASELINE, CURRENT, 0.1, stat='median')
+    assert slower == ['same']
+    assert suite.compare(BASELINE, CURRENT, 0.6)[1] == []
+
+
+def test_cmd_compare(tmpdir, capsys):
+    paths = []
+    for (name, report) in (('baseline', BASELINE), ('current', CURRENT)):
+        paths.append(str(tmpdir.join(name + '.json')))
+        with open(paths[-1], 'w') as handle:
+            json.dump(report, handle)
+    args = argparse.Namespace(baseline=paths[0], current=paths[1], threshold=0.1, stat='best')
+    with pytest.raises(SystemExit) as excinfo:
+        suite.cmd_compare(args)
+    assert excinfo.value.code == 1
+    out = capsys.readouterr().out
+    assert 'SLOWER' in out and 'faster' in out
+    assert 'gone' in out and 'missing from' in out
+    assert 'added' in out and 'new, not in' in out
+
+    # No regressions
+    args.threshold = 0.6
+    suite.cmd_compare(args)
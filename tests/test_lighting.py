@@ -0,0 +1,78 @@
+import colorsys
+
+import noise
+
+from redeclipse.entities import Light, Sunlight
+from redeclipse.lighting import PositionBasedLightManager, merge_lights
+from redeclipse.vector import FineVector
+
+
+class FakeMap:
+    def __init__(self):
+        self.ents = []
+
+
+def _hue(pos, brightness, saturation):
+    # The original, one light at a time, implementation
+    nums = [x * (2 ** -8.4) for x in pos]
+    (red, grn, blu) = [int(abs(noise.pnoise3(*nums, base=base)) * 255) for base in (10, 0, 43)]
+    hue = colorsys.rgb_to_hsv(red, grn, blu)[0]
+    return tuple(int(c) for c in colorsys.hsv_to_rgb(hue, saturation, int(255 * min(brightness, 1.0))))
+
+
+def test_hues():
+    positions = [(x * 37 % 512, y * 53 % 512, z * 8) for x in range(12) for y in range(12) for z in range(4)]
+    for (brightness, saturation) in ((1.0, 0.6), (0.3, 0.6), (1.0, 0.0)):
+        lightman = PositionBasedLightManager(brightness=brightness, saturation=saturation, world_size=2**8)
+        assert lightman.hues(positions) == [_hue(pos, brightness, saturation) for pos in positions]
+
+
+def test_batch():
+    positions = [FineVector(x, y, 1) for x in range(0, 40, 4) for y in range(0, 40, 8)]
+    maps = (FakeMap(), FakeMap())
+
+    lightman = PositionBasedLightManager(brightness=1.0, saturation=0.6, world_size=2**8)
+    for pos in positions:
+        lightman.light(maps[0], pos)
+    lightman.light(maps[0], positions[0], colour_override=(1, 2, 3))
+
+    lightman = PositionBasedLightManager(brightness=1.0, saturation=0.6, world_size=2**8)
+    with lightman.batch():
+        with lightman.batch():
+            for pos in positions:
+                lightman.light(maps[1], pos)
+        assert maps[1].ents[0].attrs[1:4] == [0, 0, 0]
+        lightman.light(maps[1], positions[0], colour_override=(1, 2, 3))
+
+    assert [e.to_dict() for e in maps[0].ents] == [e.to_dict() for e in maps[1].ents]
+    assert maps[1].ents[-1].attrs[1:4] == [1, 2, 3]
+    assert len(set(tuple(e.attrs[1:4]) for e in maps[1].ents)) > 1
+
+
+def _light(x, y, z, radius=64, colour=(255, 255, 255), links=None):
+    return Light(xyz=FineVector(x, y, z), radius=radius, red=colour[0], green=colour[1], blue=colour[2], links=links)
+
+
+def test_merge_lights():
+    ents = [
+        _light(0, 0, 0, colour=(200, 0, 0)),
+        Sunlight(),
+        # 8 world units away from the first
+        _light(2, 0, 0, colour=(0, 100, 0)),
+        # Too far
+        _light(20, 0, 0),
+        # Linked lights are kept
+        _light(0, 0, 0, links=[1]),
+        _light(20, 2, 0, radius=32, colour=(0, 0, 0)),
+    ]
+    out = merge_lights(list(ents), radius=10)
+    assert out == [ents[0], ents[1], ents[3], ents[4]]
+    assert ents[0].attrs[0:4] == [72, 100, 50, 0]
+    assert ents[3].attrs[0:4] == [64, 170, 170, 170]
+    assert ents[4].attrs[0:4] == [64, 255, 255, 255]
+
+
+def test_merge_lights_budget():
+    ents = [_light(i * 10, 0, 0, radius=64 + i % 3) for i in range(10)]
+    assert merge_lights(list(ents), budget=20) == ents
+    assert merge_lights(list(ents), budget=4) == [ents[1], ents[2], ents[5], ents[8]]
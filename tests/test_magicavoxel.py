@@ -0,0 +1,127 @@
+import struct
+
+import numpy
+import pytest
+
+from redeclipse.magicavoxel.reader import Magicavoxel, VoxFile, DEFAULT_PALETTE
+
+
+def chunk(name, content=b'', children=b''):
+    return struct.pack('<4sii', name, len(content), len(children)) + content + children
+
+
+def model(size, voxels):
+    xyzi = struct.pack('<i', len(voxels)) + bytes(v for voxel in voxels for v in voxel)
+    return chunk(b'SIZE', struct.pack('<3i', *size)) + chunk(b'XYZI', xyzi)
+
+
+def test_matches_kaitai():
+    path = 'redeclipse/prefabs/castle/castle_gate.vox'
+    old = Magicavoxel.from_file(path)
+    old._io.close()
+    new = VoxFile.from_file(path)
+
+    assert len(new.models) == 1
+    assert new.models[0].size == (old.model_size.x, old.model_size.y, old.model_size.z)
+    assert new.voxels.tolist() == [[v.x, v.y, v.z, v.c] for v in old.model_voxels.voxels]
+    assert new.palette.tolist() == [[c.r, c.g, c.b, c.a] for c in old.palette.colours]
+
+
+def test_multiple_models():
+    palette = bytes(range(256)) * 4
+    children = chunk(b'PACK', struct.pack('<i', 2)) + \
+        model((2, 2, 2), [(0, 0, 0, 1), (1, 1, 1, 2)]) + \
+        chunk(b'nTRN', b'\x00' * 28) + \
+        model((4, 1, 1), [(3, 0, 0, 5)]) + \
+        chunk(b'MATL', b'\x01\x02\x03') + \
+        chunk(b'RGBA', palette)
+    data = struct.pack('<4si', b'VOX ', 150) + chunk(b'MAIN', children=children)
+
+    vox = VoxFile(data)
+    assert vox.version == 150
+    assert [m.size for m in vox.models] == [(2, 2, 2), (4, 1, 1)]
+    assert vox.models[0].voxels.tolist() == [[0, 0, 0, 1], [1, 1, 1, 2]]
+    assert vox.models[1].voxels.dtype == numpy.uint8
+    assert vox.models[1].voxels.tolist() == [[3, 0, 0, 5]]
+    assert vox.palette.shape == (256, 4)
+    assert vox.palette[1].tolist() == [4, 5, 6, 7]
+    assert vox.skipped == ['PACK', 'nTRN', 'MATL']
+
+
+def test_default_palette():
+    data = struct.pack('<4si', b'VOX ', 150) + chunk(b'MAIN', children=model((1, 1, 1), [(0, 0, 0, 1)]))
+    vox = VoxFile(data)
+    assert vox.palette is DEFAULT_PALETTE
+    assert vox.palette[0].tolist() == [255, 255, 255, 255]
+    assert vox.palette[254].tolist() == [17, 17, 17, 255]
+
+
+def test_invalid():
+    with pytest.raises(Exception):
+        VoxFile(b'NOPE' + b'\x00' * 20)
+    children = model((1, 1, 1), [(0, 0, 0, 1)])
+    data = struct.pack('<4si', b'VOX ', 150) + chunk(b'MAIN', children=children)
+    with pytest.raises(Exception):
+        VoxFile(data[:-2])
+
+
+def _write(world):
+    import io
+    from redeclipse.magicavoxel.writer import to_magicavoxel
+    from redeclipse.prefabs import TEXMAN
+    handle = io.BytesIO()
+    to_magicavoxel(world, handle, TEXMAN)
+    return handle.getvalue()
+
+
+def test_write_roundtrip():
+    from redeclipse.objects import cube
+    from redeclipse.voxel import VoxelWorld
+
+    world = VoxelWorld(size=16)
+    world.set_point(1, 2, 3, cube.solid(tex=4))
+    world.set_point(5, 0, 0, cube.solid(tex=6))
+    data = _write(world)
+
+    vox = VoxFile(data)
+    assert len(vox.models) == 1
+    assert vox.skipped == []
+    assert vox.models[0].size == (6, 3, 4)
+    assert sorted(vox.voxels.tolist()) == [[1, 2, 3, 5], [5, 0, 0, 7]]
+    assert vox.palette.shape == (256, 4)
+
+
+def test_write_large_world():
+    from redeclipse.objects import cube
+    from redeclipse.voxel import DenseVoxelWorld
+
+    world = DenseVoxelWorld(size=512)
+    world.fill_box((0, 0, 0), (2, 2, 2), cube.solid(tex=1))
+    world.set_point(300, 10, 20, cube.solid(tex=2))
+    world.set_point(300, 260, 500, cube.solid(tex=3))
+    data = _write(world)
+
+    vox = VoxFile(data)
+    assert [m.size for m in vox.models] == [(2, 2, 2), (45, 11, 21), (45, 5, 245)]
+    assert [len(m.voxels) for m in vox.models] == [8, 1, 1]
+    assert vox.models[1].voxels.tolist() == [[44, 10, 20, 3]]
+    assert vox.models[2].voxels.tolist() == [[44, 4, 244, 4]]
+    assert vox.skipped == ['nTRN', 'nGRP'] + ['nTRN', 'nSHP'] * 3
+    # Models are placed by their center
+    assert b'_t\x08\x00\x00\x00278 5 10' in data
+    assert b'_t\x0b\x00\x00\x00278 258 378' in data
+
+
+def test_write_offset_model():
+    from redeclipse.objects import cube
+    from redeclipse.voxel import VoxelWorld
+
+    # A single model, which is not at the origin
+    for (point, translation) in (((300, 10, 20), b'278 5 10'), ((-3, 2, 0), b'-129 1 0')):
+        world = VoxelWorld(size=512)
+        world.set_point(*point, cube.solid(tex=2))
+        data = _write(world)
+        vox = VoxFile(data)
+        assert len(vox.models) == 1
+        assert vox.skipped == ['nTRN', 'nGRP', 'nTRN', 'nSHP']
+        assert b'_t' + struct.pack('<i', len(translation)) + translation in data
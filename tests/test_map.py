@@ -0,0 +1,149 @@
+import gzip
+import os
+import shutil
+
+import pytest
+
+from redeclipse import MapParser
+from redeclipse.mapindex import LazyCube, MapIndex, map_stat
+from redeclipse.objects import cube
+
+FILES = os.path.join(os.path.dirname(__file__), 'files')
+
+
+def test_read():
+    m = MapParser().read(os.path.join(FILES, 'scaff1.mpz'))
+    assert m.magic == b'MAPZ'
+    assert m.meta['gameident'] == b'fps'
+    assert len(m.world) == 8
+    assert len(m.ents) == m.meta['numents']
+    assert all(len(c.texture) == 6 for c in m.world)
+
+
+def test_roundtrip(tmpdir):
+    for name in ('scaff1.mpz', 'scaff2.mpz', 'empty-large.mpz'):
+        path = os.path.join(FILES, name)
+        out = str(tmpdir.join(name))
+        MapParser().read(path).write(out)
+        assert gzip.open(path).read() == gzip.open(out).read()
+
+
+def test_write_options(tmpdir):
+    path = os.path.join(FILES, 'scaff3.mpz')
+    m = MapParser().read(path)
+    fast = str(tmpdir.join('fast.mpz'))
+    # Tiny flush size forces many partial flushes.
+    m.write(fast, compresslevel=1, progress=False, flush_size=64)
+    assert gzip.open(path).read() == gzip.open(fast).read()
+
+
+def test_write_failure(tmpdir):
+    path = os.path.join(FILES, 'scaff3.mpz')
+    m = MapParser().read(path)
+    world = m.world
+    m.world = world[:7] + ['not a cube']
+    with pytest.raises(Exception):
+        m.write(str(tmpdir.join('broken.mpz')))
+    # Nothing is left behind for the next write
+    assert (m._handle, m._buf, m._pbar) == (None, None, None)
+    m.world = world
+    out = str(tmpdir.join('out.mpz'))
+    m.write(out, progress=False)
+    assert gzip.open(path).read() == gzip.open(out).read()
+
+
+def test_compact_cubes():
+    m = MapParser().read(os.path.join(FILES, 'scaff1.mpz'))
+    cubes = []
+    stack = list(m.world)
+    while stack:
+        c = stack.pop()
+        cubes.append(c)
+        stack.extend(c.children or [])
+
+    assert not hasattr(cubes[0], '__dict__')
+    assert all(type(c.texture) is tuple and type(c.edges) is tuple for c in cubes)
+    # Equal tuples read from the file are shared
+    assert len(set(id(c.texture) for c in cubes)) == len(set(c.texture for c in cubes))
+    assert all(not hasattr(e, '__dict__') for e in m.ents)
+
+
+def _cube_dicts(world):
+    dicts = []
+    stack = list(world)
+    while stack:
+        c = stack.pop()
+        d = c.to_dict(children=False)
+        del d['_id']
+        dicts.append(d)
+        stack.extend(c.children or [])
+    return dicts
+
+
+def test_lazy_read(tmpdir):
+    path = os.path.join(FILES, 'scaff1.mpz')
+    eager = MapParser().read(path)
+    m = MapParser().read(path, lazy=True, index_depth=2)
+    assert m._load_world is not None
+    assert [e.to_dict() for e in m.ents] == [e.to_dict() for e in eager.ents]
+    assert m.meta == eager.meta
+    assert m.to_dict()['entities'] == []
+    # Nothing but the header, entities and vslots was read
+    assert m._load_world is not None
+
+    assert _cube_dicts(m.world) == _cube_dicts(eager.world)
+    out = str(tmpdir.join('out.mpz'))
+    m.write(out, progress=False)
+    assert gzip.open(path).read() == gzip.open(out).read()
+
+
+def test_lazy_write(tmpdir):
+    path = os.path.join(FILES, 'scaff2.mpz')
+    m = MapParser().read(path, lazy=True, index_depth=1)
+    lazy = [c for c in m.world if type(c) is LazyCube]
+    assert lazy
+    # Undecoded subtrees are copied as is
+    out = str(tmpdir.join('out.mpz'))
+    m.write(out, progress=False)
+    assert all(c.encoded() is not None for c in lazy)
+    assert gzip.open(path).read() == gzip.open(out).read()
+
+    # Decoded ones are written from their cubes
+    lazy[0].children[0] = cube.solid(tex=3)
+    assert lazy[0].encoded() is None
+    m.write(out, progress=False)
+    eager = MapParser().read(path)
+    eager.world[m.world.index(lazy[0])].children[0] = cube.solid(tex=3)
+    expected = str(tmpdir.join('expected.mpz'))
+    eager.write(expected, progress=False)
+    assert gzip.open(expected).read() == gzip.open(out).read()
+
+    # Over the map itself, before its octree was ever read
+    path = str(tmpdir.join('inplace.mpz'))
+    shutil.copy(os.path.join(FILES, 'scaff1.mpz'), path)
+    original = gzip.open(path).read()
+    MapParser().read(path, lazy=True).write(path, progress=False)
+    assert gzip.open(path).read() == original
+
+
+def test_lazy_index(tmpdir):
+    src = os.path.join(FILES, 'scaff3.mpz')
+    path = str(tmpdir.join('map.mpz'))
+    shutil.copy(src, path)
+    index_path = path + '.idx'
+    world = MapParser().read(path, lazy=True, index_path=index_path).world
+    assert os.path.exists(index_path)
+    index = MapIndex.load(index_path, 3, map_stat(path))
+    assert [s.offset for s in index.roots][1:] == [s.offset + s.length for s in index.roots][:-1]
+    # Stale or different depth indexes are not used
+    assert MapIndex.load(index_path, 2, map_stat(path)) is None
+    assert MapIndex.load(index_path, 3, (0, 0)) is None
+
+    MapParser._map_indexes.clear()
+    assert _cube_dicts(MapParser().read(path, lazy=True, index_path=index_path).world) == _cube_dicts(world)
+
+    # The index file is written even if the index was cached in memory
+    os.remove(index_path)
+    MapParser().read(path, lazy=True).world
+    MapParser().read(path, lazy=True, index_path=index_path).world
+    assert MapIndex.load(index_path, 3, map_stat(path)) is not None
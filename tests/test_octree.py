@@ -0,0 +1,143 @@
+import math
+import random
+
+from redeclipse.cli import parse
+from redeclipse.enums import OCT
+from redeclipse.objects import cube
+from redeclipse.octree import Octree
+from redeclipse.voxel import VoxelWorld
+
+
+def _world(size=16, seed=42):
+    random.seed(seed)
+    v = VoxelWorld(size=size)
+    points = set()
+    for i in range(size ** 3 // 20):
+        points.add(tuple(random.randrange(size) for _ in range(3)))
+    # A floor, and a solid block which collapses into larger cubes
+    points.update((x, y, 0) for x in range(size) for y in range(size))
+    points.update((x, y, z) for x in range(8) for y in range(8) for z in range(8))
+    for p in points:
+        v.set_point(*p, cube.solid(tex=2))
+    return v, points
+
+
+def _first_hit(points, scale, origin, direction):
+    # Distance to the first voxel the ray passes through (not just touches)
+    best = None
+    for point in points:
+        (near, far) = (-math.inf, math.inf)
+        for (p, o, d) in zip(point, origin, direction):
+            (lower, upper) = (p * scale, (p + 1) * scale)
+            if d == 0:
+                if not lower <= o < upper:
+                    break
+                continue
+            (t0, t1) = sorted(((lower - o) / d, (upper - o) / d))
+            (near, far) = (max(near, t0), min(far, t1))
+        else:
+            if near < far and far > 0 and (best is None or max(near, 0) < best):
+                best = max(near, 0)
+    return best
+
+
+def test_lookup():
+    (v, points) = _world()
+    for (worldsize, collapse) in ((16, False), (64, False), (16, True)):
+        tree = Octree(v.to_octree(collapse=collapse), worldsize)
+        scale = worldsize // 16
+        for x in range(16):
+            for y in range(16):
+                for z in range(16):
+                    assert tree.solid(x * scale + 0.5, y * scale, z * scale + 0.99) == ((x, y, z) in points)
+
+        leaf = tree.lookup(3 * scale, 4 * scale, 5 * scale)
+        assert (leaf.x, leaf.y, leaf.z) <= (3 * scale, 4 * scale, 5 * scale)
+        assert leaf.bounds() == ((leaf.x, leaf.y, leaf.z), (leaf.x + leaf.size, leaf.y + leaf.size, leaf.z + leaf.size))
+        if collapse:
+            assert leaf.size == 8
+
+    tree = Octree(v.to_octree(), 16)
+    assert tree.lookup(-1, 0, 0) is None
+    assert tree.lookup(0, 16, 0) is None
+    assert not tree.solid(0, 0, 16)
+
+
+def test_box():
+    (v, points) = _world()
+    tree = Octree(v.to_octree(collapse=True), 16)
+    for (lower, upper) in (((0, 0, 0), (16, 16, 16)), ((2, 3, 4), (11, 9, 7)), ((7.5, 7.5, 7.5), (8.5, 8.5, 8.5))):
+        found = set()
+        for leaf in tree.box(lower, upper):
+            found.update(
+                (x, y, z)
+                for x in range(leaf.x, leaf.x + leaf.size)
+                for y in range(leaf.y, leaf.y + leaf.size)
+                for z in range(leaf.z, leaf.z + leaf.size)
+                if all(lo - 1 < c < hi for (c, lo, hi) in zip((x, y, z), lower, upper))
+            )
+        assert found == {p for p in points if all(lo - 1 < c < hi for (c, lo, hi) in zip(p, lower, upper))}
+    assert len(tree.box((0, 0, 0), (16, 16, 16), empty=True)) > len(tree.box((0, 0, 0), (16, 16, 16)))
+
+
+def test_height():
+    (v, points) = _world()
+    tree = Octree(v.to_octree(), 64)
+    for x in range(16):
+        for y in range(16):
+            heights = [z + 1 for (px, py, z) in points if (px, py) == (x, y)]
+            assert tree.height(4 * x + 1, 4 * y + 3) == 4 * max(heights)
+            below = [z for z in heights if z <= 4]
+            assert tree.height(4 * x + 1, 4 * y + 3, below=16) == 4 * max(below)
+    assert tree.height(64, 0) is None
+
+    columns = tree.column(5, 5)
+    assert [leaf.z for leaf in columns] == sorted((leaf.z for leaf in columns), reverse=True)
+
+
+def test_raycast():
+    (v, points) = _world()
+    tree = Octree(v.to_octree(collapse=True), 32)
+
+    # Straight down onto the floor
+    (distance, position, leaf) = tree.raycast((30, 30, 40), (0, 0, -1))
+    assert (distance, position) == (38, (30, 30, 2))
+    assert leaf.z == 0
+    # Through the world, but past a short maximum distance
+    assert tree.raycast((30, 30, 40), (0, 0, -1), distance=20) is None
+    # Away from the world
+    assert tree.raycast((30, 30, 40), (0, 0, 1)) is None
+    assert tree.raycast((-1, 30, 1), (-1, 0, 0)) is None
+
+    random.seed(1)
+    for i in range(300):
+        origin = [random.uniform(-16, 48) for _ in range(3)]
+        direction = [random.uniform(-1, 1) for _ in range(3)]
+        if i % 3 == 0:
+            direction[i % 2] = 0
+        length = math.sqrt(sum(d * d for d in direction))
+        expected = _first_hit(points, 2, origin, [d / length for d in direction])
+        hit = tree.raycast(origin, direction)
+        if expected is None:
+            assert hit is None
+        else:
+            assert abs(hit[0] - expected) < 1e-9
+
+
+def test_deformed():
+    world = cube.newcubes()
+    # Geometry in the lower half of the cube only
+    world[0].octsav = OCT.OCTSAV_NORMAL.value
+    world[0].edges = (0x80, ) * 8 + (0x40, ) * 4
+    tree = Octree(world, 16)
+    assert tree.lookup(1, 1, 1).bounds() == ((0, 0, 0), (8, 8, 4))
+    assert tree.solid(1, 1, 3) and not tree.solid(1, 1, 5)
+    assert tree.height(1, 1) == 4
+    assert tree.raycast((2, 2, 15), (0, 0, -1))[0] == 11
+
+
+def test_map_octree():
+    mymap = parse('tests/files/empty.mpz')
+    tree = mymap.octree()
+    assert tree.worldsize == mymap.meta['worldsize']
+    assert tree.lookup(0, 0, 0) is not None
@@ -0,0 +1,51 @@
+import noise
+import numpy
+import pytest
+
+from redeclipse import perlin
+
+
+def test_pnoise2_matches_noise():
+    rng = numpy.random.default_rng(1)
+    (x, y) = (rng.uniform(-40, 300, 500), rng.uniform(-40, 300, 500))
+    for base in (0, 100, 228):
+        for octaves in (1, 2):
+            expected = [noise.pnoise2(a, b, octaves=octaves, base=base) for (a, b) in zip(x, y)]
+            assert perlin.pnoise2(x, y, octaves=octaves, base=base).tolist() == expected
+
+
+def test_pnoise3_matches_noise():
+    rng = numpy.random.default_rng(2)
+    (x, y, z) = (rng.uniform(-40, 300, 500), rng.uniform(-40, 300, 500), rng.uniform(0, 64, 500))
+    for base in (0, 64):
+        expected = [noise.pnoise3(a, b, c, octaves=3, base=base) for (a, b, c) in zip(x, y, z)]
+        assert perlin.pnoise3(x, y, z, octaves=3, base=base).tolist() == expected
+
+
+def test_every_base():
+    # Bases past 0 read beyond the permutation table in the C implementation
+    rng = numpy.random.default_rng(3)
+    (x, y, z) = (rng.uniform(-40, 300, 50), rng.uniform(-40, 300, 50), rng.uniform(0, 64, 50))
+    for base in range(perlin.MAX_BASE + 1):
+        assert perlin.pnoise2(x, y, base=base).tolist() == [noise.pnoise2(a, b, base=base) for (a, b) in zip(x, y)]
+        expected = [noise.pnoise3(a, b, c, base=base) for (a, b, c) in zip(x, y, z)]
+        assert perlin.pnoise3(x, y, z, base=base).tolist() == expected
+
+
+def test_scalars():
+    for octaves in (1, 3):
+        value = perlin.pnoise2(3.7, 1.2, octaves=octaves)
+        assert type(value) is float
+        assert value == noise.pnoise2(3.7, 1.2, octaves=octaves)
+        assert type(perlin.pnoise3(3.7, 1.2, 0.4, octaves=octaves)) is float
+    assert perlin.pnoise2(numpy.array([3.7]), 1.2).shape == (1, )
+
+
+def test_field():
+    values = perlin.field((8, 16), scale=(0.1, 0.25), offset=(3, 0), octaves=2)
+    assert values.shape == (8, 16)
+    assert values[2, 5] == noise.pnoise2(3 + 2 * 0.1, 5 * 0.25, octaves=2)
+    assert perlin.field((4, 4, 4), scale=0.3).shape == (4, 4, 4)
+
+    with pytest.raises(Exception):
+        perlin.pnoise2(0.5, 0.5, base=perlin.MAX_BASE + 1)
@@ -0,0 +1,75 @@
+import json
+import pstats
+import tracemalloc
+
+from redeclipse.cli import parse, write_map
+from redeclipse.objects import cube
+from redeclipse.profiling import Profiler, octree_nodes, profile
+from redeclipse.voxel import VoxelWorld
+
+
+def test_stages(tmpdir):
+    profiler = Profiler(memory=True)
+    with profiler.stage('allocate') as stage:
+        data = [[i] for i in range(10000)]
+    stage['items'] = len(data)
+    with profiler.stage('idle'):
+        pass
+    profiler.stop()
+
+    (allocate, idle) = profiler.stages
+    assert allocate['name'] == 'allocate'
+    assert allocate['items'] == 10000
+    assert allocate['peak_memory'] >= allocate['memory'] > 10000 * 8
+    assert allocate['objects'] > 10000
+    assert idle['wall'] >= 0 and idle['cpu'] >= 0
+
+    path = str(tmpdir.join('report.json'))
+    profiler.write(path)
+    report = json.load(open(path))
+    assert [s['name'] for s in report['stages']] == ['allocate', 'idle']
+    assert report['wall'] == allocate['wall'] + idle['wall']
+
+
+def test_stages_without_reset_peak(monkeypatch):
+    # Python < 3.9
+    monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)
+    profiler = Profiler(memory=True)
+    with profiler.stage('allocate'):
+        data = [[i] for i in range(100000)]
+        del data
+    with profiler.stage('small'):
+        data = [[i] for i in range(1000)]
+    profiler.stop()
+
+    (allocate, small) = profiler.stages
+    assert allocate['peak_memory'] > 100000 * 8
+    assert small['peak_memory'] >= small['memory'] > 1000 * 8
+    assert small['peak_memory'] < 100000 * 8
+    assert len(data) == 1000
+
+
+def test_write_map(tmpdir):
+    mymap = parse('tests/files/empty.mpz')
+    v = VoxelWorld(size=2**5)
+    v.set_point(1, 2, 3, cube.solid(tex=2))
+    v.set_point(30, 2, 3, cube.solid(tex=2))
+
+    profiler = Profiler()
+    path = str(tmpdir.join('out.mpz'))
+    with profile(str(tmpdir.join('out.prof'))):
+        write_map(v, mymap, path, profiler)
+
+    (to_octree, write) = profiler.stages
+    assert to_octree['octree_nodes'] == octree_nodes(mymap.world)
+    assert 'peak_memory' not in to_octree
+    assert write['bytes'] == tmpdir.join('out.mpz').size()
+    assert pstats.Stats(str(tmpdir.join('out.prof'))).total_calls > 0
+
+
+def test_octree_nodes():
+    world = [cube.solid(tex=1) for _ in range(8)]
+    assert octree_nodes(world) == 8
+    world[3] = cube.newtexcube(tex=1)
+    world[3].children = [cube.solid(tex=2) for _ in range(8)]
+    assert octree_nodes(world) == 16
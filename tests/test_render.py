@@ -0,0 +1,94 @@
+import logging
+
+from redeclipse import prefabs
+from redeclipse.objects import cube
+from redeclipse.render import RoomBuffer, render_rooms
+from redeclipse.voxel import VoxelWorld
+import redeclipse.cli.magica_rooms as magica_rooms
+
+
+class MapFile:
+    name = 'tests/files/empty.mpz'
+
+
+def _generate(processes):
+    texman = prefabs.TEXMAN
+    state = (dict(texman.atlas), dict(texman.atlas_backref), dict(texman.texref))
+    try:
+        (v, mymap, upm) = magica_rooms.main(MapFile(), seed=3, rooms=12, processes=processes)
+        return v, mymap, dict(texman.atlas_backref)
+    finally:
+        (texman.atlas, texman.atlas_backref, texman.texref) = state
+
+
+def test_room_buffer():
+    a = VoxelWorld(size=16)
+    a.set_point(1, 1, 1, 'x')
+    a.set_point(2, 2, 2, 'y')
+    b = VoxelWorld(size=16)
+    b.world = dict(a.world)
+
+    buf = RoomBuffer(size=16)
+    for world in (a, buf):
+        world.set_point(1, 1, 1, 'z')
+        world.set_point(3, 3, 3, 'a')
+        world.del_point(2, 2, 2)
+        world.set_point(2, 2, 2, 'b')
+        world.set_point(9, 9, 9, 'c')
+        world.del_point(9, 9, 9)
+    buf.apply(b)
+
+    assert list(a.world.items()) == list(b.world.items())
+    assert (a.xmin, a.xmax, a.zmin, a.zmax) == (b.xmin, b.xmax, b.zmin, b.zmax)
+
+    # Reads see the buffer's changes, then the parent world
+    buf = RoomBuffer(size=16, parent=b)
+    buf.set_point(1, 1, 1, 'd')
+    buf.del_point(3, 3, 3)
+    assert buf.get_point(1, 1, 1) == 'd'
+    assert buf.get_point(3, 3, 3) is None
+    assert buf.get_point(2, 2, 2) == 'b'
+    assert buf.get_point(4, 4, 4) is None
+    assert RoomBuffer(size=16).get_point(2, 2, 2) is None
+
+
+def test_parallel_render_matches_serial():
+    logging.disable(logging.INFO)
+    try:
+        (v1, map1, atlas1) = _generate(1)
+        (v2, map2, atlas2) = _generate(2)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert atlas1 == atlas2
+    assert list(v1.world.keys()) == list(v2.world.keys())
+    for (key, value) in v1.world.items():
+        assert list(value.texture) == list(v2.world[key].texture)
+        assert isinstance(v2.world[key], cube)
+    assert [e.to_dict() for e in map1.ents] == [e.to_dict() for e in map2.ents]
+
+
+class EntityList:
+    def __init__(self):
+        self.ents = []
+
+
+class ReadingRoom:
+    def __init__(self, x):
+        self.x = x
+
+    def render(self, world, xmap):
+        world.set_point(self.x, 1, 0, world.get_point(0, 0, 0))
+        world.set_point(self.x, 2, 0, 'own')
+        world.set_point(self.x, 3, 0, world.get_point(self.x, 2, 0))
+
+
+def test_parallel_render_reads():
+    worlds = []
+    for processes in (1, 2):
+        world = VoxelWorld(size=16)
+        world.set_point(0, 0, 0, 'floor')
+        render_rooms([ReadingRoom(x) for x in range(4)], world, EntityList(), processes=processes)
+        worlds.append(list(world.world.items()))
+    assert worlds[0] == worlds[1]
+    assert worlds[0][1:4] == [((0, 1, 0), 'floor'), ((0, 2, 0), 'own'), ((0, 3, 0), 'own')]
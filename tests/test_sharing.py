@@ -0,0 +1,76 @@
+import gzip
+import os
+
+import pytest
+
+from redeclipse import MapParser
+from redeclipse.objects import cube
+from redeclipse.sharing import count_nodes, share, SharedCube
+from redeclipse.voxel import VoxelWorld, DenseVoxelWorld
+
+FILES = os.path.join(os.path.dirname(__file__), 'files')
+
+
+def _tiled(world_class=VoxelWorld, size=16):
+    # The same 4x4x4 room in every corner of the world
+    v = world_class(size=size)
+    for (x, y) in ((0, 0), (8, 0), (0, 8), (8, 8)):
+        v.fill_box((x, y, 0), (x + 4, y + 4, 1), cube.solid(tex=2))
+        v.fill_box((x, y, 0), (x + 1, y + 4, 4), cube.solid(tex=3))
+    return v
+
+
+def test_to_octree(tmpdir):
+    for world_class in (VoxelWorld, DenseVoxelWorld):
+        v = _tiled(world_class)
+        plain = v.to_octree()
+        shared = v.to_octree(share=True)
+
+        # Identical subtrees are the same object
+        assert shared[0].children[0] is shared[1].children[0] is shared[2].children[0]
+        assert shared[0].children[0] is not shared[0].children[1]
+        (total, distinct) = count_nodes(shared)
+        assert total == count_nodes(plain)[0]
+        assert distinct < count_nodes(plain)[1]
+
+        # Top level cubes may be modified, the rest may not
+        shared[0].octsav = 0
+        with pytest.raises(AttributeError):
+            shared[0].children[0].octsav = 0
+        assert type(shared[0].children[0].copy()) is cube
+
+        mymap = MapParser().read(os.path.join(FILES, 'empty.mpz'))
+        for (name, world) in (('plain', plain), ('shared', shared)):
+            world[0].octsav = 0
+            mymap.world = world
+            mymap.write(str(tmpdir.join(name + '.mpz')), progress=False)
+            # Again, from the cached serialized subtrees
+            mymap.write(str(tmpdir.join(name + '2.mpz')), progress=False)
+        expected = gzip.open(str(tmpdir.join('plain.mpz'))).read()
+        assert gzip.open(str(tmpdir.join('shared.mpz'))).read() == expected
+        assert gzip.open(str(tmpdir.join('shared2.mpz'))).read() == expected
+
+
+def test_share_equality():
+    a = _tiled().to_octree()
+    b = _tiled().to_octree()
+    # Equal subtrees of different octrees are the same object once shared
+    assert a[0] is not b[0]
+    assert share(a[0]) is share(b[0])
+    assert share(a[0].children[0]) is not share(a[0].children[1])
+
+    leaf = cube.newtexcube(tex=5)
+    assert share(leaf) is SharedCube.leaf(cube.newtexcube(tex=5))
+    assert share(leaf) is not share(cube.newtexcube(tex=6))
+
+
+def test_read(tmpdir):
+    path = os.path.join(FILES, 'scaff1.mpz')
+    m = MapParser().read(path, share=True)
+    assert count_nodes(m.world)[1] < count_nodes(MapParser().read(path).world)[1]
+    out = str(tmpdir.join('out.mpz'))
+    m.write(out, progress=False)
+    assert gzip.open(path).read() == gzip.open(out).read()
+
+    with pytest.raises(Exception):
+        MapParser().read(path, share=True, lazy=True)
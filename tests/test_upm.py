@@ -1,9 +1,12 @@
+import random
+
 import pytest
 
-from redeclipse.upm import UnusedPositionManager
+from redeclipse.upm import UnusedPositionManager, WeightTree
+from redeclipse import prefabs
 from redeclipse.prefabs import Room
 from redeclipse.vector import CoarseVector
-from redeclipse.vector.orientations import NORTH, SOUTH, EAST, WEST
+from redeclipse.vector.orientations import NORTH, SOUTH, EAST, WEST, CARDINALS
 
 
 def test_upm():
@@ -53,3 +56,117 @@ def test_flavours():
     assert upm.nrp_flavour_vertical(0, 0, 1) == 1
 
     assert upm.nrp_flavour_plain(0, 0, 1) == 1
+
+
+def test_weight_tree():
+    weights = [0, 3, 1, 0, 5, 2, 2]
+    tree = WeightTree(weights)
+    assert tree.total() == sum(weights)
+    for r in range(sum(weights) + 1):
+        # Same as the linear scan in weighted_choice
+        upto = 0
+        for (idx, w) in enumerate(weights):
+            if upto + w >= r:
+                expected = idx
+                break
+            upto += w
+        assert tree.search(r) == expected
+
+    tree.update(4, 0)
+    assert tree.total() == sum(weights) - 5
+    assert tree.search(5) == 5
+
+
+def test_doors_match_list():
+    random.seed(3)
+    upm = UnusedPositionManager(16)
+    doors = [(CoarseVector(i % 5, i // 5, i % 3), None, i) for i in range(40)]
+    upm.unoccupied = doors
+    for i in range(0, 40, 3):
+        upm._remove_door(doors[i])
+    upm._remove_doors_at(CoarseVector(1, 1, 0))
+    remaining = [
+        d for (i, d) in enumerate(doors)
+        if i % 3 != 0 and d[0] != CoarseVector(1, 1, 0)
+    ]
+    assert upm.unoccupied == remaining
+
+    # Sampling gives the same doors as the previous linear implementation
+    for _ in range(50):
+        state = random.getstate()
+        choices = [(idx, upm.nrp_flavour_vertical(*d[0])) for idx, d in enumerate(remaining)]
+        expected = remaining[UnusedPositionManager.weighted_choice(choices)]
+        random.setstate(state)
+        assert upm.nonrandom_position(upm.nrp_flavour_vertical) == expected
+
+
+def test_room_templates():
+    for cls in (prefabs.Room, prefabs.NLongCorridor, prefabs.CrossingWalkways, prefabs.PlusPlatform):
+        for orientation in CARDINALS:
+            for randflags in (None, [False] * 4, [True, False, True, False]):
+                room = cls(pos=CoarseVector(5, 6, 7), orientation=orientation, randflags=randflags)
+                assert room.get_positions() == [
+                    room.pos + p.rotate(orientation) for p in room._get_positions()
+                ]
+                assert [(d['orientation'], d['offset']) for d in room.get_doorways()] == [
+                    (d['orientation'].rotate(orientation), room.pos + d['offset'].rotate(orientation))
+                    for d in room._get_doorways()
+                ]
+            # Class templates are relative to the pos given to the constructor
+            pos = CoarseVector(5, 6, 7)
+            room = cls(pos=pos, orientation=orientation)
+            (positions, doorways) = cls.class_template(orientation)
+            assert [pos + CoarseVector(*p) for p in positions] == room.get_positions()
+            assert [(o, pos + CoarseVector(*d)) for (o, d) in doorways] == [
+                (d['orientation'], d['offset']) for d in room.get_doorways()
+            ]
+
+
+def test_magica_model_shared():
+    from redeclipse.prefabs import castle
+    a = castle.castle_gate(pos=CoarseVector(0, 0, 0), orientation=EAST)
+    b = castle.castle_gate(pos=CoarseVector(4, 0, 0), orientation=NORTH)
+    assert a.load_model() is b.load_model()
+    assert a.vox is b.vox
+    model = a.load_model()
+    assert len(model.voxels) == len(model.vox.world)
+    assert a._get_positions() == b._get_positions()
+
+
+def _room_classes():
+    from redeclipse.prefabs import castle, dungeon, spacestation, original, egypt  # noqa
+    from redeclipse.prefabs.magica import MagicaRoom
+    classes = set()
+    stack = [Room]
+    while stack:
+        cls = stack.pop()
+        stack.extend(cls.__subclasses__())
+        # Magica rooms without a model are only base classes
+        if not issubclass(cls, MagicaRoom) or cls.vox_file is not None:
+            classes.add(cls)
+    return classes
+
+
+def test_class_template_placement():
+    # Rooms are placed where they were before templates were cached, by
+    # building a probe room and looking up its doorways
+    prev_door = CoarseVector(10, 12, 3)
+    probe_pos = CoarseVector(2, 2, 3)
+    for cls in _room_classes():
+        for orientation in CARDINALS:
+            (positions, doorways) = cls.class_template(orientation)
+            for prev_orientation in CARDINALS:
+                opposite = prev_orientation.rotate(180)
+                probe = cls(pos=probe_pos, orientation=orientation)
+                expected = [
+                    cls(pos=probe_pos - (d['offset'] - prev_door + prev_orientation), orientation=orientation)
+                    for d in probe.get_doorways() if d['orientation'] == opposite
+                ]
+                target = prev_door - prev_orientation
+                args = [target - CoarseVector(*offset) for (ori, offset) in doorways if ori == opposite]
+                rooms = [cls(pos=pos, orientation=orientation) for pos in args]
+                assert [r.pos for r in rooms] == [r.pos for r in expected]
+                for (pos, room, exp) in zip(args, rooms, expected):
+                    assert room.get_positions() == exp.get_positions()
+                    assert room.get_doorways() == exp.get_doorways()
+                    assert [pos + CoarseVector(*p) for p in positions] == exp.get_positions()
@@ -1,7 +1,10 @@
 import pytest
 import random
-from redeclipse.vector import BaseVector, CoarseVector, FineVector
-from redeclipse.vector.orientations import rotate_yaw, NORTH, SOUTH, EAST, WEST
+import copy
+import pickle
+
+from redeclipse.vector import BaseVector, CoarseVector, FineVector, VoxelVector
+from redeclipse.vector.orientations import rotate_yaw, NORTH, SOUTH, EAST, WEST, TILE_VOX_OFF, VOXEL_OFFSET
 
 
 def test_rotate():
@@ -47,8 +50,7 @@ def test_basevector():
         y = Class(0, 1, 0)
         z = Class(0, 0, 1)
 
-        exp = (idx << 31) + (4 << 20) + (2 << 10) + 1
-        assert hash(v) == exp
+        assert hash(v) == hash(w)
         assert v == w
         assert v != u
 
@@ -87,6 +89,8 @@ def test_basevector():
         assert v.rotate(90) == v.rotate(90 - 360)
 
     assert CoarseVector(1, 1, 1) == FineVector(8, 8, 8)
+    assert hash(CoarseVector(1, 1, 1)) == hash(FineVector(8, 8, 8))
+    assert hash(CoarseVector(-1, 0.5, 2)) == hash(FineVector(-8, 4, 16.0))
     assert FineVector(8, 8, 8) == CoarseVector(1, 1, 1)
 
 
@@ -134,3 +138,44 @@ def test_addition():
     assert a + b == FineVector(16, 16, 16)
     assert b + a == CoarseVector(2, 2, 2)
     assert b + a == FineVector(16, 16, 16)
+
+
+def test_hash_collisions():
+    # These used to collide: fields overflowing into each other, and
+    # negative coordinates borrowing from the next field
+    vectors = [FineVector(0, 1024, 0), FineVector(1, 0, 0), FineVector(0, 0, 1 << 20), FineVector(0, 1, -1024), FineVector(0, 0, 0)]
+    vectors += [FineVector(x, y, z) for x in range(-1100, 1100, 100) for y in range(-1100, 1100, 100) for z in (-1, 0, 1024)]
+    assert len(set(hash(v) for v in vectors)) == len(set(vectors))
+
+
+def test_voxelvector():
+    a = VoxelVector(1, 2, 3)
+    assert (a.x, a.y, a.z) == (1, 2, 3)
+    assert a == (1, 2, 3) and hash(a) == hash((1, 2, 3))
+    assert a + VoxelVector(1, 1, 1) == (2, 3, 4)
+    assert type(a - (1, 1, 1)) is VoxelVector
+    assert a * 2 == (2, 4, 6)
+    assert a + FineVector(1, 1, 1) == FineVector(2, 3, 4)
+    assert a + CoarseVector(1, 0, 0) == FineVector(9, 2, 3)
+    assert FineVector(1, 1, 1) + a == FineVector(2, 3, 4)
+    assert FineVector(0, 0, 0) <= a <= FineVector(1, 2, 4)
+    assert copy.deepcopy(a) == a and pickle.loads(pickle.dumps(a)) == a
+
+    assert VoxelVector.from_vector(CoarseVector(1, 2, 3)) == (8, 16, 24)
+    assert VoxelVector.from_vector(FineVector(1.0, 2, 3)) == (1, 2, 3)
+    assert VoxelVector.from_vector(FineVector(1.5, 2, 3)) is None
+
+    with pytest.raises(Exception):
+        a.rotate(45)
+
+
+def test_voxelvector_rotate():
+    rng = random.Random(4)
+    points = [(rng.randint(-50, 50), rng.randint(-50, 50), rng.randint(-5, 5)) for _ in range(50)]
+    offsets = (TILE_VOX_OFF, VOXEL_OFFSET, FineVector(3, -2, 1), CoarseVector(-16, -16, 0))
+    for deg in (0, 90, 180, 270, -90, NORTH, SOUTH, EAST, WEST):
+        for point in points:
+            assert VoxelVector(*point).rotate(deg).fine() == FineVector(*point).rotate(deg)
+            for offset in offsets:
+                expected = FineVector(*point).offset_rotate(deg, offset=offset.fine())
+                assert VoxelVector(*point).offset_rotate(deg, offset=offset).fine() == expected
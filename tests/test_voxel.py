@@ -1,4 +1,9 @@
-from redeclipse.voxel import VoxelWorld
+import random
+import numpy
+import pytest
+
+from redeclipse.enums import OCT
+from redeclipse.voxel import VoxelWorld, DenseVoxelWorld
 from redeclipse.objects import cube
 
 
@@ -13,3 +18,216 @@ def test_octree():
 
     assert q[0].children[0] == True
     assert q[7].children[7] == True
+
+
+def _strip_ids(d):
+    if isinstance(d, dict):
+        return {k: _strip_ids(v) for (k, v) in d.items() if k != '_id'}
+    if isinstance(d, list):
+        return [_strip_ids(x) for x in d]
+    return d
+
+
+def _octree_dict(tree):
+    return [_strip_ids(c.to_dict()) for c in tree]
+
+
+def test_dense_points():
+    v = DenseVoxelWorld(size=8)
+    v.set_point(1, 2, 3, cube.newtexcube(tex=4))
+    v.set_point(2, 2, 2, True)
+    # Outside of the world, dropped
+    v.set_point(-1, 0, 0, True)
+    v.set_point(8, 0, 0, True)
+
+    assert list(v.get_point(1, 2, 3).texture) == [4] * 6
+    assert v.get_point(2, 2, 2) is True
+    assert v.get_point(0, 0, 0) is None
+    assert v.get_point(-1, 0, 0) is None
+    assert len(v.world) == 2
+    assert (1, 2, 3) in v.world
+    assert sorted(v.world) == [(1, 2, 3), (2, 2, 2)]
+
+    v.del_point(1, 2, 3)
+    assert v.get_point(1, 2, 3) is None
+    assert (v.xmin, v.xmax, v.zmin, v.zmax) == (1, 2, 2, 3)
+
+
+def test_bulk_fill():
+    for world_class in (VoxelWorld, DenseVoxelWorld):
+        v = world_class(size=8)
+        v.fill_box((1, 1, 1), (3, 4, 2), cube.newtexcube(tex=5))
+        assert len(v.world) == 2 * 3 * 1
+        assert list(v.get_point(2, 3, 1).texture) == [5] * 6
+        assert v.get_point(3, 3, 1) is None
+        assert (v.xmin, v.xmax, v.ymin, v.ymax) == (1, 2, 1, 3)
+
+        v.del_box((1, 1, 1), (2, 4, 2))
+        assert len(v.world) == 3
+
+        mask = numpy.zeros((8, 8, 8), dtype=bool)
+        mask[0, :, 0] = True
+        v.set_mask(mask, True)
+        assert len(v.world) == 3 + 8
+        v.del_mask(mask)
+        assert len(v.world) == 3
+
+        # Masks need not match the world's shape, and may skip set points
+        mask = numpy.ones((3, 3, 2), dtype=bool)
+        v.set_mask(mask, cube.solid(tex=1), overwrite=False)
+        assert len(v.world) == 3 * 3 * 2 + 1
+        assert list(v.get_point(2, 2, 1).texture) == [5] * 6
+        assert list(v.get_point(0, 0, 0).texture) == [1] * 6
+
+
+def test_dense_octree():
+    a = VoxelWorld(size=8)
+    b = DenseVoxelWorld(size=8)
+    for (x, y, z, t) in ((0, 0, 0, 1), (7, 7, 7, 2), (3, 4, 5, 3), (4, 4, 4, 3)):
+        a.set_point(x, y, z, cube.newtexcube(tex=t))
+        b.set_point(x, y, z, cube.newtexcube(tex=t))
+
+    assert _octree_dict(a.to_octree()) == _octree_dict(b.to_octree())
+
+
+def test_octree_matches_recursive():
+    random.seed(1)
+    for size in (2, 4, 16):
+        for world_class in (VoxelWorld, DenseVoxelWorld):
+            v = world_class(size=size)
+            for i in range(size * 3):
+                v.set_point(
+                    random.randrange(size), random.randrange(size), random.randrange(size),
+                    cube.newtexcube(tex=random.randrange(4))
+                )
+            assert _octree_dict(v.to_octree()) == _octree_dict(v.to_octree_recursive())
+
+
+def test_octree_collapse():
+    v = DenseVoxelWorld(size=8)
+    v.fill_box((0, 0, 0), (4, 4, 4), cube.newtexcube(tex=3))
+    v.set_point(4, 4, 4, cube.newtexcube(tex=3))
+
+    q = v.to_octree(collapse=True)
+    # The whole 4x4x4 octant is a single cube
+    assert q[0].children is None
+    assert list(q[0].texture) == [3] * 6
+    # The lone voxel is not
+    assert list(q[7].children[0].children[0].texture) == [3] * 6
+
+    q = v.to_octree()
+    assert list(q[0].children[0].children[0].texture) == [3] * 6
+
+
+def test_solid_cubes_shared():
+    assert cube.solid(tex=3) is cube.solid(tex=3)
+    assert cube.solid(tex=3) is not cube.solid(tex=4)
+
+    v = DenseVoxelWorld(size=8)
+    v.fill_box((0, 0, 0), (2, 2, 2), cube.solid(tex=3))
+    v.set_point(4, 4, 4, cube.newtexcube(tex=3))
+    assert v.get_point(0, 0, 0) is v.get_point(4, 4, 4)
+
+    q = v.to_octree(collapse=True)
+    # Worldroot entries are editable copies
+    q[0].octsav = 0
+    assert cube.solid(tex=3).octsav != 0
+
+
+def test_dense_palette():
+    deformed = cube.newtexcube(tex=4)
+    deformed.octsav = OCT.OCTSAV_NORMAL.value
+    deformed.edges = (0x80, ) * 8 + (0x40, ) * 4
+    deformed.material = 1
+    plain = VoxelWorld(size=8)
+    dense = DenseVoxelWorld(size=8)
+    for v in (plain, dense):
+        v.fill_box((0, 0, 0), (4, 4, 1), cube.solid(tex=3))
+        v.set_point(1, 1, 1, deformed)
+        v.fill_box((5, 5, 5), (7, 7, 7), deformed)
+
+    # Deformed cubes are kept as they are, equal ones share an entry
+    assert dense.get_point(1, 1, 1) is deformed
+    assert dense.get_point(6, 6, 6) is deformed
+    copied = deformed.copy()
+    dense.set_point(2, 2, 2, copied)
+    plain.set_point(2, 2, 2, copied)
+    assert len(dense.palette) == 2
+    assert _octree_dict(dense.to_octree()) == _octree_dict(plain.to_octree())
+
+    # Unhashable values are stored by identity
+    value = [1, 2]
+    dense.set_point(3, 3, 3, value)
+    assert dense.get_point(3, 3, 3) is value
+
+
+def test_cube_copy():
+    solid = cube.solid(4)
+    c = solid.copy()
+    assert type(c) is cube
+    assert c.texture == solid.texture
+    assert c.cube_id != solid.cube_id
+    c.texture = (1, 2, 3, 4, 5, 6)
+    c.ext.surfaces[0].verts = 3
+    assert solid.texture == (4, ) * 6
+    assert solid.ext.surfaces[0].verts == 0
+    with pytest.raises(AttributeError):
+        c.some_attribute = 1
+
+
+def _random_world(size):
+    random.seed(5)
+    v = VoxelWorld(size=size)
+    texes = [cube.solid(tex=t) for t in (1, 2, 3)]
+    for i in range(size * 40):
+        v.set_point(random.randrange(size), random.randrange(size), random.randrange(size), random.choice(texes))
+    v.fill_box((0, 0, 0), (size // 2, size // 2, size // 4), texes[0])
+    return v
+
+
+def test_from_octree():
+    size = 16
+    v = _random_world(size)
+    points = dict(v.world.items())
+    for collapse in (False, True):
+        tree = v.to_octree(collapse=collapse)
+        for world_class in (VoxelWorld, DenseVoxelWorld):
+            assert dict(world_class.from_octree(tree, size, size=size).world.items()) == points
+            # Leaves of several world units
+            assert dict(world_class.from_octree(tree, 4 * size, size=size).world.items()) == points
+
+            # Finer than the leaves
+            w = world_class.from_octree(tree, size, size=2 * size)
+            assert len(w.world) == 8 * len(points)
+            assert w.get_point(31, 31, 31) is points.get((15, 15, 15))
+
+            # Coarser than the leaves, voxels are set if any cube is
+            w = world_class.from_octree(tree, size, size=size // 2)
+            assert set(w.world) == {(x // 2, y // 2, z // 2) for (x, y, z) in points}
+            assert (w.xmin, w.zmin) == (0, 0)
+
+
+def test_from_octree_deformed():
+    world = cube.newcubes()
+    world[1] = cube.newtexcube(tex=4)
+    # Geometry in the lower half of the cube only
+    world[1].octsav = OCT.OCTSAV_NORMAL.value
+    world[1].edges = (0x80, ) * 8 + (0x40, ) * 4
+    v = VoxelWorld.from_octree(world, 16, size=8)
+    assert len(v.world) == 4 * 4 * 2
+    assert (v.xmin, v.xmax, v.zmin, v.zmax) == (4, 7, 0, 1)
+    assert v.get_point(4, 0, 0) is cube.solid(tex=4)
+
+    with pytest.raises(Exception):
+        VoxelWorld.from_octree(world, 16, size=12)
+
+    # Deformed cubes of the size of a voxel are kept as they are
+    deformed = world[1]
+    world[1] = cube.newcube()
+    world[1].children = [cube.solid(tex=2)] * 4 + [deformed.copy() for i in range(4)]
+    for world_class in (VoxelWorld, DenseVoxelWorld):
+        v = world_class.from_octree(world, 16, size=4)
+        assert v.get_point(2, 0, 0) is cube.solid(tex=2)
+        c = v.get_point(3, 1, 1)
+        assert (c.octsav, c.edges, c.texture) == (deformed.octsav, deformed.edges, deformed.texture)
+        assert _octree_dict(v.to_octree()[1].children) == _octree_dict(world[1].children)